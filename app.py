@@ -1,11 +1,37 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail, Message
 from config import Config
-from models import db, User, Game, UserGame, UserPreference, Transaction, Subscription
+from models import db, User, Game, UserGame, UserPreference, UserRecommendation, Transaction, Subscription, PLATFORM_BITS, masks_with_platform
+from catalog_cache import catalog_cache, user_games_to_dicts
+from search import search_game_ids, SearchUnavailableError
+from recommendations import get_user_recommendations, play_history_changed, rebuild_all_recommendations
+from collaborative import build_game_neighbors
+from bulk_recommendations import generate_all_recommendations, DEFAULT_CHECKPOINT_PATH
+from password_hashing import password_hasher, PasswordHashingBusyError
+from payment_events import payment_event_broker, transaction_message
+from payment_gateway import payment_gateway, PaymentGatewayError
+from rate_limit import rate_limiter, ip_key, email_key, user_key
+from entitlements import entitlement_cache, active_subscription
+from migrations import MIGRATIONS, applied_versions, run_migrations
+from bootstrap import run_bootstrap, seed_catalog
+from subscription_sweeper import sweep_expired_subscriptions, start_subscription_sweeper
+from stripe_events import ingest_event, process_pending_events, sign_payload, start_stripe_event_worker
+from stripe_events import stats as stripe_event_stats
+from tokens import (ACCESS_TOKEN, REFRESH_TOKEN, InvalidTokenError, bearer_token, decode_token,
+                    issue_token_pair, purge_expired_tokens, token_denylist)
+from user_cache import user_cache, load_cached_user, load_fresh_user
+from user_stats import play_stats, record_status_change, refresh_user_counters, find_counter_mismatches, rebuild_user_counters
 from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import base64
+import click
 import json
 import logging
+import math
+import queue
+import time
 import traceback
 import threading
 import stripe
@@ -28,13 +54,68 @@ login_manager.login_message = 'Por favor, inicia sesión para acceder a esta pá
 # Inicializar Stripe
 stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
 
+# Pasarela de pagos (PAYMENT_GATEWAY: 'stripe', o 'fake' para pruebas de carga sin cobros reales)
+payment_gateway.configure(
+    backend=app.config.get('PAYMENT_GATEWAY', 'stripe'),
+    api_key=app.config.get('STRIPE_SECRET_KEY'),
+    connect_timeout=app.config.get('STRIPE_CONNECT_TIMEOUT', 3),
+    read_timeout=app.config.get('STRIPE_READ_TIMEOUT', 10),
+    pool_size=app.config.get('STRIPE_POOL_SIZE', 10),
+    max_retries=app.config.get('STRIPE_MAX_RETRIES', 2),
+    fake_latency_ms=app.config.get('FAKE_GATEWAY_LATENCY_MS', 50)
+)
+
+# Pool acotado para el hash de contraseñas
+password_hasher.configure(
+    method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    salt_length=app.config.get('PASSWORD_HASH_SALT_LENGTH', 16),
+    max_workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+    max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 16),
+    timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+)
+
+def password_hashing_busy_response(error):
+    """Respuesta 503 cuando el pool de hash está saturado"""
+    logger.warning(f"Pool de hash de contraseñas saturado: {password_hasher.stats()}")
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+# Límite de peticiones (RATE_LIMIT_STORAGE: 'memory' por worker o 'database' compartido)
+rate_limiter.configure(
+    enabled=app.config.get('RATE_LIMIT_ENABLED', True),
+    storage=app.config.get('RATE_LIMIT_STORAGE', 'memory')
+)
+
+# Caché de derechos por suscripción (ENTITLEMENT_CACHE_TTL=0 la desactiva)
+entitlement_cache.configure(ttl=app.config.get('ENTITLEMENT_CACHE_TTL', 60))
+
+# Caché de identidad para el user_loader (USER_CACHE_TTL=0 la desactiva)
+user_cache.configure(ttl=app.config.get('USER_CACHE_TTL', 30))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_cached_user(int(user_id))
+
+@login_manager.request_loader
+def load_user_from_token(request):
+    """Autenticación con 'Authorization: Bearer <token de acceso>' (app Android)"""
+    token = bearer_token(request)
+    if not token:
+        return None
+    try:
+        claims = decode_token(token, ACCESS_TOKEN)
+    except InvalidTokenError as e:
+        logger.info(f"Token de acceso rechazado: {str(e)}")
+        return None
+    return load_cached_user(int(claims['sub']))
 
 # Función para inicializar base de datos (se llama después de que la app esté lista)
 def init_db():
-    """Inicializa la base de datos y crea tablas si no existen"""
+    """Migra la base de datos y siembra el catálogo (si no lo hizo ya el proceso maestro de gunicorn)"""
+    if not app.config.get('BOOTSTRAP_ON_IMPORT', True):
+        logger.info("Bootstrap omitido al importar (ya se ejecutó con `flask bootstrap`)")
+        return
     try:
         with app.app_context():
             logger.info("Intentando conectar a la base de datos...")
@@ -45,201 +126,8 @@ def init_db():
             else:
                 db_url_display = db_url[:50] + '...' if len(db_url) > 50 else db_url
             logger.info(f"Database URL: {db_url_display}")
-            db.create_all()
-            logger.info("Tablas de base de datos creadas/verificadas exitosamente")
-            
-            # Intentar agregar nuevas columnas si no existen (migración manual)
-            try:
-                from sqlalchemy import text, inspect
-                inspector = inspect(db.engine)
-                columns = [col['name'] for col in inspector.get_columns('users')]
-                
-                if 'name_change_count' not in columns:
-                    logger.info("Agregando columna name_change_count a la tabla users...")
-                    db.session.execute(text("ALTER TABLE users ADD COLUMN name_change_count INTEGER DEFAULT 0"))
-                    db.session.commit()
-                    logger.info("Columna name_change_count agregada exitosamente")
-                
-                if 'last_name_change_date' not in columns:
-                    logger.info("Agregando columna last_name_change_date a la tabla users...")
-                    db.session.execute(text("ALTER TABLE users ADD COLUMN last_name_change_date TIMESTAMP"))
-                    db.session.commit()
-                    logger.info("Columna last_name_change_date agregada exitosamente")
-                
-                # Agregar columnas de verificación de email
-                if 'email_verified' not in columns:
-                    logger.info("Agregando columna email_verified a la tabla users...")
-                    db.session.execute(text("ALTER TABLE users ADD COLUMN email_verified BOOLEAN DEFAULT FALSE"))
-                    db.session.commit()
-                    logger.info("Columna email_verified agregada exitosamente")
-                
-                # Agregar columna game_url a la tabla games si no existe
-                game_columns = [col['name'] for col in inspector.get_columns('games')]
-                if 'game_url' not in game_columns:
-                    logger.info("Agregando columna game_url a la tabla games...")
-                    db.session.execute(text("ALTER TABLE games ADD COLUMN game_url VARCHAR(500)"))
-                    db.session.commit()
-                    logger.info("Columna game_url agregada exitosamente")
-            except Exception as migration_error:
-                logger.warning(f"No se pudieron agregar las nuevas columnas (puede que ya existan): {str(migration_error)}")
-                db.session.rollback()
-            
-            # Verificar y crear tablas de pagos si no existen
-            try:
-                from sqlalchemy import inspect
-                inspector = inspect(db.engine)
-                existing_tables = inspector.get_table_names()
-                
-                if 'transactions' not in existing_tables:
-                    logger.info("Creando tabla transactions...")
-                    Transaction.__table__.create(db.engine)
-                    logger.info("Tabla transactions creada exitosamente")
-                
-                if 'subscriptions' not in existing_tables:
-                    logger.info("Creando tabla subscriptions...")
-                    Subscription.__table__.create(db.engine)
-                    logger.info("Tabla subscriptions creada exitosamente")
-            except Exception as payment_tables_error:
-                logger.warning(f"No se pudieron crear las tablas de pago (puede que ya existan): {str(payment_tables_error)}")
-                db.session.rollback()
-            # Crear algunos juegos de ejemplo si no existen
-            if Game.query.count() == 0:
-                sample_games = [
-                    Game(name='Mario Kart', description='Carreras emocionantes con personajes icónicos', 
-                         price=250.00, platforms='Android,iOS', category='Racing'),
-                    Game(name='Roblox', description='Plataforma de creación y juego', 
-                         price=150.00, platforms='Android,iOS,PC', category='Sandbox'),
-                    Game(name='Call of Duty', description='Acción intensa y estratégica', 
-                         price=500.00, platforms='PC,Console', category='FPS'),
-                    Game(name='Space Wars', description='Engage in intergalactic battles, explore unknown galaxies', 
-                         price=0.00, platforms='PC', category='Strategy'),
-                    Game(name='Return of the Cars', description='Rev up your engines and race through thrilling tracks', 
-                         price=0.00, platforms='PC,Console', category='Racing'),
-                    Game(name='Planes of Gloria', description='Soar through the skies, engage in epic dogfights', 
-                         price=0.00, platforms='PC', category='Simulation'),
-                    Game(name='Earth Wars', description='Rewrite history in intense global battles', 
-                         price=0.00, platforms='PC,Console', category='Strategy'),
-                ]
-                for game in sample_games:
-                    db.session.add(game)
-                db.session.commit()
-                logger.info("Juegos de ejemplo creados exitosamente")
-            
-            # Agregar juegos chistosos si no existen
-            funny_game_names = ['Flootilupis', 'Chocopops', 'SnackAttack', 'CerealKiller', 'Munchies']
-            existing_funny_games = {game.name for game in Game.query.filter(Game.name.in_(funny_game_names)).all()}
-            
-            funny_games_data = [
-                {
-                    'name': 'Frootilupis Match',
-                    'description': '🍩 ¡Combina 3 o más cereales del mismo color! Un juego adictivo donde los cereales vuelan y explotan con efectos increíbles. ¿Tendrás lo necesario para alcanzar el puntaje más alto?',
-                    'price': 0.00,
-                    'platforms': 'Android',
-                    'category': 'Match-3',
-                    'game_url': 'flootilupis.html'
-                },
-                {
-                    'name': 'Chocopops Volador',
-                    'description': '🍫 ¡Vuela como un chocolate loco! Toca la pantalla para hacer volar tu chocolate y esquiva los obstáculos verdes. ¿Podrás llegar más lejos que tus amigos?',
-                    'price': 0.00,
-                    'platforms': 'Android',
-                    'category': 'Arcade',
-                    'game_url': 'chocopops.html'
-                },
-                {
-                    'name': 'SnackAttack Laberinto',
-                    'description': '🍿 ¡Come todos los snacks antes de que los fantasmas te atrapen! Recolecta puntos dorados y usa los power pellets para convertirte en el rey del laberinto.',
-                    'price': 0.00,
-                    'platforms': 'Android',
-                    'category': 'Arcade',
-                    'game_url': 'snackattack.html'
-                },
-                {
-                    'name': 'CerealKiller Connect',
-                    'description': '🥣 ¡Conecta los cereales del mismo color sin que se crucen! Dibuja líneas táctiles para unir los puntos. Cada nivel es más difícil que el anterior. ¿Podrás con el desafío?',
-                    'price': 0.00,
-                    'platforms': 'Android',
-                    'category': 'Puzzle',
-                    'game_url': 'cerealkiller.html'
-                },
-                {
-                    'name': 'Munchies Memory',
-                    'description': '🧠 ¡Encuentra todos los pares de snacks antes de que se acabe el tiempo! Entrena tu memoria con este juego relajante lleno de deliciosos snacks. ¿Tienes buena memoria?',
-                    'price': 0.00,
-                    'platforms': 'Android',
-                    'category': 'Memory',
-                    'game_url': 'munchies.html'
-                }
-            ]
-            
-            games_added = 0
-            games_updated = 0
-            for game_data in funny_games_data:
-                existing_game = Game.query.filter_by(name=game_data['name']).first()
-                
-                # Buscar por nombre antiguo si existe (para migración)
-                if not existing_game:
-                    old_names = {
-                        'Frootilupis Match': 'Flootilupis',
-                        'Chocopops Volador': 'Chocopops',
-                        'SnackAttack Laberinto': 'SnackAttack',
-                        'CerealKiller Connect': 'CerealKiller',
-                        'Munchies Memory': 'Munchies'
-                    }
-                    old_name = old_names.get(game_data['name'])
-                    if old_name:
-                        existing_game = Game.query.filter_by(name=old_name).first()
-                        if existing_game:
-                            existing_game.name = game_data['name']  # Actualizar nombre
-                
-                if not existing_game:
-                    # Crear nuevo juego
-                    game = Game(
-                        name=game_data['name'],
-                        description=game_data['description'],
-                        price=game_data['price'],
-                        platforms=game_data['platforms'],
-                        category=game_data['category'],
-                        game_url=game_data['game_url']
-                    )
-                    db.session.add(game)
-                    games_added += 1
-                    logger.info(f"Agregando juego: {game_data['name']}")
-                else:
-                    # Actualizar juego existente (nombre, descripción, URL, etc.)
-                    needs_update = False
-                    if existing_game.name != game_data['name']:
-                        existing_game.name = game_data['name']
-                        needs_update = True
-                    if existing_game.description != game_data['description']:
-                        existing_game.description = game_data['description']
-                        needs_update = True
-                    if existing_game.game_url != game_data['game_url']:
-                        existing_game.game_url = game_data['game_url']
-                        needs_update = True
-                    if existing_game.platforms != game_data['platforms']:
-                        existing_game.platforms = game_data['platforms']
-                        needs_update = True
-                    if existing_game.price != game_data['price']:
-                        existing_game.price = game_data['price']
-                        needs_update = True
-                    if existing_game.category != game_data['category']:
-                        existing_game.category = game_data['category']
-                        needs_update = True
-                    
-                    if needs_update:
-                        games_updated += 1
-                        logger.info(f"Actualizando juego: {game_data['name']}")
-            
-            if games_added > 0 or games_updated > 0:
-                db.session.commit()
-                if games_added > 0:
-                    logger.info(f"Se agregaron {games_added} juegos chistosos exitosamente")
-                if games_updated > 0:
-                    logger.info(f"Se actualizaron {games_updated} juegos chistosos exitosamente")
-            else:
-                db.session.commit()
-                logger.info("Juegos chistosos ya existen y están actualizados")
+            # Migraciones pendientes y juegos sembrados, bajo un bloqueo entre procesos
+            run_bootstrap(auto_migrate=app.config.get('AUTO_MIGRATE', True))
     except Exception as e:
         logger.error(f"Error al inicializar base de datos: {str(e)}")
         logger.error(traceback.format_exc())
@@ -249,6 +137,21 @@ def init_db():
 # Inicializar base de datos al importar el módulo
 init_db()
 
+@app.before_request
+def ensure_subscription_sweeper():
+    """Inicia el barrido de suscripciones vencidas en los procesos que atienden peticiones"""
+    start_subscription_sweeper(app, app.config.get('SUBSCRIPTION_SWEEP_INTERVAL', 300))
+
+@app.before_request
+def ensure_payment_event_listener():
+    """Recibe los avisos de pagos en cada proceso (también invalidan la caché de derechos)"""
+    payment_event_broker.start(app)
+
+@app.before_request
+def ensure_stripe_event_worker():
+    """Inicia el procesamiento de eventos de Stripe en los procesos que atienden peticiones"""
+    start_stripe_event_worker(app, app.config.get('STRIPE_EVENT_POLL_INTERVAL', 5))
+
 # ==================== RUTAS PÚBLICAS ====================
 
 @app.route('/')
@@ -265,22 +168,19 @@ def benefits():
     # Obtener el modo desde los parámetros de la URL (upgrade o view)
     mode = request.args.get('mode', 'view')  # Por defecto 'view'
     
-    # Verificar si el usuario tiene una suscripción activa
-    active_subscription = Subscription.query.filter_by(
-        user_id=current_user.id,
-        status='active'
-    ).first()
+    # Verificar si el usuario tiene una suscripción activa (derechos en caché)
+    entitlements = entitlement_cache.get(current_user.id)
     
     subscription_data = None
-    if active_subscription:
+    if entitlements.has_subscription:
         subscription_data = {
-            'plan_type': active_subscription.plan_type,
-            'status': active_subscription.status
+            'plan_type': entitlements.plan_type,
+            'status': entitlements.status
         }
     
     return render_template('benefits.html', 
                          mode=mode,
-                         has_subscription=active_subscription is not None,
+                         has_subscription=entitlements.has_subscription,
                          subscription=subscription_data)
 
 @app.route('/signin')
@@ -302,18 +202,10 @@ def login():
 @app.route('/welcome')
 @login_required
 def welcome():
-    # Verificar si el usuario tiene una suscripción activa
-    active_subscription = Subscription.query.filter_by(
-        user_id=current_user.id,
-        status='active'
-    ).first()
-    
-    # Determinar qué interfaz mostrar según el plan
-    if active_subscription:
-        plan_type = active_subscription.plan_type or ''
-        # Si tiene plan premium, redirigir a la interfaz premium
-        if plan_type == 'pixelie_plan' or ('pixelie' in plan_type.lower() and 'basic' not in plan_type.lower()):
-            return render_template('welcome_premium.html')
+    # Determinar qué interfaz mostrar según los derechos del usuario (en caché)
+    # Plan premium, o plan básico con periodo pagado vigente: interfaz premium
+    if entitlement_cache.get(current_user.id).has_premium_access():
+        return render_template('welcome_premium.html')
     
     # Por defecto, mostrar interfaz básica
     return render_template('welcome.html')
@@ -331,6 +223,7 @@ def settings():
 # ==================== API RUTAS - AUTENTICACIÓN ====================
 
 @app.route('/api/register', methods=['POST'])
+@rate_limiter.limit('10/hour', key=ip_key)
 def register():
     """Registro de nuevo usuario"""
     try:
@@ -371,7 +264,10 @@ def register():
             last_name=last_name,
             email=email
         )
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHashingBusyError as e:
+            return password_hashing_busy_response(e)
         
         # Agregar usuario a la sesión de base de datos
         logger.info("Agregando usuario a la sesión de base de datos...")
@@ -417,7 +313,29 @@ def register():
         logger.error(traceback.format_exc())
         return jsonify({'error': f'Error al registrar usuario: {str(e)}'}), 500
 
+def authenticate_user(email, password):
+    """
+    Verifica email y contraseña; retorna el usuario o None.
+    Actualiza el hash si se generó con parámetros anteriores (no bloquea el login si falla).
+    Puede lanzar PasswordHashingBusyError.
+    """
+    user = User.query.filter_by(email=email).first()
+    if not user or not user.check_password(password):
+        return None
+    
+    if user.password_needs_rehash():
+        try:
+            user.set_password(password)
+            db.session.commit()
+            logger.info(f"Hash de contraseña actualizado para usuario {user.id}")
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"No se pudo actualizar el hash de contraseña: {str(e)}")
+    return user
+
 @app.route('/api/login', methods=['POST'])
+@rate_limiter.limit('20/minute', key=ip_key)
+@rate_limiter.limit('5/minute', key=email_key)
 def login_api():
     """Inicio de sesión"""
     try:
@@ -434,10 +352,11 @@ def login_api():
         if not email or not password:
             return jsonify({'error': 'Email y contraseña son requeridos'}), 400
         
-        # Buscar usuario
-        user = User.query.filter_by(email=email).first()
-        
-        if not user or not user.check_password(password):
+        try:
+            user = authenticate_user(email, password)
+        except PasswordHashingBusyError as e:
+            return password_hashing_busy_response(e)
+        if not user:
             return jsonify({'error': 'Email o contraseña incorrectos'}), 401
         
         # Iniciar sesión
@@ -470,6 +389,98 @@ def logout_api():
     except Exception as e:
         return jsonify({'error': f'Error al cerrar sesión: {str(e)}'}), 500
 
+# ==================== API RUTAS - TOKENS (APP ANDROID) ====================
+
+@app.route('/api/token', methods=['POST'])
+@rate_limiter.limit('20/minute', key=ip_key)
+@rate_limiter.limit('5/minute', key=email_key)
+def issue_tokens():
+    """Obtener token de acceso y de refresco con email y contraseña (sin cookie de sesión)"""
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No se recibieron datos'}), 400
+        
+        email = data.get('email', '').strip().lower()
+        password = data.get('password', '')
+        if not email or not password:
+            return jsonify({'error': 'Email y contraseña son requeridos'}), 400
+        
+        try:
+            user = authenticate_user(email, password)
+        except PasswordHashingBusyError as e:
+            return password_hashing_busy_response(e)
+        if not user:
+            return jsonify({'error': 'Email o contraseña incorrectos'}), 401
+        
+        return jsonify({
+            'success': True,
+            'user': user.to_dict(),
+            **issue_token_pair(user.id)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error al emitir tokens: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'Error al emitir tokens: {str(e)}'}), 500
+
+@app.route('/api/token/refresh', methods=['POST'])
+@rate_limiter.limit('30/minute', key=ip_key)
+def refresh_tokens():
+    """Canjear un token de refresco por un par nuevo (el anterior queda revocado)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            claims = decode_token(data.get('refresh_token', ''), REFRESH_TOKEN)
+        except InvalidTokenError as e:
+            return jsonify({'error': str(e)}), 401
+        
+        # La copia en memoria puede no tener aún una revocación hecha en otro worker
+        if token_denylist.is_revoked_in_db(claims):
+            return jsonify({'error': 'Token revocado'}), 401
+        
+        user_id = int(claims['sub'])
+        if not load_cached_user(user_id):
+            return jsonify({'error': 'Token inválido'}), 401
+        
+        try:
+            token_denylist.revoke(claims)
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición canjeó el mismo token de refresco al mismo tiempo
+            db.session.rollback()
+            return jsonify({'error': 'Token revocado'}), 401
+        
+        return jsonify({'success': True, **issue_token_pair(user_id)}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al refrescar tokens: {str(e)}")
+        return jsonify({'error': f'Error al refrescar tokens: {str(e)}'}), 500
+
+@app.route('/api/token/revoke', methods=['POST'])
+def revoke_tokens():
+    """Revocar el token de refresco enviado y el token de acceso del encabezado (cerrar sesión en la app)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        revoked = 0
+        for token, token_type in ((data.get('refresh_token'), REFRESH_TOKEN), (bearer_token(request), ACCESS_TOKEN)):
+            if not token:
+                continue
+            try:
+                token_denylist.revoke(decode_token(token, token_type))
+                revoked += 1
+            except InvalidTokenError:
+                pass
+        db.session.commit()
+        
+        return jsonify({'success': True, 'revoked': revoked}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al revocar tokens: {str(e)}")
+        return jsonify({'error': f'Error al revocar tokens: {str(e)}'}), 500
+
 @app.route('/api/user', methods=['GET'])
 @login_required
 def get_current_user():
@@ -484,6 +495,40 @@ def get_current_user():
 
 # ==================== API RUTAS - PERFIL ====================
 
+# Juegos que se muestran en el historial del perfil
+PROFILE_HISTORY_SIZE = 10
+
+def get_play_history_page(user_id, limit, cursor=None):
+    """
+    Página del historial de juegos ordenada por last_played DESC, id DESC
+    (paginación por cursor sobre el índice ix_user_games_user_last_played_id;
+    last_played nunca es NULL desde la migración 12).
+    Retorna (user_games, next_cursor).
+    """
+    query = UserGame.query.filter(UserGame.user_id == user_id)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            last_played = datetime.fromisoformat(values['last_played'])
+            last_id = int(values['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Cursor inválido')
+        query = query.filter(db.or_(
+            UserGame.last_played < last_played,
+            db.and_(UserGame.last_played == last_played, UserGame.id < last_id)
+        ))
+    
+    # Pedir un elemento extra para saber si hay otra página
+    user_games = query.order_by(UserGame.last_played.desc(), UserGame.id.desc()).limit(limit + 1).all()
+    has_more = len(user_games) > limit
+    user_games = user_games[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = user_games[-1]
+        next_cursor = encode_cursor({'last_played': last.last_played.isoformat(), 'id': last.id})
+    return user_games, next_cursor
+
 @app.route('/api/profile', methods=['GET'])
 @login_required
 def get_profile():
@@ -491,58 +536,19 @@ def get_profile():
     try:
         user = current_user
         
-        # Obtener todos los juegos del usuario ordenados por última vez jugado
-        all_user_games = UserGame.query.filter_by(user_id=user.id).order_by(UserGame.last_played.desc()).all()
-        
-        # Obtener los últimos 10 para mostrar en el historial
-        user_games = all_user_games[:10]
-        games_data = [ug.to_dict() for ug in user_games]
+        # Historial: primera página de juegos recientes (el resto con /api/user/games/history)
+        user_games, history_next_cursor = get_play_history_page(user.id, PROFILE_HISTORY_SIZE)
+        games_data = user_games_to_dicts(user_games, include_description=False)
         
-        # Estadísticas - contar solo juegos únicos con el estado más reciente
-        # Obtener todos los game_ids únicos del usuario
-        unique_game_ids = db.session.query(UserGame.game_id).filter_by(
-            user_id=user.id
-        ).distinct().all()
-        unique_game_ids = [gid[0] for gid in unique_game_ids]
-        
-        # Para cada juego único, obtener el registro más reciente y contar por estado
-        completed_count = 0
-        playing_count = 0
-        
-        for game_id in unique_game_ids:
-            try:
-                # Obtener el registro más reciente de este juego
-                # Primero intentar con ordenamiento normal
-                latest_game = UserGame.query.filter_by(
-                    user_id=user.id,
-                    game_id=game_id
-                ).order_by(UserGame.last_played.desc()).first()
-                
-                # Si no hay fecha, obtener cualquier registro de este juego
-                if not latest_game or not latest_game.last_played:
-                    latest_game = UserGame.query.filter_by(
-                        user_id=user.id,
-                        game_id=game_id
-                    ).first()
-                
-                if latest_game and latest_game.status:
-                    if latest_game.status == 'completed':
-                        completed_count += 1
-                    elif latest_game.status == 'playing':
-                        playing_count += 1
-            except Exception as e:
-                # Si hay un error con un juego específico, continuar con los demás
-                logger.warning(f"Error al procesar juego {game_id}: {str(e)}")
-                continue
+        # Estadísticas - contadores desnormalizados, mantenidos al escribir en user_games
+        stats = play_stats(user)
         
         return jsonify({
             'success': True,
             'user': user.to_dict(),
             'games': games_data,
-            'stats': {
-                'completed': completed_count,
-                'playing': playing_count
-            }
+            'history_next_cursor': history_next_cursor,
+            'stats': stats
         }), 200
         
     except Exception as e:
@@ -550,6 +556,7 @@ def get_profile():
 
 @app.route('/api/profile/update', methods=['PUT'])
 @login_required
+@rate_limiter.limit('10/minute', key=user_key)
 def update_profile():
     """Actualizar perfil del usuario con límite de 3 cambios"""
     try:
@@ -558,7 +565,11 @@ def update_profile():
         if not data:
             return jsonify({'error': 'No se recibieron datos'}), 400
         
-        user = current_user
+        # Releer la fila bloqueada: la instancia de la caché puede tener nombre o contadores viejos
+        user = load_fresh_user(current_user.id, for_update=True)
+        if user is None:
+            logout_user()
+            return jsonify({'error': 'Usuario no encontrado'}), 404
         
         # Verificar si el nombre o apellido realmente cambió
         first_name_changed = 'firstName' in data and data['firstName'].strip() != user.first_name
@@ -595,37 +606,14 @@ def update_profile():
         user.last_name = new_last_name
         
         # Si cambió el nombre o apellido, incrementar contador y actualizar fecha
+        # (las columnas las crea la migración 2, ver migrations.py)
         if first_name_changed or last_name_changed:
-            # Usar getattr para manejar columnas que pueden no existir aún
-            current_count = getattr(user, 'name_change_count', None) or 0
-            if hasattr(user, 'name_change_count'):
-                user.name_change_count = current_count + 1
-                user.last_name_change_date = datetime.utcnow()
-            else:
-                # Si las columnas no existen, intentar agregarlas
-                logger.warning("Las columnas de cambio de nombre no existen, intentando agregarlas...")
-                try:
-                    from sqlalchemy import text, inspect
-                    inspector = inspect(db.engine)
-                    columns = [col['name'] for col in inspector.get_columns('users')]
-                    
-                    if 'name_change_count' not in columns:
-                        db.session.execute(text("ALTER TABLE users ADD COLUMN name_change_count INTEGER DEFAULT 0"))
-                    if 'last_name_change_date' not in columns:
-                        db.session.execute(text("ALTER TABLE users ADD COLUMN last_name_change_date TIMESTAMP"))
-                    
-                    db.session.commit()
-                    # Recargar el usuario
-                    db.session.refresh(user)
-                    user.name_change_count = 1
-                    user.last_name_change_date = datetime.utcnow()
-                except Exception as e:
-                    logger.error(f"Error al agregar columnas: {str(e)}")
-                    db.session.rollback()
-                    # Continuar sin las columnas (modo compatible)
+            user.name_change_count = func.coalesce(User.name_change_count, 0) + 1
+            user.last_name_change_date = datetime.utcnow()
         
         user.updated_at = datetime.utcnow()
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         name_change_count = getattr(user, 'name_change_count', None) or 0
         changes_remaining = max(0, 3 - name_change_count)
@@ -650,8 +638,11 @@ def update_profile():
 def delete_account():
     """Eliminar cuenta del usuario y todos sus registros relacionados"""
     try:
-        user = current_user
-        user_id = user.id
+        user_id = current_user.id
+        user = load_fresh_user(user_id, for_update=True)
+        if user is None:
+            logout_user()
+            return jsonify({'error': 'Usuario no encontrado'}), 404
         
         logger.info(f"Iniciando eliminación de cuenta para usuario ID: {user_id}")
         
@@ -673,15 +664,22 @@ def delete_account():
             db.session.delete(user_game)
         logger.info(f"Eliminados {len(user_games)} juegos del usuario {user_id}")
         
+        # Eliminar las recomendaciones materializadas del usuario
+        UserRecommendation.query.filter_by(user_id=user_id).delete()
+        
         # Eliminar todas las preferencias del usuario
         preferences = UserPreference.query.filter_by(user_id=user_id).all()
         for preference in preferences:
             db.session.delete(preference)
         logger.info(f"Eliminadas {len(preferences)} preferencias del usuario {user_id}")
         
+        # Revocar los tokens de la app emitidos para el usuario
+        token_denylist.revoke_user(user_id)
+        
         # Finalmente, eliminar el usuario
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         
         logger.info(f"Usuario {user_id} eliminado exitosamente junto con todos sus registros relacionados")
         
@@ -700,21 +698,146 @@ def delete_account():
 
 # ==================== API RUTAS - JUEGOS ====================
 
+def encode_cursor(values):
+    """Codifica la posición de la última fila devuelta como cursor opaco"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decodifica un cursor; lanza ValueError si no es válido"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(values, dict):
+        raise ValueError('Cursor inválido')
+    return values
+
+def decode_catalog_cursor(cursor):
+    """Decodifica un cursor del catálogo (último id devuelto)"""
+    try:
+        return int(decode_cursor(cursor)['id'])
+    except (KeyError, TypeError):
+        raise ValueError('Cursor inválido')
+
+CATALOG_FILTER_PARAMS = ('cursor', 'limit', 'category', 'platform', 'min_price', 'max_price')
+
+def price_arg(name):
+    """Precio opcional de la query string; lanza ValueError si no es un número"""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        price = float(value)
+    except ValueError:
+        price = None
+    if price is None or not math.isfinite(price):
+        raise ValueError(f'{name} debe ser un número')
+    return price
+
 @app.route('/api/games', methods=['GET'])
 @login_required
 def get_games():
-    """Obtener lista de juegos"""
+    """Obtener lista de juegos (catálogo en caché, responde 304 si no cambió)"""
+    try:
+        # Con filtros o paginación se consulta la base de datos usando los índices
+        if any(param in request.args for param in CATALOG_FILTER_PARAMS):
+            return get_games_page()
+        
+        snapshot = catalog_cache.get()
+        
+        response = app.response_class(snapshot.body, status=200, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        # Obligar al navegador a revalidar con If-None-Match en cada carga
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener juegos: {str(e)}'}), 500
+
+def get_games_page():
+    """Página del catálogo con paginación por cursor (keyset sobre id) y filtros"""
+    default_limit = app.config.get('CATALOG_PAGE_SIZE', 50)
+    max_limit = app.config.get('CATALOG_MAX_PAGE_SIZE', 100)
+    
+    try:
+        limit = int(request.args.get('limit', default_limit))
+        min_price = price_arg('min_price')
+        max_price = price_arg('max_price')
+        last_id = decode_catalog_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    
+    if limit < 1:
+        return jsonify({'error': 'limit debe ser mayor que 0'}), 400
+    limit = min(limit, max_limit)
+    
+    query = Game.query
+    
+    category = request.args.get('category', '').strip()
+    if category:
+        query = query.filter(Game.category == category)
+    
+    platform = request.args.get('platform', '').strip()
+    if platform:
+        if platform not in PLATFORM_BITS:
+            return jsonify({'error': f'Plataforma desconocida: {platform}'}), 400
+        # IN sobre los pocos valores de bitmask posibles para aprovechar el índice
+        query = query.filter(Game.platform_mask.in_(masks_with_platform(PLATFORM_BITS[platform])))
+    
+    if min_price is not None:
+        query = query.filter(Game.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Game.price <= max_price)
+    
+    if last_id is not None:
+        query = query.filter(Game.id > last_id)
+    
+    # Pedir un elemento extra para saber si hay otra página
+    games = query.order_by(Game.id).limit(limit + 1).all()
+    has_more = len(games) > limit
+    games = games[:limit]
+    
+    return jsonify({
+        'success': True,
+        'games': [game.to_dict() for game in games],
+        'next_cursor': encode_cursor({'id': games[-1].id}) if has_more else None
+    }), 200
+
+@app.route('/api/games/search', methods=['GET'])
+@login_required
+def search_games():
+    """Buscar juegos por nombre, descripción y categoría (ordenados por relevancia)"""
     try:
-        games = Game.query.all()
-        games_data = [game.to_dict() for game in games]
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'El parámetro q es requerido'}), 400
+        
+        limit = request.args.get('limit', app.config.get('SEARCH_PAGE_SIZE', 20), type=int)
+        limit = max(1, min(limit, app.config.get('SEARCH_MAX_PAGE_SIZE', 50)))
+        
+        results = search_game_ids(query, limit)
+        
+        # Los datos de cada juego salen del catálogo en caché, sin volver a cargar filas
+        games_by_id = catalog_cache.get().games_by_id
+        games_data = []
+        for game_id, rank in results:
+            game = games_by_id.get(game_id)
+            if game:
+                games_data.append(dict(game, rank=rank))
         
         return jsonify({
             'success': True,
+            'query': query,
             'games': games_data
         }), 200
         
+    except SearchUnavailableError as e:
+        logger.error(f"Búsqueda no disponible: {str(e)}")
+        return jsonify({'error': 'La búsqueda no está disponible'}), 503
     except Exception as e:
-        return jsonify({'error': f'Error al obtener juegos: {str(e)}'}), 500
+        logger.error(f"Error al buscar juegos: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'Error al buscar juegos: {str(e)}'}), 500
 
 @app.route('/api/games/recommendations', methods=['GET'])
 @login_required
@@ -723,108 +846,14 @@ def get_recommendations():
     try:
         user = current_user
         
-        # Obtener juegos que el usuario ha jugado
-        user_games = UserGame.query.filter_by(user_id=user.id).all()
-        played_game_ids = [ug.game_id for ug in user_games]
-        
-        # Obtener todos los juegos del catálogo (los 5 juegos chistosos)
-        funny_game_names = ['Frootilupis Match', 'Chocopops Volador', 'SnackAttack Laberinto', 
-                           'CerealKiller Connect', 'Munchies Memory', 'Flootilupis', 'Chocopops', 
-                           'SnackAttack', 'CerealKiller', 'Munchies']
-        all_games = Game.query.filter(Game.name.in_(funny_game_names)).all()
-        
-        # Analizar categorías de los juegos que ha jugado (si hay)
-        played_categories = {}
-        if played_game_ids:
-            played_games = Game.query.filter(Game.id.in_(played_game_ids)).all()
-            for game in played_games:
-                if game.category:
-                    category = game.category.lower()
-                    played_categories[category] = played_categories.get(category, 0) + 1
-        
-        # Calcular puntuación de recomendación para TODOS los juegos
-        # Las recomendaciones siempre deben estar visibles y cambiar dinámicamente
-        game_scores = []
-        for game in all_games:
-            score = 0
-            
-            # Si el usuario NO ha jugado este juego, darle más puntos
-            if game.id not in played_game_ids:
-                score += 20  # Bonus por no haberlo jugado
-            
-            # Puntos por categoría similar (si ha jugado juegos similares)
-            if game.category and game.category.lower() in played_categories:
-                score += played_categories[game.category.lower()] * 5
-            
-            # Puntos por plataforma (si coincide)
-            if game.platforms:
-                platforms = game.platforms.split(',') if isinstance(game.platforms, str) else game.platforms
-                if 'Android' in platforms:
-                    score += 3
-            
-            # Bonus si es gratis
-            if game.price == 0.00:
-                score += 2
-            
-            # Si el usuario ya lo está jugando, darle menos puntos pero aún incluirlo
-            # Esto permite que las recomendaciones cambien dinámicamente
-            if game.id in played_game_ids:
-                score -= 10  # Penalización por ya haberlo jugado
-            
-            game_scores.append((game, score))
-        
-        # Ordenar por puntuación y tomar los mejores 3
-        game_scores.sort(key=lambda x: x[1], reverse=True)
-        recommended_games_with_scores = game_scores[:3]
-        
-        # Asegurarse de que siempre haya 3 recomendaciones
-        if len(recommended_games_with_scores) < 3:
-            recommended_ids = [gs[0].id for gs in recommended_games_with_scores]
-            additional_games = [g for g in all_games if g.id not in recommended_ids]
-            for game in additional_games[:3 - len(recommended_games_with_scores)]:
-                recommended_games_with_scores.append((game, 0))
-        
-        # Mapeo de categorías en inglés a español
-        category_translations = {
-            'arcade': 'acción rápida',
-            'match-3': 'puzzle de combinación',
-            'puzzle': 'puzzle',
-            'memory': 'memoria',
-            'strategy': 'estrategia',
-            'racing': 'carreras',
-            'fps': 'disparos',
-            'sandbox': 'mundo abierto',
-            'simulation': 'simulación'
-        }
+        # Recomendaciones materializadas (solo se recalculan si cambió el historial o el catálogo)
+        recommendations = get_user_recommendations(user)
         
-        # Generar razones de recomendación para cada juego
+        games_by_id = catalog_cache.get().games_by_id
         games_data = []
-        for game, score in recommended_games_with_scores[:3]:
-            game_dict = game.to_dict()
-            
-            # Generar razón de recomendación basada en el análisis
-            reason = ""
-            if game.id not in played_game_ids:
-                # Si el usuario no ha jugado este juego
-                if game.category and game.category.lower() in played_categories:
-                    # Si ha jugado juegos de la misma categoría
-                    category_es = category_translations.get(game.category.lower(), game.category.lower())
-                    reason = f"Te gustan los juegos de {category_es}"
-                elif game.category:
-                    # Si tiene categoría pero no ha jugado juegos similares
-                    category_es = category_translations.get(game.category.lower(), game.category.lower())
-                    reason = f"Perfecto si te gustan los juegos de {category_es}"
-                else:
-                    reason = "Nuevo juego perfecto para ti"
-            else:
-                # Si el usuario ya ha jugado este juego
-                if game.category:
-                    category_es = category_translations.get(game.category.lower(), game.category.lower())
-                    reason = f"Basado en tu interés por juegos de {category_es}"
-                else:
-                    reason = "Recomendado según tus preferencias"
-            
-            game_dict['recommendation_reason'] = reason
+        for recommendation in recommendations:
+            game_dict = dict(games_by_id[recommendation['game_id']])
+            game_dict['recommendation_reason'] = recommendation['recommendation_reason']
             games_data.append(game_dict)
         
         return jsonify({
@@ -851,10 +880,30 @@ def get_recommendations():
 @app.route('/api/user/games', methods=['GET'])
 @login_required
 def get_user_games():
-    """Obtener juegos del usuario"""
+    """
+    Obtener juegos del usuario, del más reciente al más antiguo.
+    Con limit o cursor se pagina igual que /api/user/games/history (keyset sobre
+    last_played, id). Sin ellos se devuelven todos: la app Android pide la lista
+    completa y no sabe seguir un cursor.
+    """
     try:
-        user_games = UserGame.query.filter_by(user_id=current_user.id).all()
-        games_data = [ug.to_dict() for ug in user_games]
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = request.args.get('limit', PROFILE_HISTORY_SIZE, type=int)
+            limit = max(1, min(limit, app.config.get('HISTORY_MAX_PAGE_SIZE', 50)))
+            try:
+                user_games, next_cursor = get_play_history_page(current_user.id, limit, request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({
+                'success': True,
+                'games': user_games_to_dicts(user_games),
+                'next_cursor': next_cursor
+            }), 200
+        
+        user_games = UserGame.query.filter_by(user_id=current_user.id).order_by(
+            UserGame.last_played.desc(), UserGame.id.desc()
+        ).all()
+        games_data = user_games_to_dicts(user_games)
         
         return jsonify({
             'success': True,
@@ -864,8 +913,31 @@ def get_user_games():
     except Exception as e:
         return jsonify({'error': f'Error al obtener juegos: {str(e)}'}), 500
 
+@app.route('/api/user/games/history', methods=['GET'])
+@login_required
+def get_play_history():
+    """Obtener el historial de juegos del usuario paginado por cursor (para "cargar más")"""
+    try:
+        limit = request.args.get('limit', PROFILE_HISTORY_SIZE, type=int)
+        limit = max(1, min(limit, app.config.get('HISTORY_MAX_PAGE_SIZE', 50)))
+        
+        try:
+            user_games, next_cursor = get_play_history_page(current_user.id, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'games': user_games_to_dicts(user_games, include_description=False),
+            'next_cursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Error al obtener historial: {str(e)}'}), 500
+
 @app.route('/api/user/games', methods=['POST'])
 @login_required
+@rate_limiter.limit('60/minute', key=user_key)
 def add_user_game():
     """Agregar o actualizar juego del usuario"""
     try:
@@ -889,6 +961,7 @@ def add_user_game():
         if existing:
             # Actualizar estado y fecha (no es un juego nuevo, solo se actualiza)
             # Si el juego estaba completado y ahora se vuelve a jugar, cambiar a 'playing'
+            record_status_change(current_user.id, existing.status, status)
             existing.status = status
             existing.last_played = datetime.utcnow()
         else:
@@ -900,7 +973,10 @@ def add_user_game():
                 status=status
             )
             db.session.add(user_game)
+            record_status_change(current_user.id, None, status)
         
+        # Refrescar las recomendaciones materializadas en la misma transacción
+        play_history_changed(current_user)
         db.session.commit()
         
         return jsonify({
@@ -915,6 +991,7 @@ def add_user_game():
 
 @app.route('/api/profile/cleanup-duplicates', methods=['POST'])
 @login_required
+@rate_limiter.limit('5/minute', key=user_key)
 def cleanup_duplicate_games():
     """Limpiar registros duplicados de juegos del usuario (endpoint temporal para debugging)"""
     try:
@@ -940,6 +1017,11 @@ def cleanup_duplicate_games():
                     db.session.delete(games_by_id[ug.game_id])
                     games_by_id[ug.game_id] = ug
         
+        # Recalcular contadores del usuario tras eliminar duplicados
+        db.session.flush()
+        refresh_user_counters(user.id)
+        
+        play_history_changed(user)
         db.session.commit()
         
         return jsonify({
@@ -953,6 +1035,7 @@ def cleanup_duplicate_games():
 
 @app.route('/api/user/games/<int:game_id>/complete', methods=['POST'])
 @login_required
+@rate_limiter.limit('60/minute', key=user_key)
 def complete_game(game_id):
     """Marcar juego como completado"""
     try:
@@ -965,6 +1048,7 @@ def complete_game(game_id):
         user_game = UserGame.query.filter_by(user_id=current_user.id, game_id=game_id).first()
         if user_game:
             # Actualizar a completado
+            record_status_change(current_user.id, user_game.status, 'completed')
             user_game.status = 'completed'
             user_game.last_played = datetime.utcnow()
         else:
@@ -975,7 +1059,10 @@ def complete_game(game_id):
                 status='completed'
             )
             db.session.add(user_game)
+            record_status_change(current_user.id, None, 'completed')
         
+        # Refrescar las recomendaciones materializadas en la misma transacción
+        play_history_changed(current_user)
         db.session.commit()
         
         return jsonify({
@@ -1005,6 +1092,13 @@ def health_check():
         db_status = f'error: {str(e)}'
         db_url_display = app.config.get('SQLALCHEMY_DATABASE_URI', 'Not configured')
     
+    # Eventos de Stripe por estado (los pendientes indican retraso en el procesamiento)
+    try:
+        stripe_events_status = stripe_event_stats()
+    except Exception as e:
+        db.session.rollback()
+        stripe_events_status = f'error: {str(e)}'
+    
     # Verificar configuración de email
     mail_config = {
         'MAIL_SERVER': app.config.get('MAIL_SERVER'),
@@ -1021,10 +1115,15 @@ def health_check():
         'database': db_status,
         'database_url': db_url_display,
         'secret_key_configured': bool(app.config.get('SECRET_KEY') and app.config.get('SECRET_KEY') != 'dev-secret-key-change-in-production'),
-        'email_config': mail_config
+        'email_config': mail_config,
+        'password_hashing': password_hasher.stats(),
+        'payment_gateway': payment_gateway.stats(),
+        'stripe_events': stripe_events_status,
+        'payment_events': payment_event_broker.stats()
     }), 200
 
 @app.route('/api/test-email', methods=['POST'])
+@rate_limiter.limit('3/minute', key=ip_key)
 def test_email():
     """Endpoint para probar el envío de email (síncrono para diagnóstico)"""
     try:
@@ -1150,59 +1249,16 @@ def checkout():
 def get_subscription_status():
     """Obtener el estado de la suscripción del usuario actual"""
     try:
-        # Verificar si el usuario tiene una suscripción activa
-        active_subscription = Subscription.query.filter_by(
-            user_id=current_user.id,
-            status='active'
-        ).first()
+        # Derechos en caché (sin consultar subscriptions en el caso común). Solo lectura:
+        # el cambio a básico al terminar el periodo lo hace subscription_sweeper.py
+        entitlements = entitlement_cache.get(current_user.id)
         
-        has_subscription = active_subscription is not None
-        
-        subscription_data = None
-        if active_subscription:
-            # Verificar si el periodo ha terminado y aplicar cambio automático
-            if active_subscription.cancel_at_period_end and active_subscription.current_period_end:
-                if datetime.utcnow() >= active_subscription.current_period_end:
-                    # El periodo terminó, cambiar a básico definitivamente
-                    active_subscription.plan_type = 'pixelie_basic'
-                    active_subscription.amount = 0.00
-                    active_subscription.current_period_end = None
-                    active_subscription.cancel_at_period_end = False
-                    db.session.commit()
-                    logger.info(f"Periodo terminado para usuario {current_user.id}, cambiado a básico automáticamente")
-            
-            logger.info(f"Usuario {current_user.id} tiene suscripción activa: plan_type='{active_subscription.plan_type}', status='{active_subscription.status}'")
-            
-            # Determinar si tiene acceso premium (considerando periodo pagado)
-            has_premium_access = False
-            if active_subscription.plan_type == 'pixelie_plan':
-                # Plan premium activo
-                has_premium_access = True
-            elif active_subscription.plan_type == 'pixelie_basic' and active_subscription.current_period_end:
-                # Si tiene periodo pagado activo aunque sea básico, tiene acceso premium
-                # Esto ocurre cuando cambió a básico pero aún tiene periodo pagado activo
-                if datetime.utcnow() < active_subscription.current_period_end:
-                    has_premium_access = True
-                    logger.info(f"Usuario {current_user.id} tiene acceso premium por periodo pagado activo hasta {active_subscription.current_period_end}")
-            
-            subscription_data = {
-                'id': active_subscription.id,
-                'user_id': active_subscription.user_id,
-                'plan_type': active_subscription.plan_type,  # Debería ser 'pixelie_plan' o 'pixelie_basic'
-                'amount': float(active_subscription.amount) if active_subscription.amount else 0.0,
-                'currency': active_subscription.currency,
-                'status': active_subscription.status,
-                'current_period_start': active_subscription.current_period_start.isoformat() if active_subscription.current_period_start else None,
-                'current_period_end': active_subscription.current_period_end.isoformat() if active_subscription.current_period_end else None,
-                'cancel_at_period_end': active_subscription.cancel_at_period_end if active_subscription.cancel_at_period_end else False,
-                'has_premium_access': has_premium_access  # Indica si tiene acceso premium (por plan o periodo pagado)
-            }
-            logger.info(f"Enviando subscription_data: {subscription_data}")
+        subscription_data = entitlements.subscription_dict()
         
         return jsonify({
             'success': True,
             'user': {
-                'has_subscription': has_subscription,
+                'has_subscription': entitlements.has_subscription,
                 'subscription': subscription_data
             }
         }), 200
@@ -1221,10 +1277,7 @@ def activate_basic_plan():
     """Activar el plan básico Pixelie Basic Plan (gratis)"""
     try:
         # Verificar si el usuario ya tiene una suscripción activa
-        existing_subscription = Subscription.query.filter_by(
-            user_id=current_user.id,
-            status='active'
-        ).first()
+        existing_subscription = active_subscription(current_user.id)
         
         if existing_subscription:
             # Si tiene un plan premium con periodo pagado activo
@@ -1313,10 +1366,7 @@ def activate_premium_plan():
     """Activar el plan premium Pixelie Plan (sin pago, solo para testing)"""
     try:
         # Verificar si el usuario ya tiene una suscripción activa
-        existing_subscription = Subscription.query.filter_by(
-            user_id=current_user.id,
-            status='active'
-        ).first()
+        existing_subscription = active_subscription(current_user.id)
         
         if existing_subscription:
             # Verificar si ya tiene un periodo pagado activo
@@ -1375,23 +1425,89 @@ def activate_premium_plan():
             'error': f'Error al activar plan premium: {str(e)}'
         }), 500
 
+# Estados de un payment intent que todavía puede confirmarse desde el checkout
+OPEN_PAYMENT_INTENT_STATUSES = ('requires_payment_method', 'requires_confirmation', 'requires_action')
+
+def find_pending_payment(user_id, idempotency_key=None):
+    """
+    Transacción creada con la misma llave de idempotencia o, si no hay, la última
+    pendiente del plan del usuario dentro de PAYMENT_INTENT_REUSE_HOURS
+    (usa el índice ix_transactions_user_status_type)
+    """
+    if idempotency_key:
+        transaction = Transaction.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+        if transaction:
+            return transaction
+    since = datetime.utcnow() - timedelta(hours=app.config.get('PAYMENT_INTENT_REUSE_HOURS', 24))
+    return Transaction.query.filter(
+        Transaction.user_id == user_id,
+        Transaction.status == 'pending',
+        Transaction.transaction_type == 'subscription',
+        Transaction.payment_intent_id.isnot(None),
+        Transaction.created_at >= since
+    ).order_by(Transaction.created_at.desc()).first()
+
+def payment_intent_response(intent, reused):
+    return jsonify({
+        'success': True,
+        'reused': reused,
+        'user': {
+            'client_secret': intent.client_secret,
+            'payment_intent_id': intent.id
+        }
+    }), 200
+
 @app.route('/api/create-payment-intent', methods=['POST'])
 @login_required
+@rate_limiter.limit('10/minute', key=user_key)
 def create_payment_intent():
-    """Crear Payment Intent de Stripe para el plan Pixelie"""
+    """
+    Crear Payment Intent de Stripe para el plan Pixelie.
+    Con la cabecera Idempotency-Key, repetir la petición devuelve el mismo pago;
+    sin ella se reutiliza el último pago pendiente del usuario si sigue abierto.
+    """
     try:
-        if not stripe.api_key:
+        if not payment_gateway.is_configured:
             return jsonify({'error': 'Stripe no está configurado'}), 500
         
         plan_price = app.config.get('PIXELIE_PLAN_PRICE', 100.00)
         plan_currency = app.config.get('PIXELIE_PLAN_CURRENCY', 'mxn')
+        idempotency_key = (request.headers.get('Idempotency-Key') or '').strip()[:255] or None
         
         # Convertir a centavos (Stripe usa la unidad más pequeña de la moneda)
         amount_in_cents = int(plan_price * 100) if plan_currency.lower() == 'mxn' else int(plan_price * 100)
         
-        # Crear Payment Intent en Stripe
         try:
-            intent = stripe.PaymentIntent.create(
+            # Reutilizar el pago de esta misma llave, o uno pendiente que aún pueda confirmarse
+            pending = find_pending_payment(current_user.id, idempotency_key)
+            intent = None
+            if pending:
+                same_request = idempotency_key is not None and pending.idempotency_key == idempotency_key
+                try:
+                    intent = payment_gateway.retrieve_payment_intent(pending.payment_intent_id)
+                except PaymentGatewayError as e:
+                    # Un pago pendiente que Stripe ya no reconoce no se reutiliza; se crea otro
+                    if same_request or e.retryable:
+                        raise
+                    logger.warning(f"No se pudo recuperar el Payment Intent {pending.payment_intent_id}: {str(e)}")
+            if intent is not None:
+                if same_request or (intent.status in OPEN_PAYMENT_INTENT_STATUSES
+                                    and intent.amount == amount_in_cents
+                                    and intent.currency == plan_currency.lower()):
+                    logger.info(f"Payment Intent reutilizado para usuario {current_user.id}: {intent.id}")
+                    return payment_intent_response(intent, reused=True)
+                if intent.status in ('processing', 'succeeded'):
+                    # Crear otro podría cobrar dos veces: el webhook completará este
+                    return jsonify({
+                        'error': 'Ya hay un pago en proceso para este plan',
+                        'payment_intent_id': intent.id
+                    }), 409
+                if intent.status == 'canceled':
+                    pending.status = 'failed'
+                    db.session.commit()
+            
+            # Crear Payment Intent en Stripe (la llave hace que los reintentos devuelvan el mismo)
+            intent = payment_gateway.create_payment_intent(
                 amount=amount_in_cents,
                 currency=plan_currency.lower(),
                 metadata={
@@ -1400,7 +1516,8 @@ def create_payment_intent():
                     'plan_type': 'pixelie_plan',
                     'plan_name': 'Pixelie Plan'
                 },
-                description='Pixelie Plan - PixelPick'
+                description='Pixelie Plan - PixelPick',
+                idempotency_key=f'pixelie_plan:{current_user.id}:{idempotency_key}' if idempotency_key else None
             )
             
             # Crear transacción pendiente en la base de datos
@@ -1411,22 +1528,24 @@ def create_payment_intent():
                 currency=plan_currency.upper(),
                 payment_method='stripe',
                 payment_intent_id=intent.id,
+                idempotency_key=idempotency_key,
                 status='pending'
             )
             db.session.add(transaction)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Otra petición con la misma llave guardó la transacción primero (Stripe devolvió el mismo intent)
+                db.session.rollback()
+                if not Transaction.query.filter_by(user_id=current_user.id, idempotency_key=idempotency_key).first():
+                    raise
+                return payment_intent_response(intent, reused=True)
             
             logger.info(f"Payment Intent creado para usuario {current_user.id}: {intent.id}")
             
-            return jsonify({
-                'success': True,
-                'user': {
-                    'client_secret': intent.client_secret,
-                    'payment_intent_id': intent.id
-                }
-            }), 200
+            return payment_intent_response(intent, reused=False)
             
-        except stripe.error.StripeError as e:
+        except PaymentGatewayError as e:
             logger.error(f"Error de Stripe: {str(e)}")
             return jsonify({'error': f'Error al procesar el pago: {str(e)}'}), 500
         
@@ -1438,21 +1557,16 @@ def create_payment_intent():
 
 @app.route('/api/stripe-webhook', methods=['POST'])
 def stripe_webhook():
-    """Webhook de Stripe para confirmar pagos"""
+    """Webhook de Stripe: guarda el evento y responde; se procesa en segundo plano (ver stripe_events.py)"""
     payload = request.data
     sig_header = request.headers.get('Stripe-Signature')
     webhook_secret = app.config.get('STRIPE_WEBHOOK_SECRET')
     
     if not webhook_secret:
         logger.warning("STRIPE_WEBHOOK_SECRET no configurada, saltando verificación")
-        # En desarrollo, podemos procesar sin verificación
-        try:
-            event = json.loads(payload)
-        except:
-            return jsonify({'error': 'Invalid payload'}), 400
     else:
         try:
-            event = stripe.Webhook.construct_event(
+            stripe.Webhook.construct_event(
                 payload, sig_header, webhook_secret
             )
         except ValueError:
@@ -1462,71 +1576,24 @@ def stripe_webhook():
             logger.error("Invalid signature")
             return jsonify({'error': 'Invalid signature'}), 400
     
-    # Manejar eventos
-    event_type = event.get('type') if isinstance(event, dict) else event['type']
-    
-    if event_type == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        payment_intent_id = payment_intent['id']
-        
-        logger.info(f"Payment Intent exitoso: {payment_intent_id}")
-        
-        # Buscar transacción en la base de datos
-        transaction = Transaction.query.filter_by(
-            payment_intent_id=payment_intent_id
-        ).first()
-        
-        if transaction:
-            # Actualizar transacción
-            transaction.status = 'completed'
-            transaction.completed_at = datetime.utcnow()
-            
-            # Crear o actualizar suscripción
-            subscription = Subscription.query.filter_by(
-                user_id=transaction.user_id,
-                plan_type='pixelie_plan'
-            ).first()
-            
-            if not subscription:
-                # Crear nueva suscripción
-                subscription = Subscription(
-                    user_id=transaction.user_id,
-                    plan_type='pixelie_plan',
-                    amount=transaction.amount,
-                    currency=transaction.currency,
-                    status='active',
-                    subscription_id=payment_intent_id,
-                    current_period_start=datetime.utcnow(),
-                    current_period_end=datetime.utcnow() + timedelta(days=365)  # Plan de un año
-                )
-                db.session.add(subscription)
-            else:
-                # Actualizar suscripción existente
-                subscription.status = 'active'
-                subscription.current_period_start = datetime.utcnow()
-                subscription.current_period_end = datetime.utcnow() + timedelta(days=365)
-            
-            db.session.commit()
-            logger.info(f"Suscripción activada para usuario {transaction.user_id}")
-        else:
-            logger.warning(f"Transacción no encontrada para payment_intent_id: {payment_intent_id}")
+    try:
+        event = json.loads(payload)
+    except:
+        return jsonify({'error': 'Invalid payload'}), 400
+    if not isinstance(event, dict) or not event.get('id'):
+        return jsonify({'error': 'Invalid payload'}), 400
     
-    elif event_type == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        payment_intent_id = payment_intent['id']
-        
-        logger.info(f"Payment Intent fallido: {payment_intent_id}")
-        
-        # Actualizar transacción como fallida
-        transaction = Transaction.query.filter_by(
-            payment_intent_id=payment_intent_id
-        ).first()
-        
-        if transaction:
-            transaction.status = 'failed'
-            db.session.commit()
+    try:
+        created = ingest_event(event, payload.decode('utf-8'))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al guardar evento de Stripe {event.get('id')}: {str(e)}")
+        # Stripe reintentará la entrega
+        return jsonify({'error': 'No se pudo guardar el evento'}), 500
     
-    return jsonify({'status': 'success'}), 200
+    if not created:
+        logger.info(f"Evento de Stripe repetido: {event['id']}")
+    return jsonify({'status': 'success', 'duplicate': not created}), 200
 
 @app.route('/api/payment-status/<payment_intent_id>', methods=['GET'])
 @login_required
@@ -1550,5 +1617,224 @@ def payment_status(payment_intent_id):
         logger.error(f"Error al verificar estado de pago: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# Canales SSE abiertos a la vez por proceso (cada uno ocupa un hilo del worker mientras espera)
+payment_stream_slots = threading.BoundedSemaphore(app.config.get('PAYMENT_STREAM_MAX_CLIENTS', 2))
+PAYMENT_STREAM_KEEPALIVE = 15
+FINAL_PAYMENT_STATUSES = ('completed', 'failed', 'refunded')
+
+def sse_message(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/payment-status/<payment_intent_id>/stream', methods=['GET'])
+@login_required
+def payment_status_stream(payment_intent_id):
+    """Server-Sent Events con los cambios de un pago y de la suscripción, en lugar de consultar payment-status"""
+    if request.method == 'HEAD':
+        # Sin cuerpo no hay canal: no se ocupa un lugar ni se registra un cliente
+        return Response(mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    
+    if not payment_stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Demasiadas conexiones de estado abiertas, usa /api/payment-status'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    user_id = current_user.id
+    messages = None
+    released = threading.Lock()
+    
+    def release():
+        """Libera el lugar y la suscripción una sola vez (al terminar el canal o al cerrar la respuesta)"""
+        if not released.acquire(blocking=False):
+            return
+        if messages is not None:
+            payment_event_broker.unsubscribe(user_id, messages)
+        payment_stream_slots.release()
+    
+    try:
+        # Suscribirse antes de leer el estado para no perder avisos entre la consulta y la espera
+        messages = payment_event_broker.subscribe(app, user_id)
+        transaction = Transaction.query.filter_by(
+            payment_intent_id=payment_intent_id,
+            user_id=user_id
+        ).first()
+        if not transaction:
+            release()
+            return jsonify({'error': 'Transacción no encontrada'}), 404
+        initial = transaction_message(transaction)
+    except Exception as e:
+        release()
+        logger.error(f"Error al abrir canal de estado de pago: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    timeout = app.config.get('PAYMENT_STREAM_TIMEOUT', 60)
+    
+    def stream():
+        try:
+            yield f"retry: 3000\n{sse_message('transaction', initial)}"
+            if initial['status'] in FINAL_PAYMENT_STATUSES:
+                return
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # El navegador vuelve a conectarse solo (EventSource)
+                    yield sse_message('timeout', {'payment_intent_id': payment_intent_id})
+                    return
+                try:
+                    message = messages.get(timeout=min(remaining, PAYMENT_STREAM_KEEPALIVE))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message['type'] == 'subscription':
+                    yield sse_message('subscription', message)
+                elif message.get('payment_intent_id') == payment_intent_id:
+                    yield sse_message('transaction', message)
+                    if message['status'] in FINAL_PAYMENT_STATUSES:
+                        return
+        finally:
+            release()
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    # Si el generador nunca arranca (cliente que cierra antes del primer byte) su finally no corre
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sin buffer en proxies (nginx)
+    return response
+
+# ==================== COMANDOS CLI ====================
+
+@app.cli.command('rebuild-recommendations')
+@click.option('--chunk-size', default=500, show_default=True, help='Usuarios por bloque')
+def rebuild_recommendations_command(chunk_size):
+    """Recalcula las recomendaciones materializadas de todos los usuarios"""
+    total = rebuild_all_recommendations(chunk_size=chunk_size)
+    click.echo(f"Recomendaciones recalculadas para {total} usuarios")
+
+@app.cli.command('build-game-neighbors')
+@click.option('--chunk-size', default=10000, show_default=True, help='Filas de user_games por bloque')
+@click.option('--top-n', default=20, show_default=True, help='Vecinos guardados por juego')
+@click.option('--rebuild-recommendations/--no-rebuild-recommendations', default=True,
+              help='Recalcular después las recomendaciones materializadas')
+def build_game_neighbors_command(chunk_size, top_n, rebuild_recommendations):
+    """Recalcula la matriz de similitud item-item a partir de user_games"""
+    stats = build_game_neighbors(chunk_size=chunk_size, top_n=top_n)
+    click.echo(f"Vecinos calculados: {stats['neighbors']} ({stats['users']} usuarios, {stats['pairs']} pares de juegos)")
+    if rebuild_recommendations:
+        total = rebuild_all_recommendations()
+        click.echo(f"Recomendaciones recalculadas para {total} usuarios")
+
+@app.cli.command('generate-recommendations')
+@click.option('--processes', default=None, type=int, help='Procesos del pool (por defecto, uno por CPU)')
+@click.option('--chunk-size', default=500, show_default=True, help='Usuarios por bloque')
+@click.option('--checkpoint', 'checkpoint_path', default=DEFAULT_CHECKPOINT_PATH, show_default=True,
+              help='Archivo donde se guarda el avance')
+@click.option('--resume/--no-resume', default=True, help='Continuar desde el último checkpoint')
+def generate_recommendations_command(processes, chunk_size, checkpoint_path, resume):
+    """Genera las recomendaciones de todos los usuarios en paralelo (campañas de email/push)"""
+    stats = generate_all_recommendations(processes=processes, chunk_size=chunk_size,
+                                         checkpoint_path=checkpoint_path, resume=resume, report=click.echo)
+    click.echo(f"Recomendaciones generadas para {stats['users']} usuarios en {stats['seconds']:.1f}s "
+               f"({stats['users_per_second']:.1f} usuarios/s)")
+
+@app.cli.command('verify-user-stats')
+@click.option('--fix', is_flag=True, help='Corregir los contadores que no coincidan')
+def verify_user_stats_command(fix):
+    """Verifica los contadores de juegos de users contra user_games"""
+    mismatches = find_counter_mismatches()
+    for user_id, stored, real in mismatches:
+        click.echo(f"Usuario {user_id}: guardado {stored}, real {real}")
+    click.echo(f"{len(mismatches)} usuarios con contadores incorrectos")
+    if fix and mismatches:
+        updated = rebuild_user_counters([user_id for user_id, _, _ in mismatches])
+        db.session.commit()
+        click.echo(f"Contadores corregidos para {updated} usuarios")
+
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Solo mostrar las migraciones aplicadas y pendientes')
+def migrate_command(show_status):
+    """Aplica las migraciones de esquema pendientes"""
+    if show_status:
+        done = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            click.echo(f"{'[x]' if version in done else '[ ]'} {version:3d} {description}")
+        return
+    applied = run_migrations(report=click.echo)
+    click.echo(f"Migraciones aplicadas: {len(applied)}" if applied else "El esquema ya está al día")
+
+@app.cli.command('bootstrap')
+@click.option('--force-seed', is_flag=True, help='Volver a sembrar el catálogo aunque los datos no hayan cambiado')
+def bootstrap_command(force_seed):
+    """Aplica las migraciones pendientes y siembra el catálogo (una vez por despliegue)"""
+    if not run_bootstrap(auto_migrate=True):
+        raise click.ClickException("No se pudo completar el bootstrap")
+    if force_seed:
+        added, updated = seed_catalog(force=True)
+        click.echo(f"Juegos agregados: {added}, actualizados: {updated}")
+    click.echo("Bootstrap completado")
+
+@app.cli.command('sweep-subscriptions')
+@click.option('--chunk-size', default=500, show_default=True, help='Suscripciones por bloque')
+def sweep_subscriptions_command(chunk_size):
+    """Pasa a básico las suscripciones cuyo periodo pagado ya terminó"""
+    total = sweep_expired_subscriptions(chunk_size=chunk_size)
+    click.echo(f"{total} suscripciones pasadas a básico")
+
+@app.cli.command('purge-revoked-tokens')
+def purge_revoked_tokens_command():
+    """Elimina de revoked_tokens las filas de tokens ya vencidos"""
+    deleted = purge_expired_tokens()
+    click.echo(f"{deleted} tokens revocados vencidos eliminados")
+
+@app.cli.command('process-stripe-events')
+def process_stripe_events_command():
+    """Procesa los eventos de Stripe pendientes (sin esperar al hilo del proceso web)"""
+    processed = process_pending_events()
+    click.echo(f"{processed} eventos de Stripe procesados")
+
+@app.cli.command('replay-stripe-events')
+@click.argument('fixture', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-email', default=None, help='Crear transacciones pendientes de este usuario para los pagos del archivo')
+@click.option('--process/--no-process', default=True, show_default=True, help='Procesar los eventos al terminar')
+def replay_stripe_events_command(fixture, user_email, process):
+    """Reenvía al webhook los eventos de un archivo JSON (firmados si hay STRIPE_WEBHOOK_SECRET)"""
+    with open(fixture, encoding='utf-8') as f:
+        events = json.load(f)
+    
+    if user_email:
+        user = User.query.filter_by(email=user_email.lower()).first()
+        if not user:
+            raise click.ClickException(f"Usuario no encontrado: {user_email}")
+        for event in events:
+            obj = event['data']['object']
+            if obj.get('object') != 'payment_intent' or Transaction.query.filter_by(payment_intent_id=obj['id']).first():
+                continue
+            db.session.add(Transaction(
+                user_id=user.id,
+                transaction_type='subscription',
+                amount=obj.get('amount', 0) / 100,
+                currency=(obj.get('currency') or 'mxn').upper(),
+                payment_method='stripe',
+                payment_intent_id=obj['id'],
+                status='pending'
+            ))
+        db.session.commit()
+    
+    secret = app.config.get('STRIPE_WEBHOOK_SECRET')
+    client = app.test_client()
+    for event in events:
+        payload = json.dumps(event)
+        headers = {'Stripe-Signature': sign_payload(payload, secret)} if secret else {}
+        response = client.post('/api/stripe-webhook', data=payload, headers=headers, content_type='application/json')
+        result = response.get_json() or {}
+        click.echo(f"{event['id']} {event['type']}: {response.status_code}{' (repetido)' if result.get('duplicate') else ''}")
+    
+    if process:
+        processed = process_pending_events()
+        click.echo(f"{processed} eventos de Stripe procesados")
+        payment_intents = {event['data']['object'].get('id') for event in events
+                           if event['data']['object'].get('object') == 'payment_intent'}
+        for transaction in Transaction.query.filter(Transaction.payment_intent_id.in_(payment_intents)).all():
+            click.echo(f"{transaction.payment_intent_id}: {transaction.status}")
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8000)
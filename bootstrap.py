@@ -0,0 +1,187 @@
+"""
+Bootstrap de la base de datos: migraciones pendientes y juegos sembrados.
+
+Se ejecuta una vez por despliegue, antes de crear los workers:
+- gunicorn.conf.py lo lanza desde el proceso maestro (`flask bootstrap`) y
+  marca a los workers con BOOTSTRAP_ON_IMPORT=false para que lo omitan.
+- En desarrollo (`python app.py`) init_db lo ejecuta al importar la app.
+
+Todo corre bajo advisory_lock('bootstrap'), así que dos procesos nunca siembran
+a la vez. La siembra guarda una huella de los datos en bootstrap_state: si no
+cambiaron, no se hace nada más que esa consulta.
+"""
+
+import hashlib
+import json
+import logging
+
+from sqlalchemy import bindparam, func, select, update
+
+from catalog_cache import catalog_cache
+from db_lock import advisory_lock
+from migrations import run_migrations, schema_is_current
+from models import db, BootstrapState, Game, platforms_to_mask
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SEED_KEY = 'catalog_seed'
+
+# Juegos de ejemplo: solo se crean si el catálogo está vacío
+SAMPLE_GAMES = [
+    {'name': 'Mario Kart', 'description': 'Carreras emocionantes con personajes icónicos',
+     'price': 250.00, 'platforms': 'Android,iOS', 'category': 'Racing'},
+    {'name': 'Roblox', 'description': 'Plataforma de creación y juego',
+     'price': 150.00, 'platforms': 'Android,iOS,PC', 'category': 'Sandbox'},
+    {'name': 'Call of Duty', 'description': 'Acción intensa y estratégica',
+     'price': 500.00, 'platforms': 'PC,Console', 'category': 'FPS'},
+    {'name': 'Space Wars', 'description': 'Engage in intergalactic battles, explore unknown galaxies',
+     'price': 0.00, 'platforms': 'PC', 'category': 'Strategy'},
+    {'name': 'Return of the Cars', 'description': 'Rev up your engines and race through thrilling tracks',
+     'price': 0.00, 'platforms': 'PC,Console', 'category': 'Racing'},
+    {'name': 'Planes of Gloria', 'description': 'Soar through the skies, engage in epic dogfights',
+     'price': 0.00, 'platforms': 'PC', 'category': 'Simulation'},
+    {'name': 'Earth Wars', 'description': 'Rewrite history in intense global battles',
+     'price': 0.00, 'platforms': 'PC,Console', 'category': 'Strategy'},
+]
+
+# Juegos chistosos: se crean o se actualizan en cada cambio de estos datos
+FUNNY_GAMES = [
+    {
+        'name': 'Frootilupis Match',
+        'description': '🍩 ¡Combina 3 o más cereales del mismo color! Un juego adictivo donde los cereales vuelan y explotan con efectos increíbles. ¿Tendrás lo necesario para alcanzar el puntaje más alto?',
+        'price': 0.00,
+        'platforms': 'Android',
+        'category': 'Match-3',
+        'game_url': 'flootilupis.html'
+    },
+    {
+        'name': 'Chocopops Volador',
+        'description': '🍫 ¡Vuela como un chocolate loco! Toca la pantalla para hacer volar tu chocolate y esquiva los obstáculos verdes. ¿Podrás llegar más lejos que tus amigos?',
+        'price': 0.00,
+        'platforms': 'Android',
+        'category': 'Arcade',
+        'game_url': 'chocopops.html'
+    },
+    {
+        'name': 'SnackAttack Laberinto',
+        'description': '🍿 ¡Come todos los snacks antes de que los fantasmas te atrapen! Recolecta puntos dorados y usa los power pellets para convertirte en el rey del laberinto.',
+        'price': 0.00,
+        'platforms': 'Android',
+        'category': 'Arcade',
+        'game_url': 'snackattack.html'
+    },
+    {
+        'name': 'CerealKiller Connect',
+        'description': '🥣 ¡Conecta los cereales del mismo color sin que se crucen! Dibuja líneas táctiles para unir los puntos. Cada nivel es más difícil que el anterior. ¿Podrás con el desafío?',
+        'price': 0.00,
+        'platforms': 'Android',
+        'category': 'Puzzle',
+        'game_url': 'cerealkiller.html'
+    },
+    {
+        'name': 'Munchies Memory',
+        'description': '🧠 ¡Encuentra todos los pares de snacks antes de que se acabe el tiempo! Entrena tu memoria con este juego relajante lleno de deliciosos snacks. ¿Tienes buena memoria?',
+        'price': 0.00,
+        'platforms': 'Android',
+        'category': 'Memory',
+        'game_url': 'munchies.html'
+    }
+]
+
+# Nombres anteriores de los juegos chistosos (se renombran al sembrar)
+RENAMED_GAMES = {
+    'Frootilupis Match': 'Flootilupis',
+    'Chocopops Volador': 'Chocopops',
+    'SnackAttack Laberinto': 'SnackAttack',
+    'CerealKiller Connect': 'CerealKiller',
+    'Munchies Memory': 'Munchies'
+}
+
+_SEEDED_COLUMNS = ('name', 'description', 'price', 'platform_mask', 'category', 'game_url')
+
+
+def seed_fingerprint():
+    """Huella de los datos sembrados; cambia cuando se editan las listas de arriba"""
+    payload = json.dumps([SAMPLE_GAMES, FUNNY_GAMES, RENAMED_GAMES], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _game_values(game_data):
+    return {
+        'name': game_data['name'],
+        'description': game_data['description'],
+        'price': game_data['price'],
+        'platform_mask': platforms_to_mask(game_data['platforms']),
+        'category': game_data['category'],
+        'game_url': game_data.get('game_url')
+    }
+
+
+def seed_catalog(force=False):
+    """
+    Crea los juegos de ejemplo (si el catálogo está vacío) y crea o actualiza los
+    juegos chistosos con un INSERT y un UPDATE por lotes. Retorna (agregados, actualizados).
+    """
+    fingerprint = seed_fingerprint()
+    state = db.session.get(BootstrapState, CATALOG_SEED_KEY)
+    if state is not None and state.value == fingerprint and not force:
+        return 0, 0
+
+    table = Game.__table__
+    names = [game['name'] for game in FUNNY_GAMES] + list(RENAMED_GAMES.values())
+    existing = {
+        row.name: row
+        for row in db.session.execute(
+            select(table.c.id, *[table.c[column] for column in _SEEDED_COLUMNS]).where(table.c.name.in_(names))
+        )
+    }
+
+    inserts = []
+    if db.session.execute(select(func.count()).select_from(table)).scalar() == 0:
+        inserts.extend(_game_values(game) for game in SAMPLE_GAMES)
+
+    updates = []
+    for game_data in FUNNY_GAMES:
+        values = _game_values(game_data)
+        row = existing.get(game_data['name']) or existing.get(RENAMED_GAMES.get(game_data['name']))
+        if row is None:
+            inserts.append(values)
+        elif any(getattr(row, column) != values[column] for column in _SEEDED_COLUMNS):
+            updates.append({'game_id': row.id, **values})
+
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+    if updates:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('game_id'))
+            .values({column: bindparam(column) for column in _SEEDED_COLUMNS}),
+            updates
+        )
+
+    if state is None:
+        db.session.add(BootstrapState(key=CATALOG_SEED_KEY, value=fingerprint))
+    else:
+        state.value = fingerprint
+    db.session.commit()
+
+    # Las sentencias por lotes no pasan por los eventos del ORM
+    if inserts or updates:
+        catalog_cache.bump_version()
+        logger.info(f"Catálogo sembrado: {len(inserts)} juegos agregados, {len(updates)} actualizados")
+    return len(inserts), len(updates)
+
+
+def run_bootstrap(auto_migrate=True):
+    """
+    Aplica las migraciones pendientes y siembra el catálogo, una sola vez a la vez.
+    Retorna False si el esquema no está al día y auto_migrate es False.
+    """
+    with advisory_lock('bootstrap'):
+        if not schema_is_current():
+            if not auto_migrate:
+                logger.error("El esquema de base de datos no está al día; ejecuta `flask migrate`")
+                return False
+            applied = run_migrations()
+            logger.info(f"Migraciones aplicadas: {applied or 'ninguna (aplicadas por otro proceso)'}")
+        seed_catalog()
+    return True
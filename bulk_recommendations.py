@@ -0,0 +1,120 @@
+"""
+Generación masiva de recomendaciones para todos los usuarios (campañas de email y push).
+
+El proceso principal recorre los usuarios por bloques y reparte cada bloque a un
+pool de procesos. Cada proceso usa la misma lógica que /api/games/recommendations
+(recommendations.materialize_recommendations) y escribe su bloque con un solo upsert.
+
+El avance se guarda en un archivo de checkpoint con el último usuario cuyo bloque
+(y todos los anteriores) ya se escribió, para poder continuar tras una interrupción.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+
+from models import db
+from recommendations import iter_user_chunks, materialize_recommendations
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = '.bulk_recommendations.checkpoint'
+
+# Contexto de app de cada proceso del pool
+_worker_app_context = None
+
+
+class Checkpoint:
+    """Último id de usuario procesado, guardado en un archivo JSON"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return int(json.load(f)['last_user_id'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def save(self, last_user_id):
+        # Escribir en un archivo temporal y reemplazar para no dejar un checkpoint a medias
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_user_id': last_user_id, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _init_worker():
+    """Inicializa un proceso del pool con su propio contexto de app y conexiones"""
+    global _worker_app_context
+    from app import app
+    _worker_app_context = app.app_context()
+    _worker_app_context.push()
+    # Las conexiones heredadas del proceso padre no se pueden compartir
+    db.engine.dispose(close=False)
+
+
+def _process_chunk(users):
+    try:
+        count = materialize_recommendations(users)
+        db.session.commit()
+        return count
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def generate_all_recommendations(processes=None, chunk_size=500, checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+                                 resume=True, report=None):
+    """
+    Genera las recomendaciones de todos los usuarios en paralelo.
+    report es una función opcional que recibe un mensaje de progreso por bloque.
+    Retorna un diccionario con usuarios procesados, segundos y usuarios por segundo.
+    """
+    report = report or logger.info
+    processes = processes or os.cpu_count() or 1
+    checkpoint = Checkpoint(checkpoint_path)
+    start_after = checkpoint.load() if resume else 0
+    if start_after:
+        report(f"Continuando después del usuario {start_after}")
+
+    # Bloques en vuelo acotados para no cargar todos los usuarios en memoria
+    max_in_flight = processes * 2
+    in_flight = deque()
+    total = 0
+    started = time.monotonic()
+
+    def drain_one():
+        nonlocal total
+        last_user_id, result = in_flight.popleft()
+        total += result.get()
+        # Los bloques se confirman en orden, así que todos los anteriores ya están escritos
+        checkpoint.save(last_user_id)
+        elapsed = time.monotonic() - started
+        report(f"{total} usuarios procesados ({total / elapsed:.1f} usuarios/s), último id {last_user_id}")
+
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        for users in iter_user_chunks(chunk_size, after_user_id=start_after):
+            in_flight.append((users[-1][0], pool.apply_async(_process_chunk, (users,))))
+            if len(in_flight) >= max_in_flight:
+                drain_one()
+        while in_flight:
+            drain_one()
+
+    checkpoint.clear()
+    elapsed = time.monotonic() - started
+    return {
+        'users': total,
+        'seconds': elapsed,
+        'users_per_second': total / elapsed if elapsed else 0.0
+    }
@@ -0,0 +1,117 @@
+"""
+Caché en memoria del catálogo de juegos.
+
+El catálogo solo cambia cuando init_db agrega o actualiza juegos, así que se
+guarda ya serializado y se invalida con un número de versión que se incrementa
+cada vez que se confirma (commit) un cambio sobre la tabla games.
+"""
+
+import hashlib
+import threading
+
+from flask import json
+from sqlalchemy import event
+from sqlalchemy.orm import Session, defer
+
+from models import Game
+
+
+class CatalogSnapshot:
+    """Catálogo serializado para una versión concreta"""
+
+    def __init__(self, version, games, body):
+        self.version = version
+        self.games = games
+        self.games_by_id = {game['id']: game for game in games}
+        self.body = body
+        # El ETag depende solo del contenido, así que es el mismo en todos los workers
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+class CatalogCache:
+    """Mantiene el catálogo pre-serializado y lo reconstruye cuando cambia la versión"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def bump_version(self):
+        """Invalida el catálogo en caché"""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def get(self):
+        """Obtener el catálogo actual, reconstruyéndolo solo si la versión cambió"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self._version:
+                return snapshot
+
+            version = self._version
+            games = [game.to_dict() for game in Game.query.order_by(Game.id).all()]
+            body = json.dumps({'success': True, 'games': games}, separators=(',', ':')).encode('utf-8')
+            snapshot = CatalogSnapshot(version, games, body)
+            self._snapshot = snapshot
+            return snapshot
+
+
+catalog_cache = CatalogCache()
+
+
+def user_games_to_dicts(user_games, include_description=True):
+    """
+    Serializa una lista de UserGame sin una consulta por fila: los juegos salen del
+    catálogo en caché y los que falten (p. ej. agregados desde otro worker) se cargan
+    en una sola consulta. Las filas cuyo juego ya no existe salen con 'game': None.
+    Con include_description=False se omite la descripción.
+    """
+    games_by_id = catalog_cache.get().games_by_id
+    missing_ids = {ug.game_id for ug in user_games if ug.game_id not in games_by_id}
+    if missing_ids:
+        query = Game.query.filter(Game.id.in_(missing_ids))
+        if not include_description:
+            query = query.options(defer(Game.description))
+        games_by_id = dict(games_by_id)
+        games_by_id.update((game.id, game.to_dict(include_description)) for game in query)
+
+    results = []
+    for ug in user_games:
+        game_data = games_by_id.get(ug.game_id)
+        if game_data is not None and not include_description:
+            game_data = {key: value for key, value in game_data.items() if key != 'description'}
+        # Si el juego ya no existe sale como None, sin cargar ug.game por separado
+        results.append(ug.to_dict(game_data, load_game=False))
+    return results
+
+
+# ==================== INVALIDACIÓN ====================
+
+@event.listens_for(Session, 'after_flush')
+def _mark_catalog_changes(session, flush_context):
+    """Marca la sesión si el flush tocó algún juego"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Game):
+            session.info['catalog_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_catalog_version(session):
+    """Incrementa la versión del catálogo cuando se confirma un cambio en games"""
+    if session.info.pop('catalog_changed', False):
+        catalog_cache.bump_version()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
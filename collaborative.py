@@ -0,0 +1,117 @@
+"""
+Filtrado colaborativo item-item construido a partir de user_games.
+
+El trabajo por lotes recorre user_games por bloques (paginación por llave sobre
+(user_id, game_id)), acumula co-ocurrencias dispersas entre pares de juegos y
+guarda los N vecinos más similares de cada juego en game_neighbors. La memoria
+depende del número de pares de juegos distintos, no del número de filas.
+
+Al servir recomendaciones solo se consultan los vecinos ya calculados.
+"""
+
+import heapq
+import logging
+import math
+from collections import defaultdict
+
+from sqlalchemy import and_, or_
+
+from models import db, GameNeighbor, UserGame
+
+logger = logging.getLogger(__name__)
+
+# Máximo de juegos por usuario que cuentan para las co-ocurrencias (acota el costo cuadrático)
+MAX_BASKET_SIZE = 200
+
+
+def _stream_baskets(chunk_size):
+    """Genera (user_id, [game_ids]) recorriendo user_games por bloques ordenados"""
+    last_user_id, last_game_id = 0, 0
+    current_user_id, basket = None, []
+    while True:
+        rows = db.session.query(UserGame.user_id, UserGame.game_id).filter(
+            or_(UserGame.user_id > last_user_id,
+                and_(UserGame.user_id == last_user_id, UserGame.game_id > last_game_id))
+        ).order_by(UserGame.user_id, UserGame.game_id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        for user_id, game_id in rows:
+            if user_id != current_user_id:
+                if basket:
+                    yield current_user_id, basket
+                current_user_id, basket = user_id, []
+            basket.append(game_id)
+
+        last_user_id, last_game_id = rows[-1]
+
+    if basket:
+        yield current_user_id, basket
+
+
+def build_game_neighbors(chunk_size=10000, top_n=20, max_basket_size=MAX_BASKET_SIZE):
+    """
+    Recalcula la tabla game_neighbors.
+    Retorna un diccionario con estadísticas de la construcción.
+    """
+    game_counts = defaultdict(int)
+    pair_counts = defaultdict(int)  # (juego menor, juego mayor) -> usuarios que jugaron ambos
+    users = 0
+
+    for _, basket in _stream_baskets(chunk_size):
+        users += 1
+        basket = sorted(set(basket))[:max_basket_size]
+        for game_id in basket:
+            game_counts[game_id] += 1
+        for i, game_a in enumerate(basket):
+            for game_b in basket[i + 1:]:
+                pair_counts[(game_a, game_b)] += 1
+
+    # Similitud coseno entre juegos a partir de las co-ocurrencias
+    neighbors = defaultdict(list)
+    for (game_a, game_b), count in pair_counts.items():
+        score = count / math.sqrt(game_counts[game_a] * game_counts[game_b])
+        neighbors[game_a].append((score, count, game_b))
+        neighbors[game_b].append((score, count, game_a))
+
+    rows = []
+    for game_id, candidates in neighbors.items():
+        for score, count, neighbor_id in heapq.nlargest(top_n, candidates):
+            rows.append({
+                'game_id': game_id,
+                'neighbor_id': neighbor_id,
+                'score': score,
+                'co_occurrences': count
+            })
+
+    # Reemplazar la tabla completa en una sola transacción
+    db.session.query(GameNeighbor).delete()
+    if rows:
+        db.session.execute(GameNeighbor.__table__.insert(), rows)
+    db.session.commit()
+
+    stats = {'users': users, 'games': len(game_counts), 'pairs': len(pair_counts), 'neighbors': len(rows)}
+    logger.info(f"Vecinos de juegos recalculados: {stats}")
+    return stats
+
+
+def load_neighbors(game_ids):
+    """Obtener {game_id: [(neighbor_id, score), ...]} para los juegos dados"""
+    neighbors = defaultdict(list)
+    if not game_ids:
+        return neighbors
+    rows = db.session.query(GameNeighbor.game_id, GameNeighbor.neighbor_id, GameNeighbor.score).filter(
+        GameNeighbor.game_id.in_(set(game_ids))
+    )
+    for game_id, neighbor_id, score in rows:
+        neighbors[game_id].append((neighbor_id, score))
+    return neighbors
+
+
+def neighbor_scores(played_game_ids, neighbors):
+    """Suma la similitud de cada juego con los juegos que el usuario ha jugado"""
+    scores = defaultdict(float)
+    for game_id in played_game_ids:
+        for neighbor_id, score in neighbors.get(game_id, ()):
+            scores[neighbor_id] += score
+    return scores
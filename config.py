@@ -32,6 +32,55 @@ class Config:
         'pool_recycle': 300,
     }
     
+    # Hash de contraseñas (método de werkzeug, p. ej. 'scrypt' o 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+    PASSWORD_HASH_SALT_LENGTH = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH') or 16)
+    # Pool de hash por proceso: hilos, solicitudes en cola antes de responder 503 y espera máxima
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING') or 16)
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+    
+    # Límite de peticiones en rutas de autenticación y escritura (ver rate_limit.py)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # 'memory' (límite por worker) o 'database' (tabla compartida entre workers)
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE') or 'memory'
+    
+    # Tokens de la app Android (segundos): acceso, refresco y sincronización de la lista de revocados
+    ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL') or 900)
+    REFRESH_TOKEN_TTL = int(os.environ.get('REFRESH_TOKEN_TTL') or 30 * 86400)
+    TOKEN_DENYLIST_SYNC = int(os.environ.get('TOKEN_DENYLIST_SYNC') or 30)
+    
+    # Segundos máximos que se guardan los derechos por suscripción (también vencen en current_period_end)
+    ENTITLEMENT_CACHE_TTL = int(os.environ.get('ENTITLEMENT_CACHE_TTL') or 60)
+    
+    # Aplicar migraciones pendientes al arrancar (si es False, ejecutar `flask migrate` en cada despliegue)
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'true').lower() in ['true', 'on', '1']
+    
+    # Migrar y sembrar el catálogo al importar la app. gunicorn.conf.py lo ejecuta una vez en el
+    # proceso maestro (`flask bootstrap`) y lo desactiva para los workers
+    BOOTSTRAP_ON_IMPORT = os.environ.get('BOOTSTRAP_ON_IMPORT', 'true').lower() in ['true', 'on', '1']
+    
+    # Segundos entre barridos de suscripciones vencidas en el proceso web (0 = solo con `flask sweep-subscriptions`)
+    SUBSCRIPTION_SWEEP_INTERVAL = int(os.environ.get('SUBSCRIPTION_SWEEP_INTERVAL') or 300)
+    
+    # Segundos entre revisiones de eventos de Stripe pendientes en el proceso web
+    # (los recibidos por el mismo proceso se procesan de inmediato; 0 = solo con `flask process-stripe-events`)
+    STRIPE_EVENT_POLL_INTERVAL = int(os.environ.get('STRIPE_EVENT_POLL_INTERVAL') or 5)
+    
+    # Segundos que se guarda la identidad del usuario para el user_loader (0 = sin caché)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)
+    
+    # Paginación del catálogo de juegos (/api/games)
+    CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE') or 50)
+    CATALOG_MAX_PAGE_SIZE = int(os.environ.get('CATALOG_MAX_PAGE_SIZE') or 100)
+    
+    # Historial de juegos del usuario (/api/user/games/history)
+    HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE') or 50)
+    
+    # Búsqueda de juegos (/api/games/search)
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE') or 20)
+    SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE') or 50)
+    
     # Configuración de email (Flask-Mail)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -49,7 +98,29 @@ class Config:
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
     
+    # Pasarela de pagos: 'stripe' o 'fake' (pagos simulados en memoria, solo para pruebas de carga)
+    PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'stripe').lower()
+    
+    # Segundos máximos para conectar y para esperar la respuesta de Stripe
+    STRIPE_CONNECT_TIMEOUT = float(os.environ.get('STRIPE_CONNECT_TIMEOUT') or 3)
+    STRIPE_READ_TIMEOUT = float(os.environ.get('STRIPE_READ_TIMEOUT') or 10)
+    
+    # Conexiones keep-alive a Stripe por worker y reintentos ante errores transitorios
+    STRIPE_POOL_SIZE = int(os.environ.get('STRIPE_POOL_SIZE') or 10)
+    STRIPE_MAX_RETRIES = int(os.environ.get('STRIPE_MAX_RETRIES') or 2)
+    
+    # Latencia simulada por llamada con PAYMENT_GATEWAY=fake
+    FAKE_GATEWAY_LATENCY_MS = int(os.environ.get('FAKE_GATEWAY_LATENCY_MS') or 50)
+    
+    # Canal SSE de estado de pago: segundos por conexión (el navegador reconecta) y conexiones por proceso.
+    # Cada conexión ocupa un hilo de gunicorn: debe ser menor que --threads (al superarlo, el checkout consulta)
+    PAYMENT_STREAM_TIMEOUT = int(os.environ.get('PAYMENT_STREAM_TIMEOUT') or 60)
+    PAYMENT_STREAM_MAX_CLIENTS = int(os.environ.get('PAYMENT_STREAM_MAX_CLIENTS') or 2)
+    
     # Plan de suscripción Pixelie Plan
     PIXELIE_PLAN_PRICE = 100.00  # MXN
     PIXELIE_PLAN_CURRENCY = 'mxn'
+    
+    # Horas durante las que se reutiliza un pago pendiente del usuario en lugar de crear otro
+    PAYMENT_INTENT_REUSE_HOURS = int(os.environ.get('PAYMENT_INTENT_REUSE_HOURS') or 24)
 
@@ -0,0 +1,56 @@
+"""
+Bloqueo exclusivo entre procesos para tareas que deben ejecutarse una sola vez
+a la vez (migraciones de esquema, bootstrap del catálogo).
+
+- PostgreSQL: pg_advisory_lock en una conexión dedicada.
+- SQLite: flock sobre un archivo junto a la base de datos.
+- Otros motores (o SQLite en memoria): sin bloqueo.
+"""
+
+import zlib
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from models import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _lock_key(name):
+    """Llave entera estable para pg_advisory_lock a partir del nombre"""
+    return zlib.crc32(f'pixelpick:{name}'.encode('utf-8'))
+
+
+@contextmanager
+def advisory_lock(name):
+    """Mantiene un bloqueo exclusivo llamado name mientras dura el bloque with"""
+    engine = db.engine
+    dialect = engine.dialect.name
+
+    if dialect == 'postgresql':
+        key = _lock_key(name)
+        with engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': key})
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
+                conn.commit()
+        return
+
+    database = engine.url.database if dialect == 'sqlite' else None
+    if not database or database == ':memory:' or fcntl is None:
+        yield
+        return
+
+    with open(f'{database}.{name}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,181 @@
+"""
+Derechos de acceso del usuario según su suscripción.
+
+Reúne en un solo lugar la regla que usan las rutas: un plan premium activo da
+acceso premium, y un plan básico con periodo pagado vigente también lo da
+hasta current_period_end.
+
+La suscripción activa de cada usuario se guarda en memoria como un registro
+compacto (EntitlementRecord). La entrada vence a los ENTITLEMENT_CACHE_TTL
+segundos o al llegar current_period_end, lo que ocurra primero, y se invalida
+al confirmar cualquier cambio sobre subscriptions.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Subscription
+
+PREMIUM_PLAN = 'pixelie_plan'
+BASIC_PLAN = 'pixelie_basic'
+
+DEFAULT_TTL = 60
+MAX_CACHED_USERS = 10000
+
+
+def is_premium_plan(plan_type):
+    """True para 'pixelie_plan' y variantes premium de Pixelie (no básicas)"""
+    plan_type = plan_type or ''
+    return plan_type == PREMIUM_PLAN or ('pixelie' in plan_type.lower() and 'basic' not in plan_type.lower())
+
+
+def active_subscription(user_id):
+    """Suscripción activa del usuario (objeto ORM, para rutas que la modifican)"""
+    return Subscription.query.filter_by(user_id=user_id, status='active').first()
+
+
+class EntitlementRecord:
+    """Copia compacta de la suscripción activa de un usuario (o de su ausencia)"""
+
+    __slots__ = ('subscription_id', 'user_id', 'plan_type', 'amount', 'currency', 'status',
+                 'current_period_start', 'current_period_end', 'cancel_at_period_end')
+
+    def __init__(self, user_id, subscription=None):
+        self.user_id = user_id
+        self.subscription_id = subscription.id if subscription else None
+        self.plan_type = subscription.plan_type if subscription else None
+        self.amount = float(subscription.amount) if subscription and subscription.amount else 0.0
+        self.currency = subscription.currency if subscription else None
+        self.status = subscription.status if subscription else None
+        self.current_period_start = subscription.current_period_start if subscription else None
+        self.current_period_end = subscription.current_period_end if subscription else None
+        self.cancel_at_period_end = bool(subscription.cancel_at_period_end) if subscription else False
+
+    @property
+    def has_subscription(self):
+        return self.subscription_id is not None
+
+    def has_premium_access(self, now=None):
+        """Plan premium, o plan básico con periodo pagado aún vigente"""
+        if not self.has_subscription:
+            return False
+        if is_premium_plan(self.plan_type):
+            return True
+        now = now or datetime.utcnow()
+        return self.plan_type == BASIC_PLAN and self.current_period_end is not None and now < self.current_period_end
+
+    def period_ended(self, now=None):
+        """True si la suscripción estaba marcada para cancelarse y su periodo ya terminó"""
+        now = now or datetime.utcnow()
+        return bool(self.cancel_at_period_end and self.current_period_end and now >= self.current_period_end)
+
+    def to_entitlements(self, now=None):
+        """{'plan', 'premium', 'premium_until'} (formato de los tokens de acceso)"""
+        premium = self.has_premium_access(now)
+        return {
+            'plan': self.plan_type,
+            'premium': premium,
+            'premium_until': self.current_period_end.isoformat() if premium and self.current_period_end else None
+        }
+
+    def subscription_dict(self, now=None):
+        """Datos de la suscripción para /api/subscription/status (None si no tiene)"""
+        if not self.has_subscription:
+            return None
+        return {
+            'id': self.subscription_id,
+            'user_id': self.user_id,
+            'plan_type': self.plan_type,
+            'amount': self.amount,
+            'currency': self.currency,
+            'status': self.status,
+            'current_period_start': self.current_period_start.isoformat() if self.current_period_start else None,
+            'current_period_end': self.current_period_end.isoformat() if self.current_period_end else None,
+            'cancel_at_period_end': self.cancel_at_period_end,
+            'has_premium_access': self.has_premium_access(now)
+        }
+
+
+class EntitlementCache:
+    """Caché LRU de EntitlementRecord por usuario"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=MAX_CACHED_USERS):
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self._max_size = max_size
+        self._records = OrderedDict()  # user_id -> (expira_en, registro)
+
+    def configure(self, ttl):
+        """Cambia el TTL en segundos (0 desactiva la caché)"""
+        self.ttl = ttl
+        self.clear()
+
+    def _expires_at(self, record):
+        expires_at = time.monotonic() + self.ttl
+        # Al llegar el fin del periodo cambia el acceso premium: la entrada no debe durar más
+        if record.current_period_end is not None:
+            remaining = (record.current_period_end - datetime.utcnow()).total_seconds()
+            expires_at = min(expires_at, time.monotonic() + max(remaining, 0))
+        return expires_at
+
+    def get(self, user_id):
+        """Registro de derechos del usuario, consultando la base de datos solo si no está en caché"""
+        if self.ttl:
+            with self._lock:
+                cached = self._records.get(user_id)
+                if cached is not None:
+                    if cached[0] > time.monotonic():
+                        self._records.move_to_end(user_id)
+                        return cached[1]
+                    del self._records[user_id]
+
+        record = EntitlementRecord(user_id, active_subscription(user_id))
+        if self.ttl:
+            with self._lock:
+                self._records[user_id] = (self._expires_at(record), record)
+                self._records.move_to_end(user_id)
+                while len(self._records) > self._max_size:
+                    self._records.popitem(last=False)
+        return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._records.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+entitlement_cache = EntitlementCache()
+
+
+def get_entitlements(user_id):
+    """Derechos actuales del usuario: {'plan', 'premium', 'premium_until'}"""
+    return entitlement_cache.get(user_id).to_entitlements()
+
+
+# ==================== INVALIDACIÓN ====================
+
+@event.listens_for(Session, 'after_flush')
+def _mark_subscription_changes(session, flush_context):
+    """Guarda en la sesión los usuarios cuyas suscripciones cambiaron en el flush"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Subscription) and obj.user_id is not None:
+            session.info.setdefault('subscriptions_changed', set()).add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_entitlements(session):
+    for user_id in session.info.pop('subscriptions_changed', ()):
+        entitlement_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_subscription_changes(session):
+    session.info.pop('subscriptions_changed', None)
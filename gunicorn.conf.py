@@ -0,0 +1,27 @@
+"""
+Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo).
+
+Antes de crear los workers, el proceso maestro ejecuta `flask bootstrap` una vez
+(migraciones y juegos sembrados) y marca a los workers con
+BOOTSTRAP_ON_IMPORT=false para que no repitan ese trabajo al importar app.py.
+Si el bootstrap falla, los workers lo intentan por su cuenta bajo el mismo bloqueo.
+"""
+
+import os
+import subprocess
+import sys
+
+
+def on_starting(server):
+    if os.environ.get('BOOTSTRAP_ON_IMPORT', 'true').lower() not in ['true', 'on', '1']:
+        return
+    server.log.info("Ejecutando bootstrap de la base de datos antes de iniciar los workers...")
+    result = subprocess.run(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'bootstrap'],
+        env=dict(os.environ, BOOTSTRAP_ON_IMPORT='false')
+    )
+    if result.returncode == 0:
+        # Los workers heredan el entorno del proceso maestro
+        os.environ['BOOTSTRAP_ON_IMPORT'] = 'false'
+    else:
+        server.log.error("El bootstrap falló; cada worker lo intentará al iniciar")
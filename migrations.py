@@ -0,0 +1,222 @@
+"""
+Migraciones de esquema versionadas.
+
+Cada migración es una función registrada con @migration(versión, descripción)
+y se aplica una sola vez, en orden. Las versiones aplicadas quedan en la tabla
+schema_migrations. Las migraciones son idempotentes (crean tablas, columnas e
+índices solo si faltan), así que sirven tanto para una base nueva como para
+bases creadas antes de este sistema, que llegan sin versiones registradas.
+
+- `flask migrate` aplica las pendientes (bajo advisory_lock, así que varios
+  procesos no ejecutan DDL a la vez).
+- Al arrancar, init_db solo consulta la versión actual (schema_is_current).
+
+Para cambiar el esquema: agregar una función al final con la versión siguiente.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from db_lock import advisory_lock
+from models import db, BootstrapState, PaymentNotification, StripeEvent, PLATFORM_BITS
+from search import setup_search_index
+from user_stats import rebuild_user_counters
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []  # [(versión, descripción, función)] en orden
+
+
+def migration(version, description):
+    """Registra una migración; las versiones deben ser consecutivas"""
+    def decorator(func):
+        expected = len(MIGRATIONS) + 1
+        if version != expected:
+            raise ValueError(f"Versión de migración {version} fuera de orden (se esperaba {expected})")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# ==================== UTILIDADES ====================
+
+def _columns(table_name):
+    return {column['name'] for column in inspect(db.session.connection()).get_columns(table_name)}
+
+
+def _add_column(table_name, column_name, ddl):
+    """ALTER TABLE ... ADD COLUMN si la columna no existe; retorna True si la agregó"""
+    if column_name in _columns(table_name):
+        return False
+    logger.info(f"Agregando columna {column_name} a la tabla {table_name}...")
+    db.session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}"))
+    return True
+
+
+def _create_index(name, table_name, columns, unique=False):
+    db.session.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table_name} ({columns})"))
+
+
+# ==================== MIGRACIONES ====================
+
+@migration(1, 'tablas base')
+def _create_tables():
+    # create_all solo crea las tablas que no existen (y sus índices)
+    db.metadata.create_all(bind=db.session.connection())
+
+
+@migration(2, 'cambios de nombre, verificación de email y URL de juegos')
+def _profile_and_game_url_columns():
+    _add_column('users', 'name_change_count', 'INTEGER DEFAULT 0')
+    _add_column('users', 'last_name_change_date', 'TIMESTAMP')
+    _add_column('users', 'email_verified', 'BOOLEAN DEFAULT FALSE')
+    _add_column('games', 'game_url', 'VARCHAR(500)')
+
+
+@migration(3, 'versiones de historial y preferencias para recomendaciones')
+def _recommendation_versions():
+    _add_column('users', 'play_history_version', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column('users', 'preferences_version', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column('user_recommendations', 'preferences_version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+@migration(4, 'contadores desnormalizados de juegos completados/jugando')
+def _game_counters():
+    added = _add_column('users', 'games_completed_count', 'INTEGER NOT NULL DEFAULT 0')
+    _add_column('users', 'games_playing_count', 'INTEGER NOT NULL DEFAULT 0')
+    if added:
+        rebuild_user_counters()
+
+
+@migration(5, 'plataformas de juegos como bitmask')
+def _platform_mask():
+    if not _add_column('games', 'platform_mask', 'INTEGER NOT NULL DEFAULT 0'):
+        return
+    if 'platforms' in _columns('games'):
+        for platform, bit in PLATFORM_BITS.items():
+            db.session.execute(
+                text("UPDATE games SET platform_mask = platform_mask | :bit "
+                     "WHERE (',' || platforms || ',') LIKE :pattern"),
+                {'bit': bit, 'pattern': f'%,{platform},%'}
+            )
+
+
+@migration(6, 'índices del catálogo, historial y suscripciones')
+def _indexes():
+    _create_index('ix_games_category_id', 'games', 'category, id')
+    _create_index('ix_games_price_id', 'games', 'price, id')
+    _create_index('ix_games_platform_mask_id', 'games', 'platform_mask, id')
+    _create_index('ix_user_games_user_last_played_id', 'user_games', 'user_id, last_played DESC, id DESC')
+    _create_index('ix_subscriptions_status_period_end', 'subscriptions', 'status, current_period_end')
+
+
+@migration(7, 'índice de búsqueda de texto completo')
+def _search_index():
+    setup_search_index()
+
+
+@migration(8, 'estado del bootstrap por despliegue')
+def _bootstrap_state():
+    BootstrapState.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+
+@migration(9, 'eventos de webhook de Stripe')
+def _stripe_events():
+    StripeEvent.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+
+@migration(10, 'avisos de cambios de pago entre procesos')
+def _payment_notifications():
+    # En PostgreSQL los avisos van por LISTEN/NOTIFY; la tabla solo la usan los demás motores
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        PaymentNotification.__table__.create(bind=connection, checkfirst=True)
+
+
+@migration(11, 'llaves de idempotencia y pagos pendientes reutilizables')
+def _payment_idempotency():
+    _add_column('transactions', 'idempotency_key', 'VARCHAR(255)')
+    _create_index('ix_transactions_user_status_type', 'transactions', 'user_id, status, transaction_type')
+    _create_index('uq_transactions_user_idempotency_key', 'transactions', 'user_id, idempotency_key', unique=True)
+
+
+@migration(12, 'last_played obligatorio en user_games')
+def _user_games_last_played_not_null():
+    # Sin NULL, la paginación por cursor del historial (last_played DESC, id DESC) alcanza todas las filas
+    db.session.execute(
+        text("UPDATE user_games SET last_played = COALESCE(created_at, :now) WHERE last_played IS NULL"),
+        {'now': datetime.utcnow()}
+    )
+    # SQLite no permite cambiar la restricción de una columna existente; el modelo ya la exige al escribir
+    if db.session.connection().dialect.name == 'postgresql':
+        db.session.execute(text("ALTER TABLE user_games ALTER COLUMN last_played SET NOT NULL"))
+
+
+# ==================== EJECUCIÓN ====================
+
+def _ensure_migrations_table():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+    db.session.commit()
+
+
+def applied_versions():
+    """Versiones registradas en schema_migrations (vacío si la tabla no existe)"""
+    try:
+        return {row[0] for row in db.session.execute(text("SELECT version FROM schema_migrations"))}
+    except Exception:
+        db.session.rollback()
+        return set()
+
+
+def current_version():
+    """Versión más alta aplicada, con una sola consulta (0 si no hay tabla de migraciones)"""
+    try:
+        return db.session.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+    except Exception:
+        db.session.rollback()
+        return 0
+
+
+def schema_is_current():
+    return current_version() >= latest_version()
+
+
+def run_migrations(report=None):
+    """
+    Aplica las migraciones pendientes en orden, cada una en su propia transacción.
+    Retorna la lista de versiones aplicadas.
+    """
+    report = report or logger.info
+    applied = []
+    with advisory_lock('schema'):
+        _ensure_migrations_table()
+        # Releer dentro del bloqueo: otro proceso pudo haber migrado mientras esperábamos
+        done = applied_versions()
+        for version, description, func in MIGRATIONS:
+            if version in done:
+                continue
+            report(f"Aplicando migración {version}: {description}")
+            try:
+                func()
+                db.session.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) "
+                         "VALUES (:version, :description, :applied_at)"),
+                    {'version': version, 'description': description, 'applied_at': datetime.utcnow()}
+                )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            applied.append(version)
+    return applied
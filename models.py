@@ -1,7 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import password_hasher
 
 db = SQLAlchemy()
 
@@ -24,17 +24,30 @@ class User(UserMixin, db.Model):
     # Campos para verificación de email
     email_verified = db.Column(db.Boolean, default=False)  # Si el email está verificado
     
+    # Se incrementa cada vez que cambia el historial de juegos (invalida recomendaciones materializadas)
+    play_history_version = db.Column(db.Integer, nullable=False, default=0)
+    # Se incrementa cada vez que cambian sus UserPreference (ver preferences.py)
+    preferences_version = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Contadores desnormalizados del historial (mantenidos en user_stats.py)
+    games_completed_count = db.Column(db.Integer, nullable=False, default=0)
+    games_playing_count = db.Column(db.Integer, nullable=False, default=0)
+    
     # Relaciones
     user_games = db.relationship('UserGame', backref='user', lazy=True, cascade='all, delete-orphan')
     preferences = db.relationship('UserPreference', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Genera hash de la contraseña"""
-        self.password_hash = generate_password_hash(password)
+        """Genera hash de la contraseña (en el pool de password_hashing; puede lanzar PasswordHashingBusyError)"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica la contraseña"""
-        return check_password_hash(self.password_hash, password)
+        """Verifica la contraseña (en el pool de password_hashing; puede lanzar PasswordHashingBusyError)"""
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True si el hash se generó con parámetros distintos a los configurados"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convierte el usuario a diccionario"""
@@ -81,6 +94,47 @@ class User(UserMixin, db.Model):
         # Si tiene menos de 3 cambios, puede cambiar
         return True, None
 
+# Plataformas soportadas y su bit en Game.platform_mask (no cambiar los bits existentes)
+PLATFORM_BITS = {
+    'Android': 1 << 0,
+    'iOS': 1 << 1,
+    'PC': 1 << 2,
+    'Console': 1 << 3,
+    'Web': 1 << 4,
+}
+ALL_PLATFORMS_MASK = sum(PLATFORM_BITS.values())
+
+def platforms_to_mask(platforms):
+    """Convierte una lista o cadena separada por comas de plataformas a bitmask"""
+    if not platforms:
+        return 0
+    if isinstance(platforms, str):
+        platforms = platforms.split(',')
+    mask = 0
+    for platform in platforms:
+        platform = platform.strip()
+        if not platform:
+            continue
+        if platform not in PLATFORM_BITS:
+            raise ValueError(f"Plataforma desconocida: {platform}")
+        mask |= PLATFORM_BITS[platform]
+    return mask
+
+_platform_lists = {}
+
+def mask_to_platforms(mask):
+    """Convierte un bitmask a la lista de plataformas (en orden de bit)"""
+    mask = mask or 0
+    platforms = _platform_lists.get(mask)
+    if platforms is None:
+        platforms = [name for name, bit in PLATFORM_BITS.items() if mask & bit]
+        _platform_lists[mask] = platforms
+    return list(platforms)
+
+def masks_with_platform(bit):
+    """Todos los valores de platform_mask que incluyen el bit dado (para filtrar con IN sobre el índice)"""
+    return [mask for mask in range(ALL_PLATFORMS_MASK + 1) if mask & bit]
+
 class Game(db.Model):
     """Modelo de Juego"""
     __tablename__ = 'games'
@@ -89,7 +143,7 @@ class Game(db.Model):
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), default=0.00)
-    platforms = db.Column(db.String(200))  # JSON string or comma-separated
+    platform_mask = db.Column(db.Integer, nullable=False, default=0)  # Bits de PLATFORM_BITS
     image_url = db.Column(db.String(500))
     game_url = db.Column(db.String(500))  # URL del juego web para jugar
     category = db.Column(db.String(100))
@@ -98,18 +152,37 @@ class Game(db.Model):
     # Relaciones
     user_games = db.relationship('UserGame', backref='game', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    # Índices para filtros del catálogo con paginación por cursor (keyset sobre id)
+    __table_args__ = (
+        db.Index('ix_games_category_id', 'category', 'id'),
+        db.Index('ix_games_price_id', 'price', 'id'),
+        db.Index('ix_games_platform_mask_id', 'platform_mask', 'id'),
+    )
+    
+    @property
+    def platforms(self):
+        """Plataformas como cadena separada por comas (compatibilidad con la columna anterior)"""
+        return ','.join(mask_to_platforms(self.platform_mask))
+    
+    @platforms.setter
+    def platforms(self, value):
+        self.platform_mask = platforms_to_mask(value)
+    
+    def to_dict(self, include_description=True):
         """Convierte el juego a diccionario"""
-        return {
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'price': float(self.price) if self.price else 0.0,
-            'platforms': self.platforms.split(',') if self.platforms else [],
+            'platforms': mask_to_platforms(self.platform_mask),
             'image_url': self.image_url,
             'game_url': self.game_url,
             'category': self.category
         }
+        if not include_description:
+            del data['description']
+        return data
 
 class UserGame(db.Model):
     """Relación entre Usuario y Juego (juegos del usuario)"""
@@ -119,21 +192,30 @@ class UserGame(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     game_id = db.Column(db.Integer, db.ForeignKey('games.id'), nullable=False)
     status = db.Column(db.String(50), default='playing')  # playing, completed, wishlist
-    last_played = db.Column(db.DateTime, default=datetime.utcnow)
+    last_played = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Índice único para evitar duplicados
-    __table_args__ = (db.UniqueConstraint('user_id', 'game_id', name='unique_user_game'),)
+    # Índice único para evitar duplicados e índice para paginar el historial por cursor
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'game_id', name='unique_user_game'),
+        db.Index('ix_user_games_user_last_played_id', user_id, last_played.desc(), id.desc()),
+    )
     
-    def to_dict(self):
-        """Convierte la relación a diccionario"""
+    def to_dict(self, game_data=None, load_game=True):
+        """
+        Convierte la relación a diccionario.
+        game_data permite pasar el juego ya serializado y evitar la carga perezosa de self.game;
+        con load_game=False nunca se carga (el juego sale como None si no se pasa).
+        """
+        if game_data is None and load_game and self.game:
+            game_data = self.game.to_dict()
         return {
             'id': self.id,
             'user_id': self.user_id,
             'game_id': self.game_id,
             'status': self.status,
             'last_played': self.last_played.isoformat() if self.last_played else None,
-            'game': self.game.to_dict() if self.game else None
+            'game': game_data
         }
 
 class UserPreference(db.Model):
@@ -157,6 +239,32 @@ class UserPreference(db.Model):
             'weight': self.weight
         }
 
+class UserRecommendation(db.Model):
+    """Recomendaciones materializadas por usuario"""
+    __tablename__ = 'user_recommendations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    history_version = db.Column(db.Integer, nullable=False)  # User.play_history_version usado al calcular
+    preferences_version = db.Column(db.Integer, nullable=False, default=0)  # User.preferences_version usado al calcular
+    catalog_etag = db.Column(db.String(40), nullable=False)  # ETag del catálogo usado al calcular
+    recommendations = db.Column(db.Text, nullable=False)  # JSON: [{game_id, score, recommendation_reason}]
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def is_current(self, history_version, preferences_version, catalog_etag):
+        """Verifica si la materialización sigue siendo válida"""
+        return (self.history_version == history_version
+                and self.preferences_version == preferences_version
+                and self.catalog_etag == catalog_etag)
+
+class GameNeighbor(db.Model):
+    """Vecinos más similares de cada juego (filtrado colaborativo item-item, precalculado)"""
+    __tablename__ = 'game_neighbors'
+    
+    game_id = db.Column(db.Integer, db.ForeignKey('games.id'), primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('games.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)  # Similitud coseno entre 0 y 1
+    co_occurrences = db.Column(db.Integer, nullable=False)  # Usuarios que jugaron ambos juegos
+
 class Transaction(db.Model):
     """Modelo de Transacciones de Pago"""
     __tablename__ = 'transactions'
@@ -168,6 +276,7 @@ class Transaction(db.Model):
     currency = db.Column(db.String(3), default='MXN')
     payment_method = db.Column(db.String(50))  # 'stripe', 'paypal', etc.
     payment_intent_id = db.Column(db.String(255))  # ID de Stripe
+    idempotency_key = db.Column(db.String(255), nullable=True)  # Llave del cliente al crear el pago (reintentos)
     status = db.Column(db.String(50), nullable=False, default='pending')  # 'pending', 'completed', 'failed', 'refunded'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -176,6 +285,12 @@ class Transaction(db.Model):
     # Relación con usuario
     user = db.relationship('User', backref='transactions')
     
+    __table_args__ = (
+        # Pago pendiente reutilizable del usuario (create-payment-intent)
+        db.Index('ix_transactions_user_status_type', 'user_id', 'status', 'transaction_type'),
+        db.Index('uq_transactions_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+    )
+    
     def to_dict(self):
         """Convierte la transacción a diccionario"""
         return {
@@ -210,6 +325,9 @@ class Subscription(db.Model):
     # Relación con usuario
     user = db.relationship('User', backref='subscriptions')
     
+    # Índice para el barrido de suscripciones vencidas (ver subscription_sweeper.py)
+    __table_args__ = (db.Index('ix_subscriptions_status_period_end', 'status', 'current_period_end'),)
+    
     def to_dict(self):
         """Convierte la suscripción a diccionario"""
         return {
@@ -223,3 +341,57 @@ class Subscription(db.Model):
             'current_period_end': self.current_period_end.isoformat() if self.current_period_end else None
         }
 
+
+class RateLimitCounter(db.Model):
+    """Contadores de peticiones por ventana fija, compartidos entre workers (ver rate_limit.py)"""
+    __tablename__ = 'rate_limit_counters'
+    
+    key = db.Column(db.String(255), primary_key=True)  # regla:tipo de llave:periodo:valor
+    window_start = db.Column(db.Integer, primary_key=True)  # Inicio de la ventana (segundos epoch)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.Index('ix_rate_limit_counters_window_start', 'window_start'),)
+
+class RevokedToken(db.Model):
+    """Lista de tokens revocados (ver tokens.py); las filas vencidas se purgan solas"""
+    __tablename__ = 'revoked_tokens'
+    
+    jti = db.Column(db.String(64), primary_key=True)  # id del token, o 'user:<id>' para revocar todos los de un usuario
+    user_id = db.Column(db.Integer, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Cuando vence el último token afectado
+
+class BootstrapState(db.Model):
+    """Estado del bootstrap por despliegue (p. ej. huella de los juegos sembrados, ver bootstrap.py)"""
+    __tablename__ = 'bootstrap_state'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(255), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StripeEvent(db.Model):
+    """Eventos de webhook de Stripe recibidos, pendientes o procesados (ver stripe_events.py)"""
+    __tablename__ = 'stripe_events'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Orden de llegada
+    event_id = db.Column(db.String(255), unique=True, nullable=False)  # evt_... de Stripe (deduplicación)
+    event_type = db.Column(db.String(100), nullable=False)
+    payment_intent_id = db.Column(db.String(255), nullable=True, index=True)  # Eventos del mismo pago se procesan en orden
+    payload = db.Column(db.Text, nullable=False)  # Evento completo en JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'processing', 'processed', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (db.Index('ix_stripe_events_status_id', 'status', 'id'),)
+
+class PaymentNotification(db.Model):
+    """Avisos de cambios de pago entre procesos cuando no hay LISTEN/NOTIFY (SQLite, ver payment_events.py)"""
+    __tablename__ = 'payment_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Los procesos leen los avisos con id mayor al último visto
+    user_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Aviso en JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
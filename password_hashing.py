@@ -0,0 +1,141 @@
+"""
+Hash de contraseñas fuera del hilo de la petición.
+
+PBKDF2/scrypt consumen CPU durante decenas de milisegundos. Se ejecutan en un
+pool de hilos dedicado y acotado (hashlib libera el GIL mientras calcula), así
+que una ráfaga de logins no ocupa todos los hilos del worker. Si el pool y su
+cola están llenos se rechaza la petición de inmediato (PasswordHashingBusyError,
+que las rutas convierten en un 503) en lugar de encolar trabajo sin límite.
+
+El método de hash es configurable (PASSWORD_HASH_METHOD); los hashes guardados
+con otros parámetros se actualizan en el siguiente login correcto.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt'
+DEFAULT_SALT_LENGTH = 16
+
+
+class PasswordHashingBusyError(Exception):
+    """El pool de hash está saturado o no respondió a tiempo"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Pool acotado para generar y verificar hashes de contraseñas"""
+
+    def __init__(self, method=DEFAULT_METHOD, salt_length=DEFAULT_SALT_LENGTH, max_workers=2,
+                 max_pending=16, timeout=10):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.configure(method, salt_length, max_workers, max_pending, timeout)
+
+    def configure(self, method=DEFAULT_METHOD, salt_length=DEFAULT_SALT_LENGTH, max_workers=2,
+                  max_pending=16, timeout=10):
+        """Cambia los parámetros; el pool se (re)crea en el primer uso"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            self.method = method
+            self.salt_length = salt_length
+            self.max_workers = max_workers
+            self.max_pending = max_pending
+            self.timeout = timeout
+            self._method_prefix = None
+            # Trabajos admitidos a la vez: los que se ejecutan más los que esperan en cola
+            self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+            self._in_flight = 0
+            self._running = 0
+            self._completed = 0
+            self._rejected = 0
+            self._busy_seconds = 0.0
+
+    def _get_executor(self):
+        # Se crea de forma perezosa para que los hilos existan solo en el worker (después del fork)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='password-hash')
+            return self._executor
+
+    def _run(self, func, *args):
+        with self._lock:
+            self._running += 1
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._in_flight -= 1
+                self._completed += 1
+                self._busy_seconds += elapsed
+            self._slots.release()
+
+    def _submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHashingBusyError('Demasiadas solicitudes de autenticación, intenta de nuevo')
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._get_executor().submit(self._run, func, *args)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHashingBusyError('El servicio de autenticación no respondió a tiempo')
+
+    def hash(self, password):
+        """Genera el hash de la contraseña con los parámetros configurados"""
+        return self._submit(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        """Verifica la contraseña contra el hash guardado"""
+        return self._submit(check_password_hash, password_hash, password)
+
+    def _current_prefix(self):
+        """Método completo con parámetros (p. ej. 'scrypt:32768:8:1') según la configuración"""
+        if self._method_prefix is None:
+            sample = generate_password_hash('', self.method, salt_length=1)
+            self._method_prefix = sample.split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        """True si el hash se generó con un método o longitud de sal distintos a los actuales"""
+        if not password_hash or password_hash.count('$') < 2:
+            return True
+        method, salt, _ = password_hash.split('$', 2)
+        return method != self._current_prefix() or len(salt) != self.salt_length
+
+    def stats(self):
+        """Métricas del pool: trabajos en ejecución, en cola, completados y rechazados"""
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_ms': round(self._busy_seconds / self._completed * 1000, 1) if self._completed else 0.0
+            }
+
+
+password_hasher = PasswordHasher()
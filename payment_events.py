@@ -0,0 +1,248 @@
+"""
+Avisos en tiempo real de cambios de pagos y suscripciones (para el checkout).
+
+Al confirmar un cambio de estado en Transaction o Subscription se emite un
+aviso dentro de la misma transacción, así que solo llega si se confirma:
+- PostgreSQL: pg_notify en el canal payment_events.
+- Otros motores (SQLite): una fila en payment_notifications.
+
+Cada proceso tiene un hilo que recibe los avisos (LISTEN, o lectura periódica
+de la tabla en SQLite) y los reparte en memoria a los clientes conectados a
+/api/payment-status/<id>/stream de ese usuario. Los avisos de suscripción
+además invalidan la caché de derechos del usuario en el proceso, así que un
+pago confirmado en un worker se ve en los demás sin esperar al TTL. El hilo se
+inicia con la primera petición que atiende el proceso.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from entitlements import EntitlementRecord, entitlement_cache
+from models import db, PaymentNotification, Subscription, Transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'payment_events'
+
+# Segundos entre lecturas de payment_notifications (SQLite) y antigüedad máxima de sus filas
+POLL_INTERVAL = 0.5
+NOTIFICATION_RETENTION = timedelta(minutes=10)
+
+# Avisos en espera por cliente; si se llena (cliente lento) se descartan los nuevos
+MAX_QUEUED = 100
+
+# Segundos que un cliente nuevo espera a que el hilo esté recibiendo avisos
+LISTENER_READY_TIMEOUT = 5
+
+
+class PaymentEventBroker:
+    """Reparto en memoria de avisos por usuario, alimentado por un hilo por proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set(queue.Queue)
+        self._listener = None
+        self._ready = threading.Event()  # el hilo ya recibe avisos
+        self._delivered = 0
+        self._dropped = 0
+
+    def subscribe(self, app, user_id):
+        """Cola con los avisos del usuario a partir de este momento"""
+        self.start(app)
+        # Un aviso confirmado antes de que el hilo escuche se perdería: leer el estado solo después
+        if not self._ready.wait(LISTENER_READY_TIMEOUT):
+            logger.warning("El hilo de avisos de pago aún no está listo; el cliente puede perder avisos")
+        messages = queue.Queue(maxsize=MAX_QUEUED)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(messages)
+        return messages
+
+    def unsubscribe(self, user_id, messages):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(messages)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def dispatch(self, message):
+        """Entrega el aviso a los clientes conectados de su usuario en este proceso"""
+        if message.get('type') == 'subscription':
+            # La suscripción cambió (quizá en otro worker): los derechos en caché ya no valen
+            entitlement_cache.invalidate(message.get('user_id'))
+        with self._lock:
+            subscribers = list(self._subscribers.get(message.get('user_id'), ()))
+        delivered = 0
+        for messages in subscribers:
+            try:
+                messages.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                pass
+        with self._lock:
+            self._delivered += delivered
+            self._dropped += len(subscribers) - delivered
+
+    def _dispatch_raw(self, payload):
+        try:
+            self.dispatch(json.loads(payload))
+        except (TypeError, ValueError):
+            logger.warning(f"Aviso de pago inválido: {payload[:200]}")
+
+    def start(self, app):
+        """Inicia (una vez por proceso) el hilo que recibe los avisos"""
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            with app.app_context():
+                engine = db.engine
+            if engine.dialect.name == 'postgresql':
+                target, args = self._listen_postgres, (engine,)
+            else:
+                # El punto de partida se lee aquí y no en el hilo, para no saltarse avisos
+                # confirmados entre este momento y la primera lectura del hilo
+                target, args = self._poll_table, (engine, self._last_notification_id(engine))
+            self._listener = threading.Thread(target=target, args=args, name='payment-events', daemon=True)
+            self._listener.start()
+
+    def _listen_postgres(self, engine):
+        import psycopg
+
+        conninfo = engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+        while True:
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as conn:
+                    conn.execute(f'LISTEN {CHANNEL}')
+                    self._ready.set()
+                    logger.info(f"Escuchando avisos de pago en el canal {CHANNEL}")
+                    while True:
+                        for notify in conn.notifies(timeout=30):
+                            self._dispatch_raw(notify.payload)
+            except Exception as e:
+                self._ready.clear()
+                logger.error(f"Error en LISTEN de avisos de pago, reconectando: {str(e)}")
+                time.sleep(5)
+
+    def _last_notification_id(self, engine):
+        """Id del último aviso guardado (None si la tabla aún no se puede leer)"""
+        table = PaymentNotification.__table__
+        try:
+            with engine.connect() as conn:
+                last_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+        except Exception as e:
+            logger.error(f"Error al leer avisos de pago: {str(e)}")
+            return None
+        self._ready.set()
+        return last_id
+
+    def _poll_table(self, engine, last_id):
+        table = PaymentNotification.__table__
+        last_purge = 0.0
+        while True:
+            try:
+                with engine.connect() as conn:
+                    if last_id is None:
+                        last_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+                        self._ready.set()
+                    rows = conn.execute(
+                        select(table.c.id, table.c.payload).where(table.c.id > last_id).order_by(table.c.id)
+                    ).all()
+                    for row in rows:
+                        self._dispatch_raw(row.payload)
+                        last_id = row.id
+                    if time.monotonic() - last_purge > NOTIFICATION_RETENTION.total_seconds():
+                        last_purge = time.monotonic()
+                        conn.execute(delete(table).where(table.c.created_at < datetime.utcnow() - NOTIFICATION_RETENTION))
+                        conn.commit()
+            except Exception as e:
+                logger.error(f"Error al leer avisos de pago: {str(e)}")
+            time.sleep(POLL_INTERVAL)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'delivered': self._delivered,
+                'dropped': self._dropped
+            }
+
+
+payment_event_broker = PaymentEventBroker()
+
+
+def transaction_message(transaction):
+    return {
+        'type': 'transaction',
+        'user_id': transaction.user_id,
+        'payment_intent_id': transaction.payment_intent_id,
+        'status': transaction.status,
+        'completed_at': transaction.completed_at.isoformat() if transaction.completed_at else None
+    }
+
+
+def subscription_message(subscription):
+    record = EntitlementRecord(subscription.user_id, subscription if subscription.status == 'active' else None)
+    return {
+        'type': 'subscription',
+        'user_id': subscription.user_id,
+        'plan_type': subscription.plan_type,
+        'status': subscription.status,
+        'has_premium_access': record.has_premium_access(),
+        'current_period_end': subscription.current_period_end.isoformat() if subscription.current_period_end else None
+    }
+
+
+def _emit(connection, message):
+    payload = json.dumps(message)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': payload})
+    else:
+        connection.execute(PaymentNotification.__table__.insert().values(
+            user_id=message['user_id'], payload=payload, created_at=datetime.utcnow()
+        ))
+
+
+# ==================== EMISIÓN ====================
+
+@event.listens_for(Session, 'after_flush')
+def _collect_payment_changes(session, flush_context):
+    """Guarda en la sesión las transacciones y suscripciones cuyo estado cambió en el flush"""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Transaction) and obj.payment_intent_id:
+            if obj in session.new or inspect(obj).attrs.status.history.has_changes():
+                session.info.setdefault('payment_changes', set()).add(obj)
+        elif isinstance(obj, Subscription) and (obj in session.new or session.is_modified(obj)):
+            session.info.setdefault('payment_changes', set()).add(obj)
+
+
+@event.listens_for(Session, 'before_commit')
+def _emit_payment_changes(session):
+    """Emite un aviso por objeto cambiado, dentro de la transacción que se confirma"""
+    # Los cambios pendientes se envían ahora para que sus avisos salgan en este mismo commit
+    session.flush()
+    changed = session.info.pop('payment_changes', None)
+    if not changed:
+        return
+    messages = [
+        subscription_message(obj) if isinstance(obj, Subscription) else transaction_message(obj)
+        for obj in changed
+    ]
+    # Suscripción antes que transacción: el checkout cierra el canal al recibir el pago completado
+    messages.sort(key=lambda message: message['type'] != 'subscription')
+    connection = session.connection()
+    for message in messages:
+        _emit(connection, message)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_payment_changes(session):
+    session.info.pop('payment_changes', None)
@@ -0,0 +1,295 @@
+"""
+Pasarela de pagos: acceso a Stripe con tiempos límite, reintentos y métricas.
+
+Las rutas no llaman al módulo stripe directamente sino a payment_gateway:
+- Backend 'stripe': un StripeClient propio con una sesión HTTP keep-alive
+  (pool de conexiones acotado, creada en el primer uso, después del fork),
+  tiempos límite de conexión y lectura, y reintentos con espera exponencial
+  con jitter solo para errores transitorios (conexión, 429, 5xx). Cada
+  creación usa una llave de idempotencia, así que reintentar no duplica cobros.
+- Backend 'fake': pagos simulados en memoria con latencia configurable, para
+  pruebas de carga sin tocar Stripe (PAYMENT_GATEWAY=fake).
+
+La latencia de cada operación se acumula en un histograma por operación
+(stats() la expone en /api/health).
+"""
+
+import bisect
+import logging
+import random
+import threading
+import time
+import uuid
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PaymentGatewayError(Exception):
+    """La pasarela rechazó la operación o no respondió a tiempo"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class PaymentIntent:
+    """Datos de un payment intent que usan las rutas (iguales para todos los backends)"""
+
+    __slots__ = ('id', 'client_secret', 'status', 'amount', 'currency')
+
+    def __init__(self, id, client_secret, status, amount, currency):
+        self.id = id
+        self.client_secret = client_secret
+        self.status = status
+        self.amount = amount
+        self.currency = currency
+
+    @classmethod
+    def from_stripe(cls, intent):
+        return cls(intent.id, intent.client_secret, intent.status, intent.amount, intent.currency)
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos; percentiles aproximados al límite del bucket"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._errors = 0
+        self._retries = 0
+
+    def record(self, elapsed_ms, error=False, retries=0):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+            self._count += 1
+            self._sum_ms += elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+            self._errors += int(error)
+            self._retries += retries
+
+    def _percentile(self, fraction):
+        target = fraction * self._count
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self._max_ms
+        return self._max_ms
+
+    def snapshot(self):
+        with self._lock:
+            if not self._count:
+                return {'count': 0}
+            labels = [f'<={bucket}ms' for bucket in self.buckets] + [f'>{self.buckets[-1]}ms']
+            return {
+                'count': self._count,
+                'errors': self._errors,
+                'retries': self._retries,
+                'avg_ms': round(self._sum_ms / self._count, 1),
+                'max_ms': round(self._max_ms, 1),
+                'p50_ms': self._percentile(0.50),
+                'p95_ms': self._percentile(0.95),
+                'p99_ms': self._percentile(0.99),
+                'buckets': {label: count for label, count in zip(labels, self._counts) if count}
+            }
+
+
+# ==================== BACKENDS ====================
+
+class StripeBackend:
+    """Llamadas a la API de Stripe con un cliente HTTP propio"""
+
+    name = 'stripe'
+
+    def __init__(self, api_key, connect_timeout=3, read_timeout=10, pool_size=10):
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def is_configured(self):
+        return bool(self.api_key)
+
+    def _get_client(self):
+        # Se crea de forma perezosa para que las conexiones sean del worker (después del fork)
+        with self._lock:
+            if self._client is None:
+                session = requests.Session()
+                # Sin reintentos de urllib3: los hace PaymentGateway con su propio límite de tiempo
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                                                      max_retries=0))
+                http_client = stripe.RequestsClient(timeout=(self.connect_timeout, self.read_timeout),
+                                                    session=session)
+                self._client = stripe.StripeClient(self.api_key, http_client=http_client,
+                                                   max_network_retries=0)
+            return self._client
+
+    def is_retryable(self, error):
+        if isinstance(error, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+            return True
+        return isinstance(error, stripe.error.StripeError) and (error.http_status or 0) >= 500
+
+    def create_payment_intent(self, amount, currency, metadata, description, idempotency_key):
+        intent = self._get_client().payment_intents.create(
+            params={'amount': amount, 'currency': currency, 'metadata': metadata, 'description': description},
+            options={'idempotency_key': idempotency_key}
+        )
+        return PaymentIntent.from_stripe(intent)
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        return PaymentIntent.from_stripe(self._get_client().payment_intents.retrieve(payment_intent_id))
+
+    def close(self):
+        with self._lock:
+            self._client = None
+
+
+class FakeBackend:
+    """Pasarela simulada en memoria (pruebas de carga y desarrollo sin Stripe)"""
+
+    name = 'fake'
+    is_configured = True
+
+    def __init__(self, latency_ms=50, failure_rate=0.0):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+        self._intents = {}  # id -> PaymentIntent
+        self._by_idempotency_key = {}  # llave -> id
+
+    def _simulate_call(self):
+        if self.latency_ms:
+            # Latencia con variación de ±50% alrededor del valor configurado
+            time.sleep(self.latency_ms * random.uniform(0.5, 1.5) / 1000)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise stripe.error.APIConnectionError('Fallo simulado de la pasarela')
+
+    def is_retryable(self, error):
+        return isinstance(error, stripe.error.APIConnectionError)
+
+    def create_payment_intent(self, amount, currency, metadata, description, idempotency_key):
+        self._simulate_call()
+        with self._lock:
+            existing = self._by_idempotency_key.get(idempotency_key)
+            if existing:
+                return self._intents[existing]
+            intent_id = f'pi_fake_{uuid.uuid4().hex[:24]}'
+            intent = PaymentIntent(intent_id, f'{intent_id}_secret_{uuid.uuid4().hex[:16]}',
+                                   'requires_payment_method', amount, currency)
+            self._intents[intent_id] = intent
+            self._by_idempotency_key[idempotency_key] = intent_id
+            return intent
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        self._simulate_call()
+        with self._lock:
+            intent = self._intents.get(payment_intent_id)
+        if intent is None:
+            raise stripe.error.InvalidRequestError(f'No such payment_intent: {payment_intent_id}', 'id',
+                                                   http_status=404)
+        return intent
+
+    def close(self):
+        with self._lock:
+            self._intents.clear()
+            self._by_idempotency_key.clear()
+
+
+# ==================== PASARELA ====================
+
+class PaymentGateway:
+    """Punto único de acceso a la pasarela de pagos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.backend = StripeBackend(None)
+        self.max_retries = 2
+        self.retry_base_delay = 0.25
+        self.retry_max_delay = 2.0
+        self._histograms = {}
+
+    def configure(self, backend='stripe', api_key=None, connect_timeout=3, read_timeout=10, pool_size=10,
+                  max_retries=2, fake_latency_ms=50, fake_failure_rate=0.0):
+        """Elige el backend ('stripe' o 'fake') y sus parámetros; reinicia las métricas"""
+        with self._lock:
+            self.backend.close()
+            if backend == 'fake':
+                logger.warning("Pasarela de pagos simulada (PAYMENT_GATEWAY=fake): no se realizan cobros reales")
+                self.backend = FakeBackend(latency_ms=fake_latency_ms, failure_rate=fake_failure_rate)
+            else:
+                self.backend = StripeBackend(api_key, connect_timeout=connect_timeout,
+                                             read_timeout=read_timeout, pool_size=pool_size)
+            self.max_retries = max_retries
+            self._histograms = {}
+
+    @property
+    def is_configured(self):
+        return self.backend.is_configured
+
+    def _histogram(self, operation):
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = LatencyHistogram()
+            return histogram
+
+    def _backoff(self, attempt):
+        """Espera exponencial con jitter completo"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def _call(self, operation, func, *args):
+        started = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = func(*args)
+                    self._histogram(operation).record((time.monotonic() - started) * 1000, retries=attempt)
+                    return result
+                except stripe.error.StripeError as e:
+                    retryable = self.backend.is_retryable(e)
+                    if not retryable or attempt >= self.max_retries:
+                        raise PaymentGatewayError(str(e), retryable=retryable) from e
+                    delay = self._backoff(attempt)
+                    attempt += 1
+                    logger.warning(f"Error transitorio de la pasarela en {operation} "
+                                   f"(reintento {attempt} en {delay:.2f}s): {str(e)}")
+                    time.sleep(delay)
+        except PaymentGatewayError:
+            self._histogram(operation).record((time.monotonic() - started) * 1000, error=True, retries=attempt)
+            raise
+
+    def create_payment_intent(self, amount, currency, metadata=None, description=None, idempotency_key=None):
+        """Crea un payment intent; la misma llave de idempotencia se usa en todos los reintentos"""
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+        return self._call('payment_intents.create', self.backend.create_payment_intent,
+                          amount, currency, metadata or {}, description, idempotency_key)
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        return self._call('payment_intents.retrieve', self.backend.retrieve_payment_intent, payment_intent_id)
+
+    def stats(self):
+        """Backend y latencia por operación (para /api/health)"""
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {
+            'backend': self.backend.name,
+            'operations': {operation: histogram.snapshot() for operation, histogram in histograms.items()}
+        }
+
+
+payment_gateway = PaymentGateway()
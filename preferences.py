@@ -0,0 +1,156 @@
+"""
+Vector de preferencias por usuario para el motor de recomendaciones.
+
+Combina las preferencias explícitas (UserPreference: tipo, valor y peso) con
+señales implícitas del historial (UserGame.status). Se construye una sola vez y
+se guarda en memoria con la versión del usuario (play_history_version,
+preferences_version); solo se vuelve a construir cuando alguna de las dos cambia.
+"""
+
+import threading
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from catalog_cache import catalog_cache
+from models import db, User, UserGame, UserPreference, PLATFORM_BITS
+
+# Peso implícito de cada estado del historial sobre la categoría del juego
+STATUS_WEIGHTS = {
+    'completed': 1.0,
+    'wishlist': 0.75,
+    'playing': 0.5,
+}
+
+# Tipos de UserPreference.preference_type que entiende el motor
+GENRE_PREFERENCE_TYPES = ('genre', 'category')
+PLATFORM_PREFERENCE_TYPE = 'platform'
+PRICE_PREFERENCE_TYPE = 'price_range'
+PRICE_RANGES = {'free': 'free', 'gratis': 'free', 'paid': 'paid', 'pago': 'paid'}
+
+_platform_bits_by_name = {name.lower(): bit for name, bit in PLATFORM_BITS.items()}
+
+# Máximo de vectores en memoria por proceso
+MAX_CACHED_USERS = 10000
+
+
+class UserFeatureVector:
+    """Preferencias de un usuario listas para puntuar el catálogo"""
+
+    def __init__(self, played_game_ids, category_weights, platform_weights, price_weights):
+        self.played_game_ids = played_game_ids
+        self.category_weights = category_weights  # categoría en minúsculas -> peso
+        self.platform_weights = platform_weights  # bit de PLATFORM_BITS -> peso
+        self.price_weights = price_weights  # 'free' / 'paid' -> peso
+
+
+def build_feature_vector(played_rows, preference_rows, games_by_id):
+    """
+    Construye el vector a partir de (game_id, status) del historial y
+    (preference_type, preference_value, weight) de las preferencias explícitas.
+    """
+    category_weights = defaultdict(float)
+    platform_weights = defaultdict(float)
+    price_weights = defaultdict(float)
+
+    played_game_ids = []
+    for game_id, status in played_rows:
+        played_game_ids.append(game_id)
+        game = games_by_id.get(game_id)
+        if game and game['category']:
+            category_weights[game['category'].lower()] += STATUS_WEIGHTS.get(status, 0.0)
+
+    for preference_type, preference_value, weight in preference_rows:
+        value = (preference_value or '').strip().lower()
+        weight = 1.0 if weight is None else weight
+        if not value:
+            continue
+        preference_type = (preference_type or '').lower()
+        if preference_type in GENRE_PREFERENCE_TYPES:
+            category_weights[value] += weight
+        elif preference_type == PLATFORM_PREFERENCE_TYPE and value in _platform_bits_by_name:
+            platform_weights[_platform_bits_by_name[value]] += weight
+        elif preference_type == PRICE_PREFERENCE_TYPE and value in PRICE_RANGES:
+            price_weights[PRICE_RANGES[value]] += weight
+
+    return UserFeatureVector(played_game_ids, dict(category_weights), dict(platform_weights), dict(price_weights))
+
+
+def user_version_stamp(user_id, play_history_version, preferences_version):
+    return (user_id, play_history_version or 0, preferences_version or 0)
+
+
+class FeatureVectorCache:
+    """Caché LRU en memoria de vectores de preferencias, indexada por versión del usuario"""
+
+    def __init__(self, max_size=MAX_CACHED_USERS):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._vectors = OrderedDict()  # user_id -> (stamp, catalog_version, vector)
+
+    def get(self, user):
+        """Obtener el vector del usuario, construyéndolo solo si cambió su versión o el catálogo"""
+        stamp = user_version_stamp(user.id, user.play_history_version, user.preferences_version)
+        snapshot = catalog_cache.get()
+        with self._lock:
+            cached = self._vectors.get(user.id)
+            if cached and cached[0] == stamp and cached[1] == snapshot.version:
+                self._vectors.move_to_end(user.id)
+                return cached[2]
+
+        played_rows = db.session.query(UserGame.game_id, UserGame.status).filter_by(user_id=user.id).all()
+        preference_rows = db.session.query(
+            UserPreference.preference_type, UserPreference.preference_value, UserPreference.weight
+        ).filter_by(user_id=user.id).all()
+        vector = build_feature_vector(played_rows, preference_rows, snapshot.games_by_id)
+
+        with self._lock:
+            self._vectors[user.id] = (stamp, snapshot.version, vector)
+            self._vectors.move_to_end(user.id)
+            while len(self._vectors) > self._max_size:
+                self._vectors.popitem(last=False)
+        return vector
+
+
+feature_vector_cache = FeatureVectorCache()
+
+
+def load_feature_vectors(user_ids):
+    """Construye los vectores de varios usuarios con dos consultas (para procesos por lotes)"""
+    played_by_user = {user_id: [] for user_id in user_ids}
+    preferences_by_user = {user_id: [] for user_id in user_ids}
+    if user_ids:
+        for user_id, game_id, status in db.session.query(
+            UserGame.user_id, UserGame.game_id, UserGame.status
+        ).filter(UserGame.user_id.in_(user_ids)):
+            played_by_user[user_id].append((game_id, status))
+        for user_id, preference_type, preference_value, weight in db.session.query(
+            UserPreference.user_id, UserPreference.preference_type,
+            UserPreference.preference_value, UserPreference.weight
+        ).filter(UserPreference.user_id.in_(user_ids)):
+            preferences_by_user[user_id].append((preference_type, preference_value, weight))
+
+    games_by_id = catalog_cache.get().games_by_id
+    return {
+        user_id: build_feature_vector(played_by_user[user_id], preferences_by_user[user_id], games_by_id)
+        for user_id in user_ids
+    }
+
+
+# ==================== INVALIDACIÓN ====================
+
+@event.listens_for(Session, 'after_flush')
+def _bump_preferences_version(session, flush_context):
+    """Incrementa users.preferences_version cuando cambia alguna UserPreference"""
+    user_ids = {
+        obj.user_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, UserPreference) and obj.user_id
+    }
+    if user_ids:
+        session.connection().execute(
+            update(User.__table__)
+            .where(User.__table__.c.id.in_(user_ids))
+            .values(preferences_version=User.__table__.c.preferences_version + 1)
+        )
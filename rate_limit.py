@@ -0,0 +1,261 @@
+"""
+Límite de peticiones por ventana deslizante para las rutas de autenticación y escritura.
+
+Cada regla se declara en la ruta con un decorador (límite, periodo y llave: IP,
+email o id de usuario). El conteo usa la aproximación de ventana deslizante con
+dos ventanas fijas: la ventana anterior se pondera por la fracción que aún se
+solapa con el periodo, así que solo hacen falta dos contadores por llave.
+
+Hay dos almacenes:
+- MemoryRateLimitStore: en el proceso, sin E/S (un límite por worker).
+- DatabaseRateLimitStore: tabla rate_limit_counters, compartida por todos los
+  workers que usan la misma base de datos (SQLite o PostgreSQL).
+
+Si el almacén falla, la petición se deja pasar (se registra el error).
+"""
+
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+from flask_login import current_user
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+# Llaves en memoria antes de purgar las ventanas vencidas
+MAX_MEMORY_KEYS = 100000
+
+# Periodos de todas las reglas declaradas con RateLimiter.limit en este proceso (todas las rutas)
+DECLARED_WINDOWS = set()
+
+
+def parse_limit(rule):
+    """Convierte '10/minute' en (10, 60)"""
+    try:
+        amount, period = rule.split('/')
+        return int(amount), PERIODS[period.strip().rstrip('s')]
+    except (ValueError, KeyError):
+        raise ValueError(f"Límite inválido: {rule}")
+
+
+class RateLimitResult:
+    """Resultado de registrar una petición contra una regla"""
+
+    def __init__(self, allowed, limit, remaining, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+
+def _window_start(now, window):
+    return int(now // window) * window
+
+
+def _sliding_result(previous, current, window_start, limit, window, now):
+    """Estimación de la ventana deslizante a partir de la ventana anterior y la actual"""
+    overlap = 1.0 - (now - window_start) / window
+    estimated = previous * overlap + current
+    allowed = estimated <= limit
+    retry_after = 0 if allowed else max(1, math.ceil(window_start + window - now))
+    return RateLimitResult(allowed, limit, max(0, int(limit - estimated)), retry_after)
+
+
+class MemoryRateLimitStore:
+    """Contadores en memoria del proceso"""
+
+    def __init__(self, max_keys=MAX_MEMORY_KEYS):
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._windows = {}  # llave -> [periodo, inicio de ventana, anterior, actual]
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        window_start = _window_start(now, window)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[1] < window_start - window:
+                previous, current = 0, 0
+            elif entry[1] == window_start - window:
+                previous, current = entry[3], 0
+            else:
+                previous, current = entry[2], entry[3]
+            current += 1
+            self._windows[key] = [window, window_start, previous, current]
+            if len(self._windows) > self._max_keys:
+                self._purge(now)
+        return _sliding_result(previous, current, window_start, limit, window, now)
+
+    def _purge(self, now):
+        expired = [key for key, (window, start, _, _) in self._windows.items() if start + 2 * window <= now]
+        for key in expired:
+            del self._windows[key]
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class DatabaseRateLimitStore:
+    """Contadores en la tabla rate_limit_counters (compartidos entre workers)"""
+
+    # Segundos entre limpiezas de ventanas vencidas (por proceso)
+    cleanup_interval = 60
+
+    def __init__(self):
+        self._max_window = 0
+        self._last_cleanup = 0.0
+
+    def _cleanup_cutoff(self, now):
+        """
+        Inicio de ventana más antiguo que aún puede usar alguna regla. Se basa en todas
+        las reglas declaradas, no solo en las que este worker ha atendido: la tabla es
+        compartida y borrar según los periodos locales reiniciaría los límites más largos.
+        """
+        return now - 2 * max(self._max_window, *DECLARED_WINDOWS, 0)
+
+    def _increment(self, conn, key, window_start):
+        table = RateLimitCounter.__table__
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            stmt = insert(table).values(key=key, window_start=window_start, count=1)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['key', 'window_start'],
+                set_={'count': table.c.count + 1}
+            ).returning(table.c.count)
+            return conn.execute(stmt).scalar_one()
+
+        updated = conn.execute(
+            update(table).where(table.c.key == key, table.c.window_start == window_start)
+            .values(count=table.c.count + 1)
+        ).rowcount
+        if not updated:
+            conn.execute(table.insert().values(key=key, window_start=window_start, count=1))
+        return conn.execute(
+            select(table.c.count).where(table.c.key == key, table.c.window_start == window_start)
+        ).scalar_one()
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        window_start = _window_start(now, window)
+        self._max_window = max(self._max_window, window)
+        table = RateLimitCounter.__table__
+        # Conexión propia: el conteo se confirma aunque la petición haga rollback
+        with db.engine.begin() as conn:
+            current = self._increment(conn, key, window_start)
+            previous = conn.execute(
+                select(table.c.count).where(table.c.key == key, table.c.window_start == window_start - window)
+            ).scalar() or 0
+            if now - self._last_cleanup >= self.cleanup_interval:
+                self._last_cleanup = now
+                conn.execute(delete(table).where(table.c.window_start < self._cleanup_cutoff(now)))
+        return _sliding_result(previous, current, window_start, limit, window, now)
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(delete(RateLimitCounter.__table__))
+
+
+# ==================== LLAVES ====================
+
+def ip_key():
+    """IP del cliente (detrás del proxy de Render es la última dirección de X-Forwarded-For)"""
+    if request.access_route:
+        return request.access_route[-1]
+    return request.remote_addr
+
+
+def email_key():
+    """Email enviado en el cuerpo JSON (None si no viene)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    email = (data.get('email') or '').strip().lower()
+    return email or None
+
+
+def user_key():
+    """Id del usuario autenticado (None si es anónimo)"""
+    if current_user and current_user.is_authenticated:
+        return str(current_user.id)
+    return None
+
+
+class RateLimiter:
+    """Registra las reglas por ruta y las aplica con el almacén configurado"""
+
+    def __init__(self, store=None, enabled=True):
+        self.store = store or MemoryRateLimitStore()
+        self.enabled = enabled
+
+    def configure(self, enabled=True, storage='memory'):
+        """storage: 'memory' (por proceso) o 'database' (compartido entre workers)"""
+        self.enabled = enabled
+        if storage == 'database':
+            self.store = DatabaseRateLimitStore()
+        elif storage == 'memory':
+            self.store = MemoryRateLimitStore()
+        else:
+            raise ValueError(f"Almacén de rate limit desconocido: {storage}")
+
+    def limit(self, rule, key=ip_key, scope=None):
+        """
+        Decorador: aplica rule ('10/minute') a la ruta, contando por key().
+        Las peticiones para las que key() retorna None no se cuentan.
+        """
+        amount, window = parse_limit(rule)
+        DECLARED_WINDOWS.add(window)
+        key_name = key.__name__.replace('_key', '')
+
+        def decorator(view):
+            rule_scope = scope or view.__name__
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    value = key()
+                    if value is not None:
+                        # Con el periodo en la llave, dos reglas con la misma llave (minuto y hora) no comparten contador
+                        storage_key = f"{rule_scope}:{key_name}:{window}:{value}"
+                        try:
+                            result = self.store.hit(storage_key, amount, window)
+                        except Exception as e:
+                            logger.error(f"Error en rate limit ({storage_key}): {str(e)}")
+                            result = None
+                        if result is not None and not result.allowed:
+                            logger.warning(f"Rate limit excedido: {rule_scope} por {key_name} ({rule})")
+                            return too_many_requests(result)
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+def too_many_requests(result):
+    """Respuesta 429 con Retry-After"""
+    response = jsonify({
+        'error': f'Demasiadas solicitudes, intenta de nuevo en {result.retry_after} segundos'
+    })
+    response.headers['Retry-After'] = str(result.retry_after)
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    return response, 429
+
+
+rate_limiter = RateLimiter()
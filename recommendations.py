@@ -0,0 +1,366 @@
+"""
+Motor de recomendaciones vectorizado con NumPy.
+
+El catálogo se convierte una sola vez por versión (ver catalog_cache) en arreglos
+columnares: ids, códigos de categoría, bitmask de plataformas y precio. Puntuar a
+un usuario es entonces un puñado de operaciones sobre arreglos más una
+selección parcial (np.partition) para el top-k, sin importar el tamaño del catálogo.
+"""
+
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+
+from catalog_cache import catalog_cache
+from collaborative import load_neighbors, neighbor_scores
+from models import db, User, UserRecommendation, PLATFORM_BITS, platforms_to_mask
+from preferences import feature_vector_cache, load_feature_vectors
+
+# Juegos que se pueden recomendar (los 5 juegos chistosos, con sus nombres antiguos)
+RECOMMENDABLE_GAME_NAMES = frozenset([
+    'Frootilupis Match', 'Chocopops Volador', 'SnackAttack Laberinto',
+    'CerealKiller Connect', 'Munchies Memory', 'Flootilupis', 'Chocopops',
+    'SnackAttack', 'CerealKiller', 'Munchies'
+])
+
+# Cantidad de recomendaciones que se muestran en la app
+RECOMMENDATION_COUNT = 3
+# Cantidad que se materializa por usuario (las campañas de email/push usan más que la app)
+MATERIALIZED_RECOMMENDATION_COUNT = 10
+
+# Puntos de la fórmula de recomendación
+NOT_PLAYED_BONUS = 20
+PLAYED_PENALTY = -10
+CATEGORY_MATCH_POINTS = 5
+ANDROID_POINTS = 3
+FREE_POINTS = 2
+NEIGHBOR_POINTS = 10  # Por unidad de similitud con juegos que el usuario ya jugó
+PREFERENCE_POINTS = 3  # Por unidad de peso en el vector de preferencias del usuario
+
+# Mapeo de categorías en inglés a español
+CATEGORY_TRANSLATIONS = {
+    'arcade': 'acción rápida',
+    'match-3': 'puzzle de combinación',
+    'puzzle': 'puzzle',
+    'memory': 'memoria',
+    'strategy': 'estrategia',
+    'racing': 'carreras',
+    'fps': 'disparos',
+    'sandbox': 'mundo abierto',
+    'simulation': 'simulación'
+}
+
+
+class CatalogMatrix:
+    """Catálogo en forma columnar para una versión concreta"""
+
+    def __init__(self, snapshot):
+        games = snapshot.games
+        self.version = snapshot.version
+        self.etag = snapshot.etag
+        self.ids = np.array([game['id'] for game in games], dtype=np.int64)
+        self.index_by_id = {game_id: index for index, game_id in enumerate(self.ids.tolist())}
+
+        # Categorías en minúsculas codificadas como enteros (-1 = sin categoría)
+        self.categories = []
+        self.category_index = {}
+        codes = []
+        for game in games:
+            category = (game['category'] or '').lower()
+            if not category:
+                codes.append(-1)
+                continue
+            if category not in self.category_index:
+                self.category_index[category] = len(self.categories)
+                self.categories.append(category)
+            codes.append(self.category_index[category])
+        self.category_codes = np.array(codes, dtype=np.int64)
+        self.has_category = self.category_codes >= 0
+
+        self.platform_mask = np.array([platforms_to_mask(game['platforms']) for game in games], dtype=np.int64)
+        self.price = np.array([game['price'] for game in games], dtype=np.float64)
+        self.recommendable = np.array([game['name'] in RECOMMENDABLE_GAME_NAMES for game in games], dtype=bool)
+        self.candidates = np.flatnonzero(self.recommendable)
+
+        # Puntos que no dependen del usuario
+        self.base_score = (
+            ((self.platform_mask & PLATFORM_BITS['Android']) != 0) * ANDROID_POINTS
+            + (self.price == 0.0) * FREE_POINTS
+        ).astype(np.float64)
+
+
+class RecommendationEngine:
+    """Puntúa el catálogo para un usuario usando operaciones sobre arreglos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+
+    def matrix(self):
+        """Obtener la matriz del catálogo, reconstruyéndola solo si cambió la versión"""
+        snapshot = catalog_cache.get()
+        matrix = self._matrix
+        if matrix is not None and matrix.version == snapshot.version:
+            return matrix
+
+        with self._lock:
+            matrix = self._matrix
+            if matrix is None or matrix.version != snapshot.version:
+                matrix = CatalogMatrix(snapshot)
+                self._matrix = matrix
+            return matrix
+
+    def recommend(self, played_game_ids, k=RECOMMENDATION_COUNT, matrix=None, similar_scores=None, features=None):
+        """
+        Calcula las k mejores recomendaciones.
+        similar_scores es {game_id: similitud acumulada} según los vecinos precalculados (ver collaborative).
+        features es el vector de preferencias del usuario (ver preferences).
+        Retorna una lista de diccionarios con game_id, score y recommendation_reason.
+        """
+        matrix = matrix or self.matrix()
+        played = np.zeros(len(matrix.ids), dtype=bool)
+        played_indexes = [matrix.index_by_id[game_id] for game_id in played_game_ids if game_id in matrix.index_by_id]
+        played[played_indexes] = True
+
+        # Cuántos juegos ha jugado de cada categoría
+        category_counts = np.bincount(
+            matrix.category_codes[played & matrix.has_category],
+            minlength=len(matrix.categories) + 1
+        )
+        # El código -1 (sin categoría) cae en la última posición, que siempre vale 0
+        game_category_counts = category_counts[matrix.category_codes]
+
+        similarity = np.zeros(len(matrix.ids), dtype=np.float64)
+        if similar_scores:
+            for game_id, score in similar_scores.items():
+                index = matrix.index_by_id.get(game_id)
+                if index is not None:
+                    similarity[index] = score
+
+        preference = preference_scores(matrix, features)
+
+        scores = (
+            matrix.base_score
+            + np.where(played, PLAYED_PENALTY, NOT_PLAYED_BONUS)
+            + game_category_counts * CATEGORY_MATCH_POINTS
+            + similarity * NEIGHBOR_POINTS
+            + preference * PREFERENCE_POINTS
+        )
+
+        top = top_k(scores[matrix.candidates], k)
+
+        recommendations = []
+        for index in matrix.candidates[top].tolist():
+            code = matrix.category_codes[index]
+            category = matrix.categories[code] if code >= 0 else None
+            recommendations.append({
+                'game_id': int(matrix.ids[index]),
+                'score': float(scores[index]),
+                'recommendation_reason': recommendation_reason(
+                    category, bool(played[index]), bool(code >= 0 and category_counts[code]),
+                    bool(similarity[index] > 0), bool(preference[index] > 0)
+                )
+            })
+        return recommendations
+
+
+def preference_scores(matrix, features):
+    """Peso del vector de preferencias del usuario para cada juego del catálogo"""
+    scores = np.zeros(len(matrix.ids), dtype=np.float64)
+    if features is None:
+        return scores
+
+    # Una posición extra en cero para los juegos sin categoría (código -1)
+    category_weights = np.zeros(len(matrix.categories) + 1, dtype=np.float64)
+    for category, weight in features.category_weights.items():
+        code = matrix.category_index.get(category)
+        if code is not None:
+            category_weights[code] = weight
+    scores += category_weights[matrix.category_codes]
+
+    for bit, weight in features.platform_weights.items():
+        scores += ((matrix.platform_mask & bit) != 0) * weight
+
+    is_free = matrix.price == 0.0
+    scores += is_free * features.price_weights.get('free', 0.0)
+    scores += ~is_free * features.price_weights.get('paid', 0.0)
+    return scores
+
+
+def top_k(scores, k):
+    """
+    Índices de las k puntuaciones más altas, ordenados de mayor a menor.
+    Los empates se resuelven por posición en el catálogo, igual que un ordenamiento estable.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    # Puntuación del k-ésimo mejor juego sin ordenar todo el arreglo
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.lexsort((top, -scores[top]))]
+
+
+def recommendation_reason(category, played, category_played, similar_players=False, matches_preferences=False):
+    """Genera la razón de recomendación que se muestra al usuario"""
+    category_es = CATEGORY_TRANSLATIONS.get(category, category) if category else None
+    if not played:
+        if category_es and category_played:
+            return f"Te gustan los juegos de {category_es}"
+        if similar_players:
+            return "Popular entre jugadores con gustos como los tuyos"
+        if matches_preferences:
+            return "Coincide con tus preferencias"
+        if category_es:
+            return f"Perfecto si te gustan los juegos de {category_es}"
+        return "Nuevo juego perfecto para ti"
+    if category_es:
+        return f"Basado en tu interés por juegos de {category_es}"
+    return "Recomendado según tus preferencias"
+
+
+recommendation_engine = RecommendationEngine()
+
+
+# ==================== MATERIALIZACIÓN POR USUARIO ====================
+
+def upsert_user_recommendations(rows):
+    """Inserta o actualiza filas de user_recommendations en una sola sentencia (sin commit)"""
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        insert = postgresql.insert
+    elif dialect == 'sqlite':
+        insert = sqlite.insert
+    else:
+        for row in rows:
+            db.session.merge(UserRecommendation(**row))
+        return
+
+    stmt = insert(UserRecommendation.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={column: stmt.excluded[column]
+              for column in ('history_version', 'preferences_version', 'catalog_etag', 'recommendations', 'updated_at')}
+    )
+    db.session.execute(stmt)
+
+
+def _materialized_row(user_id, history_version, preferences_version, matrix, recommendations):
+    return {
+        'user_id': user_id,
+        'history_version': history_version,
+        'preferences_version': preferences_version,
+        'catalog_etag': matrix.etag,
+        'recommendations': json.dumps(recommendations),
+        'updated_at': datetime.utcnow()
+    }
+
+
+def refresh_user_recommendations(user):
+    """
+    Recalcula las recomendaciones del usuario y las guarda en la sesión actual.
+    No hace commit: se llama dentro de la misma transacción que modifica el historial.
+    """
+    features = feature_vector_cache.get(user)
+    played_game_ids = features.played_game_ids
+    similar_scores = neighbor_scores(played_game_ids, load_neighbors(played_game_ids))
+    matrix = recommendation_engine.matrix()
+    recommendations = recommendation_engine.recommend(
+        played_game_ids, k=MATERIALIZED_RECOMMENDATION_COUNT, matrix=matrix,
+        similar_scores=similar_scores, features=features
+    )
+    upsert_user_recommendations([
+        _materialized_row(user.id, user.play_history_version or 0, user.preferences_version or 0,
+                          matrix, recommendations)
+    ])
+    return recommendations
+
+
+def play_history_changed(user):
+    """
+    Incrementa la versión del historial del usuario y refresca sus recomendaciones.
+    Se llama en los endpoints que modifican user_games, antes de su commit.
+    """
+    # Incremento en SQL: dos peticiones concurrentes del mismo usuario no pierden versiones
+    table = User.__table__
+    stmt = update(table).where(table.c.id == user.id).values(
+        play_history_version=func.coalesce(table.c.play_history_version, 0) + 1
+    )
+    if db.session.get_bind().dialect.update_returning:
+        version = db.session.execute(stmt.returning(table.c.play_history_version)).scalar_one()
+    else:
+        db.session.execute(stmt)
+        version = db.session.execute(
+            select(table.c.play_history_version).where(table.c.id == user.id)
+        ).scalar_one()
+    set_committed_value(user, 'play_history_version', version)
+    return refresh_user_recommendations(user)
+
+
+def get_user_recommendations(user, limit=RECOMMENDATION_COUNT):
+    """Obtener las recomendaciones materializadas, recalculándolas solo si están desactualizadas"""
+    row = db.session.get(UserRecommendation, user.id)
+    if row and row.is_current(user.play_history_version or 0, user.preferences_version or 0, catalog_cache.get().etag):
+        return json.loads(row.recommendations)[:limit]
+
+    recommendations = refresh_user_recommendations(user)
+    db.session.commit()
+    return recommendations[:limit]
+
+
+def iter_user_chunks(chunk_size, after_user_id=0):
+    """Genera bloques de (id, play_history_version, preferences_version) de usuarios ordenados por id"""
+    last_user_id = after_user_id
+    while True:
+        users = db.session.query(User.id, User.play_history_version, User.preferences_version).filter(
+            User.id > last_user_id
+        ).order_by(User.id).limit(chunk_size).all()
+        if not users:
+            return
+        yield [tuple(user) for user in users]
+        last_user_id = users[-1][0]
+
+
+def materialize_recommendations(users, matrix=None):
+    """
+    Calcula y guarda (sin commit) las recomendaciones de un bloque de usuarios
+    dados como (id, play_history_version, preferences_version). Usa tres consultas por bloque.
+    """
+    matrix = matrix or recommendation_engine.matrix()
+    features_by_user = load_feature_vectors([user_id for user_id, _, _ in users])
+
+    # Vecinos de todos los juegos del bloque en una sola consulta
+    neighbors = load_neighbors([
+        game_id for features in features_by_user.values() for game_id in features.played_game_ids
+    ])
+
+    rows = []
+    for user_id, history_version, preferences_version in users:
+        features = features_by_user[user_id]
+        recommendations = recommendation_engine.recommend(
+            features.played_game_ids, k=MATERIALIZED_RECOMMENDATION_COUNT, matrix=matrix,
+            similar_scores=neighbor_scores(features.played_game_ids, neighbors), features=features
+        )
+        rows.append(_materialized_row(user_id, history_version or 0, preferences_version or 0,
+                                      matrix, recommendations))
+    upsert_user_recommendations(rows)
+    return len(rows)
+
+
+def rebuild_all_recommendations(chunk_size=500):
+    """Recalcula las recomendaciones de todos los usuarios por bloques (tras cambios del catálogo)"""
+    matrix = recommendation_engine.matrix()
+    total = 0
+    for users in iter_user_chunks(chunk_size):
+        total += materialize_recommendations(users, matrix)
+        db.session.commit()
+    return total
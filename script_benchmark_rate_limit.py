@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del rate limiter de PixelPick.
+Mide el costo por verificación de cada almacén (memoria y base de datos SQLite)
+sin pasar por Flask ni por la red.
+
+Uso: python script_benchmark_rate_limit.py [--checks N] [--keys N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from models import db
+from rate_limit import DatabaseRateLimitStore, MemoryRateLimitStore
+
+
+def medir(store, checks, keys, limit=100, window=60):
+    """Ejecuta checks verificaciones repartidas entre keys llaves; retorna microsegundos por verificación"""
+    start = time.perf_counter()
+    for i in range(checks):
+        store.hit(f"login:ip:10.0.{i % keys // 256}.{i % 256}", limit, window)
+    return (time.perf_counter() - start) / checks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark del rate limiter')
+    parser.add_argument('--checks', type=int, default=200000, help='Verificaciones en memoria')
+    parser.add_argument('--db-checks', type=int, default=2000, help='Verificaciones contra la base de datos')
+    parser.add_argument('--keys', type=int, default=1000, help='Llaves distintas (IPs)')
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("Rate limiter: costo por verificación")
+    print("=" * 60)
+
+    memory_us = medir(MemoryRateLimitStore(), args.checks, args.keys)
+    print(f"Memoria:        {memory_us:8.2f} µs/verificación ({args.checks} verificaciones)")
+
+    # Base de datos SQLite temporal, como la compartida entre workers en un solo servidor
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            database_us = medir(DatabaseRateLimitStore(), args.db_checks, args.keys)
+            db.engine.dispose()
+        print(f"Base de datos:  {database_us:8.2f} µs/verificación ({args.db_checks} verificaciones, SQLite)")
+    finally:
+        os.remove(path)
+
+    print("=" * 60 + "\n")
+
+
+if __name__ == "__main__":
+    main()
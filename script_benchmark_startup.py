@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark del tiempo de arranque de un worker de PixelPick, antes y después
+del bootstrap con `flask bootstrap`. Mide cuánto tarda `import app` en un
+proceso nuevo sobre una misma base SQLite temporal:
+- primer arranque: migraciones y juegos sembrados en una base vacía
+- antes: `import app` de la revisión anterior a bootstrap.py (extraída con
+  `git archive`), cuyo init_db cuenta los juegos y consulta cada juego sembrado
+  por nombre en cada worker
+- después, con BOOTSTRAP_ON_IMPORT=true: run_bootstrap al importar (solo
+  compara la huella de los juegos sembrados)
+- después, con BOOTSTRAP_ON_IMPORT=false: lo que hace cada worker tras
+  `flask bootstrap`
+
+Uso: python script_benchmark_startup.py [--runs N] [--baseline-rev REV]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_APP = 'import app'
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def arrancar(database_url, bootstrap=True, cwd=ROOT):
+    """Importa app.py de cwd en un proceso nuevo; retorna los segundos transcurridos"""
+    env = dict(os.environ, DATABASE_URL=database_url, BOOTSTRAP_ON_IMPORT='true' if bootstrap else 'false')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', IMPORT_APP], env=env, check=True, cwd=cwd,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def revision_base():
+    """Revisión anterior a la que agregó bootstrap.py (None si no se puede determinar)"""
+    try:
+        added = subprocess.run(
+            ['git', 'log', '--diff-filter=A', '--format=%h', '--', 'bootstrap.py'],
+            cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.split()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{added[-1]}^' if added else None
+
+
+def extraer_revision(rev, destino):
+    """Extrae los archivos de la revisión rev en destino; retorna False si git falla"""
+    try:
+        archive = subprocess.run(['git', 'archive', rev], cwd=ROOT, check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', destino], input=archive, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del arranque de workers')
+    parser.add_argument('--runs', type=int, default=5, help='Arranques por escenario')
+    parser.add_argument('--baseline-rev', default=None,
+                        help='Revisión "antes" (por defecto, la anterior a la que agregó bootstrap.py)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+
+        print("\n" + "=" * 60)
+        print("Arranque de un worker (import app)")
+        print("=" * 60)
+
+        first = arrancar(database_url)
+        print(f"Primer arranque (migrar y sembrar):   {first * 1000:8.1f} ms")
+
+        scenarios = []
+        baseline_rev = args.baseline_rev or revision_base()
+        baseline_dir = os.path.join(tmp, 'baseline')
+        os.makedirs(baseline_dir)
+        if baseline_rev and extraer_revision(baseline_rev, baseline_dir):
+            scenarios.append((f'Antes ({baseline_rev}):', dict(cwd=baseline_dir)))
+        else:
+            print("Sin revisión base (se necesita git): se omite el escenario 'antes'")
+        scenarios += [
+            ('Después, bootstrap al importar:', dict(bootstrap=True)),
+            ('Después, tras `flask bootstrap`:', dict(bootstrap=False)),
+        ]
+
+        for label, options in scenarios:
+            times = [arrancar(database_url, **options) for _ in range(args.runs)]
+            print(f"{label:37s} {statistics.median(times) * 1000:8.1f} ms (mediana de {args.runs})")
+
+        print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
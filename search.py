@@ -0,0 +1,139 @@
+"""
+Búsqueda de texto completo sobre el catálogo de juegos.
+
+Usa el índice nativo de cada base de datos:
+- SQLite: tabla virtual FTS5 (games_fts) sincronizada con triggers
+- PostgreSQL: columna tsvector generada (games.search_vector) con índice GIN
+
+Cada término se busca como prefijo para soportar autocompletado mientras se escribe.
+"""
+
+import logging
+import re
+
+from sqlalchemy import text
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# Palabras de la consulta (letras y números, incluyendo acentos)
+TERM_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+
+# Máximo de términos que se aceptan por consulta
+MAX_TERMS = 8
+
+
+class SearchUnavailableError(Exception):
+    """El índice de búsqueda no está disponible en esta base de datos"""
+
+
+def setup_search_index():
+    """Crea el índice de búsqueda si no existe (se llama desde init_db)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        _setup_sqlite_fts()
+    elif dialect == 'postgresql':
+        _setup_postgres_tsvector()
+    else:
+        logger.warning(f"Búsqueda de texto completo no soportada para el dialecto {dialect}")
+
+
+def _setup_sqlite_fts():
+    exists = db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'games_fts'")
+    ).first()
+    if exists:
+        return
+
+    logger.info("Creando índice FTS5 games_fts...")
+    db.session.execute(text("""
+        CREATE VIRTUAL TABLE games_fts USING fts5(
+            name, description, category,
+            content='games', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """))
+    db.session.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS games_fts_ai AFTER INSERT ON games BEGIN
+            INSERT INTO games_fts(rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    """))
+    db.session.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS games_fts_ad AFTER DELETE ON games BEGIN
+            INSERT INTO games_fts(games_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+        END
+    """))
+    db.session.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS games_fts_au AFTER UPDATE ON games BEGIN
+            INSERT INTO games_fts(games_fts, rowid, name, description, category)
+            VALUES ('delete', old.id, old.name, old.description, old.category);
+            INSERT INTO games_fts(rowid, name, description, category)
+            VALUES (new.id, new.name, new.description, new.category);
+        END
+    """))
+    # Indexar los juegos que ya existían
+    db.session.execute(text("INSERT INTO games_fts(games_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    logger.info("Índice FTS5 games_fts creado exitosamente")
+
+
+def _setup_postgres_tsvector():
+    # Configuración 'simple' porque el catálogo mezcla español e inglés
+    db.session.execute(text("""
+        ALTER TABLE games ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(category, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+        ) STORED
+    """))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_games_search_vector ON games USING GIN (search_vector)"
+    ))
+    db.session.commit()
+
+
+def extract_terms(query):
+    """Separa la consulta del usuario en términos de búsqueda"""
+    return TERM_PATTERN.findall(query.lower())[:MAX_TERMS]
+
+
+def search_game_ids(query, limit):
+    """
+    Busca juegos por nombre, descripción y categoría.
+    Retorna una lista de (game_id, rank) ordenada por relevancia.
+    """
+    terms = extract_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        # Cada término entre comillas (escapa la sintaxis FTS5) y con * para prefijo
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        # bm25 retorna valores negativos: menor es más relevante. Pesos: name, description, category
+        rows = db.session.execute(text("""
+            SELECT rowid, bm25(games_fts, 10.0, 1.0, 4.0) AS rank
+            FROM games_fts
+            WHERE games_fts MATCH :match
+            ORDER BY rank
+            LIMIT :limit
+        """), {'match': match, 'limit': limit}).all()
+        return [(row[0], -row[1]) for row in rows]
+
+    if dialect == 'postgresql':
+        tsquery = ' & '.join(term + ':*' for term in terms)
+        rows = db.session.execute(text("""
+            SELECT id, ts_rank_cd(search_vector, query) AS rank
+            FROM games, to_tsquery('simple', :tsquery) AS query
+            WHERE search_vector @@ query
+            ORDER BY rank DESC, id
+            LIMIT :limit
+        """), {'tsquery': tsquery, 'limit': limit}).all()
+        return [(row[0], float(row[1])) for row in rows]
+
+    raise SearchUnavailableError(f"Búsqueda no disponible para el dialecto {dialect}")
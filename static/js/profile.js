@@ -156,6 +156,7 @@ function loadProfileData() {
                 
                 // Actualizar juegos recientes
                 updateRecentGames(data.games);
+                updateLoadMoreButton(data.history_next_cursor);
             }
         })
         .catch(error => {
@@ -163,6 +164,30 @@ function loadProfileData() {
         });
 }
 
+// Cursor de la siguiente página del historial (null si no hay más)
+let historyNextCursor = null;
+
+// Función para crear la tarjeta de un juego reciente
+function createRecentGameCard(gameData) {
+    const game = gameData.game;
+    const lastPlayed = gameData.last_played ? formatTimeAgo(new Date(gameData.last_played)) : 'Nunca';
+    
+    const gameCard = document.createElement('div');
+    gameCard.className = 'game-card-recent';
+    gameCard.innerHTML = `
+        <div class="game-image-recent">
+            <div class="game-placeholder-recent game-${(game.id % 3) + 1}">
+                <span>${game.name.substring(0, 4).toUpperCase()}</span>
+            </div>
+        </div>
+        <div class="game-info-recent">
+            <h3 class="game-title-recent">${game.name}</h3>
+            <p class="game-time-recent">Última vez: ${lastPlayed}</p>
+        </div>
+    `;
+    return gameCard;
+}
+
 // Función para actualizar juegos recientes
 function updateRecentGames(games) {
     const gamesGrid = document.getElementById('gamesGrid');
@@ -174,23 +199,7 @@ function updateRecentGames(games) {
         gamesGrid.innerHTML = '';
         games.forEach(gameData => {
             if (gameData.game) {
-                const game = gameData.game;
-                const lastPlayed = gameData.last_played ? formatTimeAgo(new Date(gameData.last_played)) : 'Nunca';
-                
-                const gameCard = document.createElement('div');
-                gameCard.className = 'game-card-recent';
-                gameCard.innerHTML = `
-                    <div class="game-image-recent">
-                        <div class="game-placeholder-recent game-${(game.id % 3) + 1}">
-                            <span>${game.name.substring(0, 4).toUpperCase()}</span>
-                        </div>
-                    </div>
-                    <div class="game-info-recent">
-                        <h3 class="game-title-recent">${game.name}</h3>
-                        <p class="game-time-recent">Última vez: ${lastPlayed}</p>
-                    </div>
-                `;
-                gamesGrid.appendChild(gameCard);
+                gamesGrid.appendChild(createRecentGameCard(gameData));
             }
         });
         
@@ -206,6 +215,44 @@ function updateRecentGames(games) {
     }
 }
 
+// Función para mostrar u ocultar el botón "Cargar más"
+function updateLoadMoreButton(nextCursor) {
+    historyNextCursor = nextCursor || null;
+    const loadMoreBtn = document.getElementById('loadMoreGames');
+    if (loadMoreBtn) {
+        loadMoreBtn.style.display = historyNextCursor ? 'inline-flex' : 'none';
+        loadMoreBtn.disabled = false;
+    }
+}
+
+// Función para cargar la siguiente página del historial
+function loadMoreGames() {
+    const gamesGrid = document.getElementById('gamesGrid');
+    const loadMoreBtn = document.getElementById('loadMoreGames');
+    if (!gamesGrid || !historyNextCursor) return;
+    
+    if (loadMoreBtn) loadMoreBtn.disabled = true;
+    
+    fetch(`/api/user/games/history?cursor=${encodeURIComponent(historyNextCursor)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                data.games.forEach(gameData => {
+                    if (gameData.game) {
+                        gamesGrid.appendChild(createRecentGameCard(gameData));
+                    }
+                });
+                updateLoadMoreButton(data.next_cursor);
+            } else if (loadMoreBtn) {
+                loadMoreBtn.disabled = false;
+            }
+        })
+        .catch(error => {
+            console.error('Error al cargar historial:', error);
+            if (loadMoreBtn) loadMoreBtn.disabled = false;
+        });
+}
+
 // Función para formatear tiempo transcurrido
 function formatTimeAgo(date) {
     const now = new Date();
@@ -0,0 +1,290 @@
+"""
+Ingesta y procesamiento de eventos de webhook de Stripe.
+
+El webhook solo verifica la firma y guarda el evento crudo en stripe_events
+(una fila por id de evento de Stripe, así que las entregas repetidas se
+descartan) y responde de inmediato. Un hilo por proceso procesa los eventos
+pendientes en orden de llegada:
+
+- Los eventos del mismo payment intent se procesan en orden: un evento no se
+  toma mientras haya uno anterior del mismo pago sin terminar.
+- Cada evento se toma con un UPDATE condicional que le da un plazo
+  (PROCESSING_TIMEOUT); si el proceso muere, otro lo retoma al vencer el plazo.
+- Los cambios del evento y su marca de procesado se confirman juntos.
+- Si falla, se reintenta con espera exponencial hasta MAX_ATTEMPTS veces.
+
+`flask process-stripe-events` procesa los pendientes sin hilo y
+`flask replay-stripe-events` reenvía los eventos de un archivo JSON al
+webhook para probar sin Stripe (ver fixtures/stripe_webhook_events.json).
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import db, StripeEvent, Subscription, Transaction
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+PROCESSED = 'processed'
+FAILED = 'failed'
+
+# Segundos que un proceso tiene un evento tomado antes de que otro pueda retomarlo
+PROCESSING_TIMEOUT = 300
+BATCH_SIZE = 100
+MAX_RETRY_DELAY = 3600
+MAX_ATTEMPTS = 8
+
+_worker_lock = threading.Lock()
+_worker_thread = None
+_wakeup = threading.Event()
+
+
+def event_payment_intent_id(event):
+    """Id del payment intent al que se refiere el evento (None si no aplica)"""
+    obj = (event.get('data') or {}).get('object') or {}
+    if obj.get('object') == 'payment_intent':
+        return obj.get('id')
+    payment_intent = obj.get('payment_intent')
+    return payment_intent.get('id') if isinstance(payment_intent, dict) else payment_intent
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Cabecera Stripe-Signature para payload (para reenviar eventos de prueba firmados)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(secret.encode('utf-8'), f"{timestamp}.{payload}".encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+# ==================== INGESTA ====================
+
+def ingest_event(event, payload=None):
+    """
+    Guarda el evento si su id no se había recibido. Retorna True si es nuevo,
+    False si es una entrega repetida.
+    """
+    values = {
+        'event_id': event['id'],
+        'event_type': event.get('type') or '',
+        'payment_intent_id': event_payment_intent_id(event),
+        'payload': payload if payload is not None else json.dumps(event),
+        'status': PENDING,
+        'attempts': 0,
+        'received_at': datetime.utcnow(),
+        'next_attempt_at': datetime.utcnow()
+    }
+    table = StripeEvent.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(**values).on_conflict_do_nothing(index_elements=['event_id'])
+        created = db.session.execute(stmt).rowcount == 1
+        db.session.commit()
+    else:
+        try:
+            db.session.execute(table.insert().values(**values))
+            db.session.commit()
+            created = True
+        except IntegrityError:
+            db.session.rollback()
+            created = False
+
+    if created:
+        _wakeup.set()
+    return created
+
+
+# ==================== MANEJADORES ====================
+
+def _payment_succeeded(event):
+    payment_intent_id = event['data']['object']['id']
+    logger.info(f"Payment Intent exitoso: {payment_intent_id}")
+
+    transaction = Transaction.query.filter_by(payment_intent_id=payment_intent_id).first()
+    if not transaction:
+        logger.warning(f"Transacción no encontrada para payment_intent_id: {payment_intent_id}")
+        return
+    if transaction.status == 'completed':
+        logger.info(f"Transacción {transaction.id} ya estaba completada")
+        return
+
+    transaction.status = 'completed'
+    transaction.completed_at = datetime.utcnow()
+
+    # Crear o actualizar suscripción
+    subscription = Subscription.query.filter_by(
+        user_id=transaction.user_id,
+        plan_type='pixelie_plan'
+    ).first()
+    if not subscription:
+        subscription = Subscription(
+            user_id=transaction.user_id,
+            plan_type='pixelie_plan',
+            amount=transaction.amount,
+            currency=transaction.currency,
+            status='active',
+            subscription_id=payment_intent_id,
+            current_period_start=datetime.utcnow(),
+            current_period_end=datetime.utcnow() + timedelta(days=365)  # Plan de un año
+        )
+        db.session.add(subscription)
+    else:
+        subscription.status = 'active'
+        subscription.current_period_start = datetime.utcnow()
+        subscription.current_period_end = datetime.utcnow() + timedelta(days=365)
+    logger.info(f"Suscripción activada para usuario {transaction.user_id}")
+
+
+def _payment_failed(event):
+    payment_intent_id = event['data']['object']['id']
+    logger.info(f"Payment Intent fallido: {payment_intent_id}")
+
+    transaction = Transaction.query.filter_by(payment_intent_id=payment_intent_id).first()
+    # Un pago ya completado no vuelve a fallido por un evento atrasado
+    if transaction and transaction.status != 'completed':
+        transaction.status = 'failed'
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': _payment_succeeded,
+    'payment_intent.payment_failed': _payment_failed,
+}
+
+
+# ==================== PROCESAMIENTO ====================
+
+def _claim(row, now):
+    """Toma el evento si sigue disponible; retorna True si este proceso lo obtuvo"""
+    table = StripeEvent.__table__
+    claimed = db.session.execute(
+        update(table).where(
+            table.c.id == row.id,
+            table.c.status.in_([PENDING, PROCESSING]),
+            table.c.next_attempt_at <= now
+        ).values(
+            status=PROCESSING,
+            attempts=table.c.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=PROCESSING_TIMEOUT)
+        )
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+
+def _process(row):
+    """Aplica el evento y lo marca procesado en la misma transacción; retorna True si terminó"""
+    table = StripeEvent.__table__
+    try:
+        event = json.loads(row.payload)
+        handler = EVENT_HANDLERS.get(row.event_type)
+        if handler:
+            handler(event)
+        db.session.execute(
+            update(table).where(table.c.id == row.id)
+            .values(status=PROCESSED, processed_at=datetime.utcnow(), last_error=None)
+        )
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        attempts = row.attempts + 1
+        status = FAILED if attempts >= MAX_ATTEMPTS else PENDING
+        delay = min(2 ** attempts, MAX_RETRY_DELAY)
+        db.session.execute(
+            update(table).where(table.c.id == row.id).values(
+                status=status,
+                last_error=str(e)[:2000],
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=delay)
+            )
+        )
+        db.session.commit()
+        logger.error(f"Error al procesar evento de Stripe {row.event_id} (intento {attempts}): {str(e)}")
+        return False
+
+
+def process_pending_events(batch_size=BATCH_SIZE):
+    """Procesa los eventos disponibles en orden de llegada. Retorna cuántos se procesaron."""
+    table = StripeEvent.__table__
+    now = datetime.utcnow()
+    processed = 0
+    blocked = set()  # payment intents con un evento anterior sin terminar
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.event_id, table.c.event_type, table.c.payment_intent_id,
+                   table.c.payload, table.c.attempts, table.c.next_attempt_at)
+            .where(table.c.status.in_([PENDING, PROCESSING]), table.c.id > last_id)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        db.session.commit()
+        if not rows:
+            break
+
+        for row in rows:
+            intent = row.payment_intent_id
+            if intent is not None and intent in blocked:
+                continue
+            if row.next_attempt_at > now or not _claim(row, now) or not _process(row):
+                # Otro proceso lo tiene, o espera un reintento: los siguientes del mismo pago esperan
+                if intent is not None:
+                    blocked.add(intent)
+                continue
+            processed += 1
+
+        last_id = rows[-1].id
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def _run_worker(app, interval, stop_event):
+    with app.app_context():
+        while not stop_event.is_set():
+            try:
+                process_pending_events()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error al procesar eventos de Stripe: {str(e)}")
+            finally:
+                db.session.remove()
+            # Despierta al llegar un evento a este proceso, o cada interval segundos por los de otros
+            _wakeup.wait(interval)
+            _wakeup.clear()
+
+
+def start_stripe_event_worker(app, interval):
+    """Inicia (una vez por proceso) el hilo que procesa los eventos de Stripe pendientes"""
+    global _worker_thread
+    if _worker_thread is not None:
+        return _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None or interval <= 0:
+            return _worker_thread
+        stop_event = threading.Event()
+        _worker_thread = threading.Thread(
+            target=_run_worker, args=(app, interval, stop_event),
+            name='stripe-event-worker', daemon=True
+        )
+        _worker_thread.stop_event = stop_event
+        _worker_thread.start()
+        logger.info(f"Procesando eventos de Stripe (revisión cada {interval} segundos)")
+        return _worker_thread
+
+
+def stats():
+    """Número de eventos por estado (para /api/health)"""
+    table = StripeEvent.__table__
+    rows = db.session.execute(
+        select(table.c.status, func.count()).group_by(table.c.status)
+    ).all()
+    return {status: count for status, count in rows}
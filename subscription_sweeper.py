@@ -0,0 +1,113 @@
+"""
+Barrido de suscripciones cuyo periodo pagado terminó.
+
+Cuando un usuario cambia de premium a básico se respeta el periodo pagado
+(cancel_at_period_end). Al terminar ese periodo la suscripción pasa a básico
+definitivamente. En lugar de hacerlo al leer el estado, este módulo actualiza
+todas las vencidas con sentencias UPDATE por bloques, usando el índice
+ix_subscriptions_status_period_end.
+
+Se ejecuta con `flask sweep-subscriptions` o en un hilo del proceso web cada
+SUBSCRIPTION_SWEEP_INTERVAL segundos. El UPDATE repite las condiciones, así
+que varios workers pueden barrer a la vez sin efectos dobles. El mismo hilo
+purga los tokens revocados que ya vencieron (ver tokens.py).
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from entitlements import entitlement_cache, BASIC_PLAN
+from models import db, Subscription
+from tokens import purge_expired_tokens
+
+logger = logging.getLogger(__name__)
+
+_sweeper_lock = threading.Lock()
+_sweeper_thread = None
+
+
+def _expired_condition(now):
+    table = Subscription.__table__
+    return (
+        (table.c.status == 'active')
+        & (table.c.current_period_end <= now)
+        & (table.c.cancel_at_period_end == True)  # noqa: E712
+    )
+
+
+def sweep_expired_subscriptions(chunk_size=500, now=None):
+    """
+    Pasa a básico las suscripciones marcadas para cancelarse cuyo periodo ya terminó.
+    Confirma cada bloque por separado. Retorna el número de suscripciones actualizadas.
+    """
+    now = now or datetime.utcnow()
+    table = Subscription.__table__
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.user_id).where(_expired_condition(now))
+            .order_by(table.c.current_period_end).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        ids = [subscription_id for subscription_id, _ in rows]
+        updated = db.session.execute(
+            update(table).where(table.c.id.in_(ids), _expired_condition(now)).values(
+                plan_type=BASIC_PLAN,
+                amount=0,
+                current_period_end=None,
+                cancel_at_period_end=False,
+                updated_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        total += updated
+
+        # Las sentencias UPDATE no pasan por los eventos del ORM: invalidar a mano
+        for _, user_id in rows:
+            entitlement_cache.invalidate(user_id)
+
+        if len(rows) < chunk_size:
+            break
+
+    if total:
+        logger.info(f"{total} suscripciones pasadas a básico al terminar su periodo")
+    return total
+
+
+def _run_sweeper(app, interval, stop_event):
+    with app.app_context():
+        while True:
+            try:
+                sweep_expired_subscriptions()
+                purge_expired_tokens()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error al barrer suscripciones vencidas: {str(e)}")
+            finally:
+                db.session.remove()
+            if stop_event.wait(interval):
+                break
+
+
+def start_subscription_sweeper(app, interval):
+    """Inicia (una vez por proceso) el hilo que barre las suscripciones cada interval segundos"""
+    global _sweeper_thread
+    if _sweeper_thread is not None:
+        return _sweeper_thread
+    with _sweeper_lock:
+        if _sweeper_thread is not None or interval <= 0:
+            return _sweeper_thread
+        stop_event = threading.Event()
+        _sweeper_thread = threading.Thread(
+            target=_run_sweeper, args=(app, interval, stop_event),
+            name='subscription-sweeper', daemon=True
+        )
+        _sweeper_thread.stop_event = stop_event
+        _sweeper_thread.start()
+        logger.info(f"Barrido de suscripciones vencidas cada {interval} segundos")
+        return _sweeper_thread
@@ -0,0 +1,38 @@
+"""
+Configuración común de las pruebas: una base SQLite temporal y la app sin hilos
+de fondo ni límite de peticiones. Ejecutar con `python -m pytest` desde la raíz.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP_DIR = tempfile.mkdtemp(prefix='pixelpick-tests-')
+os.environ.pop('DATABASE_URL', None)
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['SUBSCRIPTION_SWEEP_INTERVAL'] = '0'
+os.environ['STRIPE_EVENT_POLL_INTERVAL'] = '0'
+os.environ['PAYMENT_GATEWAY'] = 'fake'
+os.environ['FAKE_GATEWAY_LATENCY_MS'] = '0'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture(scope='session')
+def app():
+    """App de Flask con la base de pruebas migrada y el catálogo sembrado"""
+    import app as app_module
+
+    app_module.app.config['TESTING'] = True
+    return app_module.app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
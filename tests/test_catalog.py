@@ -0,0 +1,20 @@
+def _client(app, email):
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'firstName': 'Ana', 'lastName': 'Prueba', 'email': email, 'password': '12345678', 'terms': True
+    })
+    assert response.status_code == 201
+    return client
+
+
+def test_invalid_price_filter_is_rejected(app):
+    client = _client(app, 'catalog-prices@example.com')
+
+    for query in ('min_price=abc', 'max_price=abc', 'min_price=nan'):
+        response = client.get(f'/api/games?{query}')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+    response = client.get('/api/games?min_price=1000000')
+    assert response.status_code == 200
+    assert response.get_json()['games'] == []
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from entitlements import entitlement_cache
+from models import db, Subscription, Transaction, User
+from payment_events import PaymentEventBroker, _emit, payment_event_broker, subscription_message
+
+
+def test_subscription_message_invalidates_cached_entitlements(app_context):
+    user = User(first_name='Ana', last_name='Prueba', email='entitlements-events@example.com')
+    user.set_password('12345678')
+    db.session.add(user)
+    db.session.commit()
+    assert not entitlement_cache.get(user.id).has_premium_access()
+
+    # Otro worker activa la suscripción: este proceso solo se entera por el aviso
+    now = datetime.utcnow()
+    values = dict(user_id=user.id, plan_type='pixelie_plan', amount=100, currency='mxn', status='active',
+                  current_period_start=now, current_period_end=now + timedelta(days=365))
+    db.session.execute(Subscription.__table__.insert().values(**values))
+    db.session.commit()
+    assert not entitlement_cache.get(user.id).has_premium_access()
+
+    payment_event_broker.dispatch(subscription_message(Subscription(**values)))
+    assert entitlement_cache.get(user.id).has_premium_access()
+
+
+def test_subscriber_receives_notification_committed_right_after_subscribing(app):
+    broker = PaymentEventBroker()
+    with app.app_context():
+        messages = broker.subscribe(app, 424242)
+        # Se confirma antes de que el hilo haga su primera lectura de la tabla
+        with db.engine.begin() as conn:
+            _emit(conn, {'type': 'transaction', 'user_id': 424242, 'payment_intent_id': 'pi_test',
+                         'status': 'completed', 'completed_at': None})
+    message = messages.get(timeout=5)
+    assert message['payment_intent_id'] == 'pi_test'
+
+
+def test_head_on_payment_stream_does_not_leak_slots(app):
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'firstName': 'Ana', 'lastName': 'Prueba', 'email': 'stream-head@example.com',
+        'password': '12345678', 'terms': True
+    })
+    user_id = response.get_json()['user']['id']
+    with app.app_context():
+        db.session.add(Transaction(user_id=user_id, amount=100, currency='mxn', status='completed',
+                                   transaction_type='subscription', payment_intent_id='pi_stream_head'))
+        db.session.commit()
+
+    for _ in range(3):
+        assert client.head('/api/payment-status/pi_stream_head/stream').status_code == 200
+    # Un GET cuyo cuerpo no se lee tampoco debe retener su lugar
+    client.get('/api/payment-status/pi_stream_head/stream').close()
+
+    response = client.get('/api/payment-status/pi_stream_head/stream')
+    assert response.status_code == 200
+    assert 'pi_stream_head' in response.get_data(as_text=True)
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app import get_play_history_page
+from models import db, Game, User, UserGame
+
+
+def test_history_pages_reach_every_row(app_context):
+    user = User(first_name='Ana', last_name='Prueba', email='history-pages@example.com')
+    user.set_password('12345678')
+    db.session.add(user)
+    db.session.commit()
+
+    game_ids = [game_id for (game_id,) in db.session.query(Game.id).order_by(Game.id).limit(5)]
+    played_at = datetime(2024, 1, 1)
+    # Misma fecha en todas las filas: el desempate por id debe recorrerlas todas
+    for game_id in game_ids:
+        db.session.add(UserGame(user_id=user.id, game_id=game_id, status='playing', last_played=played_at))
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        user_games, cursor = get_play_history_page(user.id, 2, cursor)
+        seen.extend(ug.game_id for ug in user_games)
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(game_ids)
+
+
+def test_user_games_pages_with_limit_and_cursor(app):
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'firstName': 'Ana', 'lastName': 'Prueba', 'email': 'user-games-pages@example.com',
+        'password': '12345678', 'terms': True
+    })
+    user_id = response.get_json()['user']['id']
+    with app.app_context():
+        game_ids = [game_id for (game_id,) in db.session.query(Game.id).order_by(Game.id).limit(3)]
+        for day, game_id in enumerate(game_ids, start=1):
+            db.session.add(UserGame(user_id=user_id, game_id=game_id, status='playing',
+                                    last_played=datetime(2024, 1, day)))
+        db.session.commit()
+
+    # Sin parámetros: todos, del más reciente al más antiguo
+    data = client.get('/api/user/games').get_json()
+    assert [game['game_id'] for game in data['games']] == game_ids[::-1]
+
+    first = client.get('/api/user/games?limit=2').get_json()
+    second = client.get(f"/api/user/games?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [game['game_id'] for game in first['games'] + second['games']] == game_ids[::-1]
+    assert second['next_cursor'] is None
+    assert client.get('/api/user/games?cursor=invalido').status_code == 400
@@ -0,0 +1,58 @@
+from sqlalchemy import select
+
+from models import db, RateLimitCounter
+from rate_limit import DatabaseRateLimitStore, MemoryRateLimitStore, RateLimiter
+
+
+def _counter_windows(key):
+    table = RateLimitCounter.__table__
+    return {row.window_start for row in db.session.execute(select(table.c.window_start).where(table.c.key == key))}
+
+
+def test_database_cleanup_keeps_windows_of_longer_rules(app_context):
+    limiter = RateLimiter(store=DatabaseRateLimitStore())
+    limiter.limit('10/hour')(lambda: None)
+    limiter.limit('5/minute')(lambda: None)
+    store = limiter.store
+
+    now = 7200.0 * 1000
+    for _ in range(3):
+        store.hit('register:ip:10.0.0.1', 10, 3600, now=now)
+
+    # Este worker solo atiende la regla por minuto; su limpieza no debe tocar la regla por hora
+    store._max_window = 0
+    store._last_cleanup = 0.0
+    store.hit('login:ip:10.0.0.1', 5, 60, now=now + 600)
+
+    assert _counter_windows('register:ip:10.0.0.1') == {now}
+    result = store.hit('register:ip:10.0.0.1', 10, 3600, now=now + 660)
+    assert result.remaining == 6
+
+
+def test_database_cleanup_removes_expired_windows(app_context):
+    limiter = RateLimiter(store=DatabaseRateLimitStore())
+    limiter.limit('10/hour')(lambda: None)
+    store = limiter.store
+
+    now = 7200.0 * 2000
+    store.hit('old:ip:10.0.0.2', 5, 60, now=now)
+    store._last_cleanup = 0.0
+    store.hit('other:ip:10.0.0.2', 5, 60, now=now + 3 * 86400)
+
+    assert _counter_windows('old:ip:10.0.0.2') == set()
+
+
+def test_stacked_rules_keep_separate_counters(app):
+    store = MemoryRateLimitStore()
+    limiter = RateLimiter(store=store)
+    view = limiter.limit('100/hour')(limiter.limit('2/minute')(lambda: 'ok'))
+
+    with app.test_request_context('/', environ_base={'REMOTE_ADDR': '10.0.0.3'}):
+        assert [view() for _ in range(2)] == ['ok', 'ok']
+        assert view()[1] == 429
+
+    # La regla por hora solo contó sus propias peticiones, con su propio periodo
+    hourly = [key for key in store._windows if ':3600:' in key]
+    assert len(hourly) == 1
+    assert store._windows[hourly[0]][0] == 3600
+    assert store._windows[hourly[0]][3] == 3
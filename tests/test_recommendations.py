@@ -0,0 +1,23 @@
+from sqlalchemy import select, update
+
+from models import db, User
+from recommendations import play_history_changed
+
+
+def test_play_history_changed_increments_in_sql(app_context):
+    user = User(first_name='Ana', last_name='Prueba', email='history-version@example.com')
+    user.set_password('12345678')
+    db.session.add(user)
+    db.session.commit()
+    assert user.play_history_version == 0
+
+    # Otro worker incrementó la versión; esta instancia conserva el valor viejo
+    table = User.__table__
+    db.session.execute(update(table).where(table.c.id == user.id).values(play_history_version=5))
+
+    play_history_changed(user)
+    db.session.commit()
+
+    stored = db.session.execute(select(table.c.play_history_version).where(table.c.id == user.id)).scalar_one()
+    assert stored == 6
+    assert user.play_history_version == 6
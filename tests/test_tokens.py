@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import db, RevokedToken
+from tokens import purge_expired_tokens, token_denylist
+
+
+def _token_pair(app, email):
+    client = app.test_client()
+    client.post('/api/register', json={
+        'firstName': 'Ana', 'lastName': 'Prueba', 'email': email, 'password': '12345678', 'terms': True
+    })
+    response = app.test_client().post('/api/token', json={'email': email, 'password': '12345678'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_refresh_checks_revocations_from_other_workers(app):
+    tokens = _token_pair(app, 'refresh-db@example.com')
+    client = app.test_client()
+    with app.app_context():
+        # Otro worker canjeó el token: la fila existe pero la copia en memoria de este proceso no la tiene
+        first = client.post('/api/token/refresh', json={'refresh_token': tokens['refresh_token']})
+        assert first.status_code == 200
+        token_denylist._jtis.clear()
+
+        again = client.post('/api/token/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert again.status_code == 401
+
+
+def test_denylist_sync_does_not_commit_request_session(app_context):
+    db.session.add(RevokedToken(jti='pending-jti', user_id=1, expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.session.flush()
+
+    token_denylist.sync()
+    db.session.rollback()
+
+    assert db.session.get(RevokedToken, 'pending-jti') is None
+
+
+def test_purge_expired_tokens(app_context):
+    now = datetime.utcnow()
+    db.session.add_all([
+        RevokedToken(jti='expired-jti', user_id=1, expires_at=now - timedelta(minutes=1)),
+        RevokedToken(jti='live-jti', user_id=1, expires_at=now + timedelta(hours=1)),
+    ])
+    db.session.commit()
+
+    assert purge_expired_tokens() >= 1
+    jtis = set(db.session.execute(select(RevokedToken.jti)).scalars())
+    assert 'expired-jti' not in jtis and 'live-jti' in jtis
+
+
+def test_denylist_keeps_last_copy_when_sync_fails(app_context, monkeypatch):
+    monkeypatch.setitem(token_denylist._jtis, 'kept-jti', 2 ** 31)
+    monkeypatch.setattr(token_denylist, '_last_sync', 0.0)
+
+    def failing_sync():
+        raise RuntimeError('base de datos no disponible')
+
+    monkeypatch.setattr(token_denylist, 'sync', failing_sync)
+    assert token_denylist.is_revoked({'jti': 'kept-jti', 'sub': 1, 'iat': 0})
+    assert not token_denylist.is_revoked({'jti': 'other-jti', 'sub': 1, 'iat': 0})
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import db, Game, UserGame
+
+
+@contextmanager
+def count_statements():
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _login(app, email):
+    client = app.test_client()
+    response = client.post('/api/register', json={
+        'firstName': 'Ana', 'lastName': 'Prueba', 'email': email, 'password': '12345678', 'terms': True
+    })
+    assert response.status_code == 201
+    return client, response.get_json()['user']['id']
+
+
+def _add_games(user_id, game_ids):
+    for game_id in game_ids:
+        db.session.add(UserGame(user_id=user_id, game_id=game_id, status='playing'))
+    db.session.commit()
+
+
+def _statements_for(client, url):
+    # La primera petición llena las cachés (catálogo, identidad); se mide la segunda
+    assert client.get(url).status_code == 200
+    with count_statements() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def _query_counts(app, email, url):
+    with app.app_context():
+        client, user_id = _login(app, email)
+        game_ids = [game_id for (game_id,) in db.session.query(Game.id).order_by(Game.id).limit(6)]
+        assert len(game_ids) == 6
+
+        _add_games(user_id, game_ids[:1])
+        few, few_data = _statements_for(client, url)
+        _add_games(user_id, game_ids[1:])
+        many, many_data = _statements_for(client, url)
+    return few, few_data, many, many_data
+
+
+def test_get_user_games_query_count_does_not_grow_with_rows(app):
+    few, few_data, many, many_data = _query_counts(app, 'games-queries@example.com', '/api/user/games')
+    assert (len(few_data['games']), len(many_data['games'])) == (1, 6)
+    assert many == few
+
+
+def test_get_profile_query_count_does_not_grow_with_rows(app):
+    few, few_data, many, many_data = _query_counts(app, 'profile-queries@example.com', '/api/profile')
+    assert (len(few_data['games']), len(many_data['games'])) == (1, 6)
+    assert many == few
+
+
+def test_user_games_keep_rows_of_missing_games(app):
+    with app.app_context():
+        client, user_id = _login(app, 'missing-game@example.com')
+        game_id = db.session.query(Game.id).order_by(Game.id).limit(1).scalar()
+        # Filas huérfanas (SQLite no valida la llave foránea por defecto)
+        _add_games(user_id, [game_id, 999999])
+        few, _ = _statements_for(client, '/api/user/games')
+        _add_games(user_id, [999997, 999998])
+        many, data = _statements_for(client, '/api/user/games')
+
+    games = {game['game_id']: game['game'] for game in data['games']}
+    assert set(games) == {game_id, 999997, 999998, 999999}
+    assert games[game_id] is not None
+    assert games[999997] is None and games[999998] is None and games[999999] is None
+    assert many == few
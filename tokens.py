@@ -0,0 +1,198 @@
+"""
+Tokens de acceso firmados para clientes sin cookies (app Android).
+
+- Token de acceso: corta duración, firmado con HMAC-SHA256 y SECRET_KEY. Lleva
+  solo el id del usuario: la firma se valida sin consultar la base de datos y
+  el usuario sale de la caché de identidad (user_cache.py), que consulta la
+  base de datos solo al vencer su entrada.
+- Los derechos del plan NO van en el token: se leen de la caché de
+  entitlements.py, igual que en las sesiones con cookie (con caché caliente
+  tampoco tocan la base de datos). Un token con derechos los congelaría hasta
+  su vencimiento, y un pago o una cancelación no se verían en la app hasta
+  refrescarlo. La respuesta de /api/token los incluye como dato informativo.
+- Token de refresco: larga duración; se canjea en /api/token/refresh por un
+  par nuevo y el anterior queda revocado (rotación). El canje consulta la
+  revocación en la base de datos, no en la copia en memoria.
+
+La revocación usa una lista compacta (tabla revoked_tokens) con solo los
+tokens aún vigentes. Cada proceso guarda una copia en memoria y la recarga
+cada TOKEN_DENYLIST_SYNC segundos con una conexión propia (sin tocar la sesión
+de la petición). Las filas vencidas las purga el barrido de
+subscription_sweeper.py o `flask purge-revoked-tokens`.
+"""
+
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import delete, or_, select
+
+from entitlements import get_entitlements
+from models import db, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN = 'access'
+REFRESH_TOKEN = 'refresh'
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidTokenError(Exception):
+    """Token mal formado, con firma inválida, vencido o revocado"""
+
+
+def _to_timestamp(value):
+    return (value - _EPOCH).total_seconds()
+
+
+def _from_timestamp(value):
+    return _EPOCH + timedelta(seconds=value)
+
+
+def _serializer(token_type):
+    # Una sal distinta por tipo impide usar un token de refresco como token de acceso
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=f'pixelpick-{token_type}-token',
+                             signer_kwargs={'digest_method': hashlib.sha256})
+
+
+def _token_ttl(token_type):
+    if token_type == ACCESS_TOKEN:
+        return current_app.config.get('ACCESS_TOKEN_TTL', 900)
+    return current_app.config.get('REFRESH_TOKEN_TTL', 30 * 86400)
+
+
+def issue_token(user_id, token_type):
+    """Firma un token del tipo indicado; retorna (token, claims)"""
+    now = int(time.time())
+    claims = {
+        'sub': user_id,
+        'jti': secrets.token_urlsafe(16),
+        'iat': now,
+        'exp': now + _token_ttl(token_type),
+    }
+    return _serializer(token_type).dumps(claims), claims
+
+
+def issue_token_pair(user_id):
+    """Par de tokens (acceso + refresco) y derechos actuales, listo para la respuesta JSON"""
+    access_token, access_claims = issue_token(user_id, ACCESS_TOKEN)
+    refresh_token, _ = issue_token(user_id, REFRESH_TOKEN)
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': access_claims['exp'] - access_claims['iat'],
+        'entitlements': get_entitlements(user_id)
+    }
+
+
+def decode_token(token, token_type):
+    """Valida firma, vencimiento y revocación; retorna las claims o lanza InvalidTokenError"""
+    try:
+        claims = _serializer(token_type).loads(token)
+    except BadSignature:
+        raise InvalidTokenError('Token inválido')
+    if not isinstance(claims, dict) or 'sub' not in claims or 'jti' not in claims:
+        raise InvalidTokenError('Token inválido')
+    if claims.get('exp', 0) <= time.time():
+        raise InvalidTokenError('Token vencido')
+    if token_denylist.is_revoked(claims):
+        raise InvalidTokenError('Token revocado')
+    return claims
+
+
+def bearer_token(request):
+    """Token del encabezado 'Authorization: Bearer ...' (None si no hay)"""
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+class TokenDenyList:
+    """Copia en memoria de revoked_tokens, recargada periódicamente"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = {}  # jti -> timestamp de vencimiento
+        self._users = {}  # user_id -> timestamp de revocación de todos sus tokens
+        self._last_sync = 0.0
+
+    def revoke(self, claims):
+        """Revoca un token por su jti (sin commit)"""
+        expires_at = _from_timestamp(claims['exp'])
+        db.session.merge(RevokedToken(jti=claims['jti'], user_id=claims['sub'], expires_at=expires_at))
+        with self._lock:
+            self._jtis[claims['jti']] = claims['exp']
+
+    def revoke_user(self, user_id):
+        """Revoca todos los tokens emitidos hasta ahora para el usuario (sin commit)"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=max(_token_ttl(ACCESS_TOKEN), _token_ttl(REFRESH_TOKEN)))
+        db.session.merge(RevokedToken(jti=f'user:{user_id}', user_id=user_id, revoked_at=now, expires_at=expires_at))
+        with self._lock:
+            self._users[user_id] = _to_timestamp(now)
+
+    def is_revoked(self, claims):
+        self._maybe_sync()
+        with self._lock:
+            if claims['jti'] in self._jtis:
+                return True
+            revoked_at = self._users.get(claims['sub'])
+        return revoked_at is not None and claims.get('iat', 0) <= revoked_at
+
+    def is_revoked_in_db(self, claims):
+        """Como is_revoked, pero consultando revoked_tokens (para el canje de tokens de refresco)"""
+        table = RevokedToken.__table__
+        user_revoked = (table.c.jti == f"user:{claims['sub']}") & (table.c.revoked_at >= _from_timestamp(claims.get('iat', 0)))
+        return db.session.execute(
+            select(table.c.jti).where(or_(table.c.jti == claims['jti'], user_revoked)).limit(1)
+        ).first() is not None
+
+    def _maybe_sync(self):
+        interval = current_app.config.get('TOKEN_DENYLIST_SYNC', 30)
+        if time.monotonic() - self._last_sync < interval:
+            return
+        self._last_sync = time.monotonic()
+        try:
+            self.sync()
+        except Exception as e:
+            # Sin base de datos se sigue con la última copia; se reintenta en el siguiente intervalo
+            logger.error(f"Error al recargar la lista de tokens revocados: {str(e)}")
+
+    def sync(self):
+        """Recarga la lista desde la base de datos, en una conexión aparte de la sesión de la petición"""
+        table = RevokedToken.__table__
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.jti, table.c.user_id, table.c.revoked_at, table.c.expires_at)
+                .where(table.c.expires_at > datetime.utcnow())
+            ).all()
+
+        jtis, users = {}, {}
+        for jti, user_id, revoked_at, expires_at in rows:
+            if jti.startswith('user:'):
+                users[user_id] = _to_timestamp(revoked_at)
+            else:
+                jtis[jti] = _to_timestamp(expires_at)
+        with self._lock:
+            self._jtis = jtis
+            self._users = users
+
+
+token_denylist = TokenDenyList()
+
+
+def purge_expired_tokens():
+    """Elimina de revoked_tokens las filas cuyos tokens ya vencieron. Retorna cuántas."""
+    table = RevokedToken.__table__
+    deleted = db.session.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+    db.session.commit()
+    return deleted
@@ -0,0 +1,143 @@
+"""
+Caché de identidad de usuarios para el user_loader de Flask-Login.
+
+Cada petición autenticada necesita current_user. En lugar de cargar la fila
+completa de users en cada petición, se guardan en memoria (con un TTL corto)
+solo las columnas de identidad y perfil, y con ellas se construye un User
+persistente sin consultar la base de datos.
+
+Las columnas que cambian con sentencias UPDATE directas (versiones y contadores
+del historial), los contadores de cambios de nombre y password_hash no se
+guardan: quedan expiradas en la instancia y se cargan de la base de datos solo
+si la petición las usa, así que nunca se leen valores viejos.
+
+La caché es por proceso: otro worker puede ver un usuario editado o eliminado
+hasta que vence el TTL. Las rutas que escriben según los datos del usuario lo
+vuelven a leer con load_fresh_user() antes de usarlo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from models import db, User
+
+# Columnas de users que se guardan en caché
+CACHED_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'created_at', 'updated_at', 'email_verified',
+)
+
+DEFAULT_TTL = 30
+MAX_CACHED_USERS = 10000
+
+
+class UserIdentityCache:
+    """Caché LRU con TTL de {columna: valor} por id de usuario"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=MAX_CACHED_USERS):
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self._max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expira_en, valores)
+
+    def configure(self, ttl):
+        """Cambia el TTL en segundos (0 desactiva la caché)"""
+        self.ttl = ttl
+        self.clear()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserIdentityCache()
+
+
+def _load_identity(user_id):
+    """Consulta solo las columnas de identidad del usuario"""
+    columns = [User.__table__.c[name] for name in CACHED_COLUMNS]
+    row = db.session.execute(select(*columns).where(User.__table__.c.id == user_id)).one_or_none()
+    return dict(row._mapping) if row is not None else None
+
+
+def load_cached_user(user_id):
+    """
+    Obtener el User para Flask-Login usando la caché de identidad.
+    Retorna None si el usuario no existe.
+    """
+    if not user_cache.ttl:
+        return db.session.get(User, user_id)
+
+    # Si la sesión ya tiene la instancia no hace falta construir otra
+    existing = db.session.identity_map.get(identity_key(User, user_id))
+    if existing is not None:
+        return existing
+
+    values = user_cache.get(user_id)
+    if values is None:
+        values = _load_identity(user_id)
+        if values is None:
+            return None
+        user_cache.set(user_id, values)
+
+    # Instancia persistente sin historial de cambios; las columnas no cacheadas quedan expiradas
+    user = User(**values)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+def load_fresh_user(user_id, for_update=False):
+    """
+    Releer el User desde la base de datos (no desde la caché), para las rutas
+    que escriben. Con for_update la fila queda bloqueada hasta el commit.
+    Retorna None si el usuario ya no existe.
+    """
+    return db.session.get(User, user_id, populate_existing=True, with_for_update=for_update or None)
+
+
+# ==================== INVALIDACIÓN ====================
+
+@event.listens_for(Session, 'after_flush')
+def _mark_user_changes(session, flush_context):
+    """Guarda en la sesión los usuarios modificados o eliminados en el flush"""
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault('users_changed', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('users_changed', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_user_changes(session):
+    session.info.pop('users_changed', None)
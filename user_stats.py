@@ -0,0 +1,136 @@
+"""
+Estadísticas de juegos por usuario (completados / jugando).
+
+Para cada juego distinto cuenta solo el registro más reciente (por last_played,
+los registros sin fecha al final). Se calcula en una sola sentencia agrupada:
+DISTINCT ON en PostgreSQL y ROW_NUMBER() como alternativa compatible con SQLite.
+
+Los contadores se guardan desnormalizados en users (games_completed_count,
+games_playing_count) y se actualizan en la misma transacción que modifica
+user_games, así que leerlos no requiere recorrer el historial.
+"""
+
+from sqlalchemy import case, func, or_, select, update
+
+from models import db, User, UserGame
+
+# Estado de UserGame -> columna de contador en users
+COUNTER_COLUMNS = {
+    'completed': 'games_completed_count',
+    'playing': 'games_playing_count',
+}
+
+
+def _latest_status_per_game(user_id=None):
+    """Subconsulta (user_id, status) con el registro más reciente de cada juego por usuario"""
+    if db.engine.dialect.name == 'postgresql':
+        query = select(UserGame.user_id, UserGame.status).distinct(UserGame.user_id, UserGame.game_id).order_by(
+            UserGame.user_id, UserGame.game_id, UserGame.last_played.desc().nulls_last(), UserGame.id.desc()
+        )
+        if user_id is not None:
+            query = query.where(UserGame.user_id == user_id)
+        return query.subquery()
+
+    row_number = func.row_number().over(
+        partition_by=(UserGame.user_id, UserGame.game_id),
+        order_by=(UserGame.last_played.is_(None), UserGame.last_played.desc(), UserGame.id.desc())
+    ).label('row_number')
+    ranked = select(UserGame.user_id, UserGame.status, row_number)
+    if user_id is not None:
+        ranked = ranked.where(UserGame.user_id == user_id)
+    ranked = ranked.subquery()
+    return select(ranked.c.user_id, ranked.c.status).where(ranked.c.row_number == 1).subquery()
+
+
+def _count_columns(latest):
+    return (
+        func.coalesce(func.sum(case((latest.c.status == 'completed', 1), else_=0)), 0).label('completed'),
+        func.coalesce(func.sum(case((latest.c.status == 'playing', 1), else_=0)), 0).label('playing'),
+    )
+
+
+def compute_play_stats(user_id):
+    """Recalcula {'completed': n, 'playing': n} desde user_games con una sola consulta"""
+    latest = _latest_status_per_game(user_id)
+    completed, playing = db.session.execute(select(*_count_columns(latest))).one()
+    return {'completed': int(completed), 'playing': int(playing)}
+
+
+def play_stats(user):
+    """Contadores desnormalizados del usuario (sin consultas)"""
+    return {
+        'completed': user.games_completed_count or 0,
+        'playing': user.games_playing_count or 0,
+    }
+
+
+def record_status_change(user_id, old_status, new_status):
+    """
+    Ajusta los contadores cuando un juego del usuario pasa de old_status a new_status
+    (old_status es None si el juego es nuevo). No hace commit.
+    """
+    if old_status == new_status:
+        return
+    values = {}
+    for status, delta in ((old_status, -1), (new_status, 1)):
+        column_name = COUNTER_COLUMNS.get(status)
+        if column_name:
+            column = User.__table__.c[column_name]
+            values[column_name] = column + delta
+    if values:
+        db.session.execute(update(User.__table__).where(User.__table__.c.id == user_id).values(**values))
+
+
+def refresh_user_counters(user_id):
+    """Recalcula los contadores de un usuario desde user_games. No hace commit."""
+    stats = compute_play_stats(user_id)
+    db.session.execute(update(User.__table__).where(User.__table__.c.id == user_id).values(
+        games_completed_count=stats['completed'],
+        games_playing_count=stats['playing']
+    ))
+    return stats
+
+
+def _all_user_stats():
+    """Subconsulta (user_id, completed, playing) para todos los usuarios con juegos"""
+    latest = _latest_status_per_game()
+    return select(latest.c.user_id, *_count_columns(latest)).group_by(latest.c.user_id).subquery()
+
+
+def find_counter_mismatches():
+    """Usuarios cuyos contadores no coinciden con user_games: [(user_id, guardado, real)]"""
+    stats = _all_user_stats()
+    completed = func.coalesce(stats.c.completed, 0)
+    playing = func.coalesce(stats.c.playing, 0)
+    rows = db.session.execute(
+        select(User.id, User.games_completed_count, User.games_playing_count, completed, playing)
+        .outerjoin(stats, stats.c.user_id == User.id)
+        .where(or_(
+            func.coalesce(User.games_completed_count, 0) != completed,
+            func.coalesce(User.games_playing_count, 0) != playing
+        ))
+    ).all()
+    return [
+        (user_id, {'completed': stored_completed or 0, 'playing': stored_playing or 0},
+         {'completed': int(real_completed), 'playing': int(real_playing)})
+        for user_id, stored_completed, stored_playing, real_completed, real_playing in rows
+    ]
+
+
+def rebuild_user_counters(user_ids=None):
+    """
+    Recalcula los contadores con un UPDATE por conjuntos (todos los usuarios o solo user_ids).
+    No hace commit. Retorna el número de filas actualizadas.
+    """
+    stats = _all_user_stats()
+    completed = select(stats.c.completed).where(stats.c.user_id == User.__table__.c.id).scalar_subquery()
+    playing = select(stats.c.playing).where(stats.c.user_id == User.__table__.c.id).scalar_subquery()
+    statement = update(User.__table__).values(
+        games_completed_count=func.coalesce(completed, 0),
+        games_playing_count=func.coalesce(playing, 0)
+    )
+    if user_ids is not None:
+        if not user_ids:
+            return 0
+        statement = statement.where(User.__table__.c.id.in_(user_ids))
+    return db.session.execute(statement).rowcount